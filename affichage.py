@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import streamlit as st
+import pandas as pd
+
+# Format d'affichage des montants (appliqué côté navigateur par st.column_config)
+FORMAT_MONTANT = "dollar"
+TAILLE_PAGE = 100
+
+
+# --------------- FORMATAGE -----------------
+
+def config_montants(colonnes, fmt=FORMAT_MONTANT):
+    """Construit un column_config NumberColumn pour chaque colonne de montant."""
+    return {c: st.column_config.NumberColumn(c, format=fmt) for c in colonnes}
+
+
+def config_dates(colonnes):
+    """Construit un column_config DateColumn pour chaque colonne de date."""
+    return {c: st.column_config.DateColumn(c, format="DD/MM/YYYY") for c in colonnes}
+
+
+def _milliers(entiers):
+    """
+    Entiers positifs en texte groupé par milliers « 1 234 567 » : complétés
+    de zéros à une largeur multiple de 3, découpés en tranches puis débarrassés
+    des zéros de tête, par des opérations de chaînes sur toute la série.
+    """
+    txt = entiers.astype(str)
+    if txt.empty:
+        return txt
+    largeur = -(-int(txt.str.len().max()) // 3) * 3
+    txt = txt.str.zfill(largeur)
+    res = txt.str[0:3]
+    for i in range(3, largeur, 3):
+        res = res + " " + txt.str[i:i + 3]
+    res = res.str.lstrip("0 ")
+    return res.where(res != "", "0")
+
+
+def fmt_montants(serie):
+    """Formate une série numérique en texte « 1 234,56 $ » (vectorisé, sans formatage élément par élément)."""
+    num = pd.to_numeric(serie, errors="coerce").fillna(0.0)
+    centimes = (num.abs() * 100).round().astype("int64")
+    signe = pd.Series(np.where(num < 0, "-", ""), index=num.index)
+    return signe + _milliers(centimes // 100) + "," + (centimes % 100).astype(str).str.zfill(2) + " $"
+
+
+def fmt_entiers(serie):
+    """Formate une série d'entiers avec séparateur de milliers « 1 234 »."""
+    num = pd.to_numeric(serie, errors="coerce").fillna(0).astype("int64")
+    signe = pd.Series(np.where(num < 0, "-", ""), index=num.index)
+    return signe + _milliers(num.abs())
+
+
+# --------------- PAGINATION -----------------
+
+def afficher_pagine(df, key, taille_page=TAILLE_PAGE, column_config=None, height=None):
+    """
+    Affiche un DataFrame page par page : seule la tranche visible est envoyée
+    au navigateur, le coût de rendu ne dépend donc plus de la taille totale.
+    """
+    options = {"use_container_width": True, "column_config": column_config}
+    if height:
+        options["height"] = height
+
+    n = len(df)
+    if n <= taille_page:
+        st.dataframe(df, **options)
+        return
+
+    nb_pages = math.ceil(n / taille_page)
+    c1, c2 = st.columns([1, 3])
+    page = c1.number_input(
+        "Page", min_value=1, max_value=nb_pages, value=1, step=1, key=f"{key}_page"
+    )
+    debut = (int(page) - 1) * taille_page
+    fin = min(debut + taille_page, n)
+    c2.caption(f"Lignes {debut + 1}–{fin} sur {n} (page {int(page)}/{nb_pages})")
+
+    st.dataframe(df.iloc[debut:fin], **options)
@@ -3,61 +3,90 @@ import pandas as pd
 
 # Charger les fonctions principales
 from common_data import ensure_loaded, MAIN_FILE
+from profiling import debut_rerun, mesure, panneau_profil
+from instantane import instantane_periodique, restaurer_au_demarrage
+from recuperation import recuperer_au_demarrage
 
-# Configuration générale de l’application
-st.set_page_config(
-    page_title="Visa Manager",
-    page_icon="🧾",
-    layout="wide"
-)
-
-# Si aucun fichier n'est encore chargé, avertir l'utilisateur
-if "data_xlsx" not in st.session_state or st.session_state["data_xlsx"] is None:
-    st.warning("⚠️ Fichier non chargé — veuillez l'importer via l’onglet 📄 Fichiers.")
-
-# Définition des onglets
-tabs = st.tabs([
-    "📄 Fichiers",
-    "📊 Dashboard",
-    "📈 Analyses",
-    "➕ Ajouter",
-    "✏️ / 🗑️ Gestion",
-    "💳 Compta Client",
-    "🛡️ Escrow",
-    "⚙️ Paramètres",
-])
-
-# Import des modules après création des tabs pour éviter cycles d'import
-from tab_fichiers import tab_fichiers
-from tab_dashboard import tab_dashboard
-from tab_analyses import tab_analyses
-from tab_ajouter import tab_ajouter
-from tab_gestion import tab_gestion
-from tab_compta import tab_compta
-from tab_escrow import tab_escrow
-from tab_parametres import tab_parametres
-
-# Affichage réel des onglets
-with tabs[0]:
-    tab_fichiers()
-
-with tabs[1]:
-    tab_dashboard()
-
-with tabs[2]:
-    tab_analyses()
-
-with tabs[3]:
-    tab_ajouter()
-
-with tabs[4]:
-    tab_gestion()
-
-with tabs[5]:
-    tab_compta()
-
-with tabs[6]:
-    tab_escrow()
-
-with tabs[7]:
-    tab_parametres()
+
+def main():
+    """Application Streamlit (exécutée par `streamlit run app.py`)."""
+    # Configuration générale de l’application
+    st.set_page_config(
+        page_title="Visa Manager",
+        page_icon="🧾",
+        layout="wide"
+    )
+
+    # Instrumentation optionnelle (VISA_PROFILE=1 ou ?profile=1)
+    debut_rerun()
+
+    # Démarrage à chaud : après un redémarrage du serveur, reprise du dernier instantané local
+    message_instantane = restaurer_au_demarrage()
+    if message_instantane:
+        st.info(f"♻️ {message_instantane}")
+
+    # Sources distantes configurées (classeur principal, secours, bureaux) : téléchargées en parallèle
+    for niveau, message in recuperer_au_demarrage():
+        getattr(st, niveau)(f"🌐 {message}")
+
+    # Si aucun fichier n'est encore chargé, avertir l'utilisateur
+    if "data_xlsx" not in st.session_state or st.session_state["data_xlsx"] is None:
+        st.warning("⚠️ Fichier non chargé — veuillez l'importer via l’onglet 📄 Fichiers.")
+
+    # Définition des onglets
+    tabs = st.tabs([
+        "📄 Fichiers",
+        "📊 Dashboard",
+        "📈 Analyses",
+        "➕ Ajouter",
+        "✏️ / 🗑️ Gestion",
+        "💳 Compta Client",
+        "🛡️ Escrow",
+        "⚙️ Paramètres",
+    ])
+
+    # Import des modules après création des tabs pour éviter cycles d'import
+    from tab_fichiers import tab_fichiers
+    from tab_dashboard import tab_dashboard
+    from tab_analyses import tab_analyses
+    from tab_ajouter import tab_ajouter
+    from tab_gestion import tab_gestion
+    from tab_compta import tab_compta
+    from tab_escrow import tab_escrow
+    from tab_parametres import tab_parametres
+
+    # Affichage réel des onglets
+    with tabs[0], mesure("tab_fichiers"):
+        tab_fichiers()
+
+    with tabs[1], mesure("tab_dashboard"):
+        tab_dashboard()
+
+    with tabs[2], mesure("tab_analyses"):
+        tab_analyses()
+
+    with tabs[3], mesure("tab_ajouter"):
+        tab_ajouter()
+
+    with tabs[4], mesure("tab_gestion"):
+        tab_gestion()
+
+    with tabs[5], mesure("tab_compta"):
+        tab_compta()
+
+    with tabs[6], mesure("tab_escrow"):
+        tab_escrow()
+
+    with tabs[7], mesure("tab_parametres"):
+        tab_parametres()
+
+    # Instantané local si les données ont changé (au plus une fois par minute)
+    instantane_periodique()
+
+    panneau_profil()
+
+
+# Les processus de calcul (parallele) réimportent ce script sous le nom « __mp_main__ » :
+# seule l'exécution par Streamlit (« __main__ ») affiche l'application
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Traitements hors interface (cron) : synthèse comptable, escrow à débloquer,
+analyses annuelles et sauvegarde distante du classeur, avec les mêmes
+fonctions de calcul que les onglets. Les rapports indépendants sont calculés
+en parallèle dans des processus séparés ; chacun est écrit dans un fichier.
+
+    python batch.py "Clients BL.xlsx" --sortie rapports/
+    python batch.py "Clients BL.xlsx" --rapports compta escrow --format csv --jobs 2
+    python batch.py "Clients BL.xlsx" --rapports --sauvegarde "drive:Clients BL.xlsx"
+
+Code de sortie non nul si un rapport ou la sauvegarde échoue.
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import streamlit.logger
+
+# Hors du serveur Streamlit : pas d'avertissements « No runtime found » des caches
+streamlit.logger.set_log_level("error")
+
+from calculs_analyses import COLONNES_ANNUELLES, agregats_annuels  # noqa: E402
+from calculs_compta import COLONNES_SOURCE, synthese_compta  # noqa: E402
+from common_data import ecrire_classeur, lire_classeur  # noqa: E402
+from entonnoir import agreger, entonnoir_par_annee, indicateurs_dossiers  # noqa: E402
+from parallele import executer_par_annee  # noqa: E402
+from referentiel_visa import ArbreVisa  # noqa: E402
+from series_temporelles import COL_MONTANT, GRANULARITES, base_temporelle, serie_temporelle  # noqa: E402
+from statuts_escrow import (  # noqa: E402
+    PERIODES, delai_preparation, dossiers_reclames, prevision_deblocages, statuts_escrow, synthese_escrow,
+)
+
+logger = logging.getLogger("visa_manager.batch")
+FORMATS = ("xlsx", "csv")
+
+
+# --------------- RAPPORTS -----------------
+# rapport(data, aujourdhui) -> {nom de feuille: DataFrame}
+
+def rapport_compta(data, aujourdhui):
+    """Synthèse financière (facturé, payé, solde) par visa et par année."""
+    par_visa, par_annee = (executer_par_annee(synthese_compta, data, par, colonnes=COLONNES_SOURCE)
+                           for par in ("Visa", "Année"))
+    return {
+        "Par visa": par_visa.sort_values("Montant facturé", ascending=False).reset_index(),
+        "Par année": par_annee.sort_index().reset_index(),
+    }
+
+
+def rapport_escrow(data, aujourdhui):
+    """Statuts escrow, dossiers à débloquer avec ancienneté, prévision des déblocages."""
+    clients = data["Clients"]
+    synthese = synthese_escrow(statuts_escrow(clients, dossiers_reclames(data["Escrow"])), aujourdhui)
+    delai = delai_preparation(clients)
+    return {
+        "À débloquer": synthese.a_debloquer,
+        "Statuts": synthese.table,
+        "Par ancienneté": synthese.par_tranche.reset_index(),
+        **{f"Prévision par {p.lower()}": prevision_deblocages(synthese.table, delai, aujourdhui, r).reset_index()
+           for p, r in PERIODES.items()},
+    }
+
+
+def rapport_analyses(data, aujourdhui):
+    """Agrégats annuels, série mensuelle du facturé et entonnoir par visa et par année."""
+    clients = data["Clients"]
+    arbre = ArbreVisa().construire(data.get("Visa"))
+    ind = indicateurs_dossiers(clients)
+    ind["Visa"] = arbre.libelles_visa(arbre.identifiants(clients)["visa_id"]).to_numpy()
+
+    montants = clients.assign(**{
+        COL_MONTANT: clients["Montant honoraires (US $)"].fillna(0.0) + clients["Autres frais (US $)"].fillna(0.0)
+    })
+    serie = serie_temporelle(base_temporelle(montants, "Date", [COL_MONTANT]), GRANULARITES["Mois"])
+    return {
+        "Par année": executer_par_annee(agregats_annuels, data, colonnes=COLONNES_ANNUELLES).sort_index().reset_index(),
+        "Série mensuelle": serie.reset_index(),
+        "Entonnoir par visa": agreger(ind, ["Visa"]).reset_index(),
+        "Entonnoir par année": executer_par_annee(entonnoir_par_annee, data, fusion="concat").reset_index(),
+    }
+
+
+RAPPORTS = {
+    "compta": rapport_compta,
+    "escrow": rapport_escrow,
+    "analyses": rapport_analyses,
+}
+
+
+# --------------- EXÉCUTION -----------------
+
+def _nom_fichier(texte):
+    return re.sub(r"[^\w-]+", "_", texte, flags=re.UNICODE).strip("_").lower()
+
+
+def executer_rapport(nom, data, sortie, fmt, aujourdhui):
+    """Calcule un rapport et l'écrit (un classeur, ou un CSV par tableau) ; retourne les chemins."""
+    t0 = time.perf_counter()
+    tables = RAPPORTS[nom](data, aujourdhui)
+    prefixe = os.path.join(sortie, f"{nom}_{aujourdhui:%Y-%m-%d}")
+    if fmt == "xlsx":
+        chemins = [ecrire_classeur(tables, prefixe + ".xlsx")]
+    else:
+        chemins = []
+        for feuille, df in tables.items():
+            chemin = f"{prefixe}_{_nom_fichier(feuille)}.csv"
+            df.to_csv(chemin, index=False, encoding="utf-8-sig")
+            chemins.append(chemin)
+    return chemins, time.perf_counter() - t0
+
+
+def sauvegarder(chemin, destination):
+    """Copie le classeur vers un stockage distant (« drive:nom », « dropbox:/chemin », « local:/chemin »)."""
+    from instantane import remote_depuis_source
+
+    remote = remote_depuis_source(destination)
+    if remote is None:
+        raise ValueError(f"Destination de sauvegarde inconnue : {destination}")
+    return remote.ecrire(chemin, remote.revision())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rapports et sauvegarde sans interface (cron).")
+    parser.add_argument("classeur", help="Classeur Clients BL.xlsx à traiter")
+    parser.add_argument("--rapports", nargs="*", choices=list(RAPPORTS), default=list(RAPPORTS),
+                        help="Rapports à produire (tous par défaut ; aucun avec --rapports seul)")
+    parser.add_argument("--sortie", default="rapports", help="Répertoire des fichiers produits")
+    parser.add_argument("--format", choices=FORMATS, default="xlsx")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Processus en parallèle")
+    parser.add_argument("--date", help="Date de référence AAAA-MM-JJ (aujourd'hui par défaut)")
+    parser.add_argument("--sauvegarde", help="Copie du classeur vers drive:… / dropbox:… / local:…")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    aujourdhui = pd.Timestamp(args.date) if args.date else pd.Timestamp.today().normalize()
+    echecs = 0
+
+    if args.rapports:
+        t0 = time.perf_counter()
+        data = lire_classeur(args.classeur)
+        logger.info("Classeur chargé : %d dossiers en %.2f s", len(data["Clients"]), time.perf_counter() - t0)
+        os.makedirs(args.sortie, exist_ok=True)
+
+        jobs = max(1, min(args.jobs, len(args.rapports)))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            taches = {pool.submit(executer_rapport, nom, data, args.sortie, args.format, aujourdhui): nom
+                      for nom in args.rapports}
+            for tache in as_completed(taches):
+                nom = taches[tache]
+                try:
+                    chemins, duree = tache.result()
+                    logger.info("Rapport %s : %s (%.2f s)", nom, ", ".join(chemins), duree)
+                except Exception:
+                    echecs += 1
+                    logger.exception("Rapport %s en échec", nom)
+
+    if args.sauvegarde:
+        try:
+            revision = sauvegarder(args.classeur, args.sauvegarde)
+            logger.info("Sauvegarde %s : révision %s", args.sauvegarde, revision)
+        except Exception:
+            echecs += 1
+            logger.exception("Sauvegarde %s en échec", args.sauvegarde)
+
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
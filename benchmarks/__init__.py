@@ -0,0 +1 @@
+"""Benchmarks Visa Manager : classeurs synthétiques et mesures hors navigateur."""
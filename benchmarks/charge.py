@@ -0,0 +1,212 @@
+"""
+Test de charge hors navigateur : N sessions simulées (AppTest sur app.py)
+jouent le même parcours en parallèle dans un seul processus, comme les
+sessions d'un serveur Streamlit : import du classeur, filtres Compta,
+mode d'analyse, recherche, ajout d'un dossier.
+
+Les onglets st.tabs sont tous rendus à chaque rerun ; « changer d'onglet »
+revient donc à agir sur les widgets de l'onglet, ce que fait chaque étape.
+Mesures : latence des reruns par étape (p50 / p90 / p99), reruns par
+seconde, mémoire résidente du processus par session ouverte.
+
+    python -m benchmarks.charge --sessions 1 5 10 --sortie charge_results.json
+"""
+import argparse
+import os
+import platform
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.run import RACINE, _revision, enregistrer
+from benchmarks.synthetic import classeur_en_cache
+
+SESSIONS = [1, 5, 10]
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# --------------- PARCOURS -----------------
+
+def _option(widget, rang):
+    """Option `rang` d'une liste déroulante (la dernière si la liste est plus courte)."""
+    options = widget.options
+    return options[min(rang, len(options) - 1)]
+
+
+def _choisir(at, cle, rang):
+    widget = at.selectbox(key=cle)
+    widget.set_value(_option(widget, rang))
+
+
+def _radio(at, libelle, rang):
+    widget = next(w for w in at.radio if w.label == libelle)
+    widget.set_value(_option(widget, rang))
+
+
+def _saisir(at, libelle, texte):
+    next(w for w in at.text_input if w.label == libelle).input(texte)
+
+
+def _cliquer(at, libelle):
+    next(b for b in at.button if b.label == libelle).click()
+
+
+def parcours(nom_fichier, brut, numero):
+    """Étapes d'une session : (nom, action sur l'AppTest avant le rerun)."""
+    return [
+        ("ouverture", lambda at: None),
+        ("import", lambda at: at.file_uploader[0].upload(nom_fichier, brut, MIME_XLSX)),
+        ("compta.visa", lambda at: _choisir(at, "compta_visa", 1 + numero)),
+        ("compta.annee", lambda at: _choisir(at, "compta_annee", 1)),
+        ("analyses.mode", lambda at: _radio(at, "Choisissez le mode de comparaison", 2)),
+        ("escrow.periode", lambda at: _radio(at, "Par", 1)),
+        ("ajout.recherche", lambda at: _saisir(at, "Rechercher (nom, catégorie, visa, commentaires, RFE)", "a")),
+        ("ajout.nom", lambda at: _saisir(at, "Nom du client", f"Client charge {numero}")),
+        ("ajout.enregistrer", lambda at: _cliquer(at, "💾 Enregistrer le dossier")),
+        ("compta.tous", lambda at: _choisir(at, "compta_visa", 0)),
+    ]
+
+
+def jouer_session(numero, nom_fichier, brut, timeout):
+    """Joue le parcours dans une nouvelle session ; retourne l'AppTest (gardé ouvert) et ses mesures."""
+    at = AppTest.from_file(os.path.join(RACINE, "app.py"), default_timeout=timeout)
+    mesures = []
+    for etape, action in parcours(nom_fichier, brut, numero):
+        action(at)
+        t0 = time.perf_counter()
+        at.run()
+        mesures.append({"etape": etape, "duree_s": time.perf_counter() - t0,
+                        "exceptions": [e.message for e in at.exception]})
+    return at, mesures
+
+
+# --------------- MÉMOIRE -----------------
+
+def memoire_residente():
+    """Mémoire résidente du processus (octets) ; None hors Linux."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for ligne in f:
+                if ligne.startswith("VmRSS:"):
+                    return int(ligne.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+# --------------- MESURES -----------------
+
+def percentiles(durees):
+    if not durees:
+        return {}
+    q = statistics.quantiles(durees, n=100, method="inclusive") if len(durees) > 1 else [durees[0]] * 99
+    return {
+        "p50_s": round(q[49], 4),
+        "p90_s": round(q[89], 4),
+        "p99_s": round(q[98], 4),
+        "max_s": round(max(durees), 4),
+        "reruns": len(durees),
+    }
+
+
+def charger(n_sessions, nom_fichier, brut, timeout):
+    """Lance `n_sessions` sessions en parallèle ; latences, débit et mémoire."""
+    rss_avant = memoire_residente()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+        sessions = list(pool.map(lambda i: jouer_session(i, nom_fichier, brut, timeout), range(n_sessions)))
+    duree = time.perf_counter() - t0
+    rss_apres = memoire_residente()  # sessions encore ouvertes : leurs données sont comptées
+
+    mesures = [m for _, ms in sessions for m in ms]
+    par_etape = {}
+    for m in mesures:
+        par_etape.setdefault(m["etape"], []).append(m["duree_s"])
+    res = {
+        "duree_s": round(duree, 3),
+        "reruns_par_s": round(len(mesures) / duree, 2),
+        "latence": percentiles([m["duree_s"] for m in mesures]),
+        "etapes": {etape: percentiles(d) for etape, d in par_etape.items()},
+    }
+    if rss_avant is not None and rss_apres is not None:
+        res["rss_avant_octets"] = rss_avant
+        res["rss_apres_octets"] = rss_apres
+        res["rss_par_session_octets"] = (rss_apres - rss_avant) // n_sessions
+    exceptions = sorted({e for m in mesures for e in m["exceptions"]})
+    if exceptions:
+        res["exceptions"] = exceptions
+    return res
+
+
+# --------------- RÉSULTATS -----------------
+
+def comparer(precedent, courant):
+    """Affiche le ratio courant / précédent de la latence p90 et du débit par nombre de sessions."""
+    for n, res in courant["sessions"].items():
+        avant = precedent.get("sessions", {}).get(n)
+        if not avant:
+            continue
+        a, v = avant["latence"].get("p90_s"), res["latence"].get("p90_s")
+        if a and v:
+            print(f"  {n:>4} sessions  p90 {a:>7.3f}s -> {v:>7.3f}s  x{v / a:.2f}"
+                  f"   débit {avant['reruns_par_s']:>6.2f} -> {res['reruns_par_s']:>6.2f} reruns/s")
+        a, v = avant.get("rss_par_session_octets"), res.get("rss_par_session_octets")
+        if a and v:
+            print(f"  {n:>4} sessions  mémoire/session {a / 2**20:>7.1f} Mo -> {v / 2**20:>7.1f} Mo")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge Visa Manager (sessions AppTest simulées)")
+    parser.add_argument("--sessions", type=int, nargs="+", default=SESSIONS)
+    parser.add_argument("--fichier", default=os.path.join(RACINE, "Clients BL.xlsx"),
+                        help="classeur importé par chaque session")
+    parser.add_argument("--lignes", type=int, help="classeur synthétique de N lignes au lieu de --fichier")
+    parser.add_argument("--timeout", type=float, default=600, help="timeout AppTest par rerun (s)")
+    parser.add_argument("--sortie", default=os.path.join(RACINE, "charge_results.json"))
+    args = parser.parse_args(argv)
+
+    chemin = classeur_en_cache(args.lignes) if args.lignes else args.fichier
+    with open(chemin, "rb") as f:
+        brut = f.read()
+    # Instantanés et historique du test à part, pour ne pas toucher ceux de l'application
+    os.environ.setdefault("VISA_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="visa_charge_"))
+
+    resultats = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "streamlit": st.__version__,
+        "classeur": os.path.basename(chemin),
+        "octets": len(brut),
+        "sessions": {},
+    }
+    # Session de chauffe hors mesure : imports et caches partagés ne sont pas imputés aux sessions
+    jouer_session(-1, os.path.basename(chemin), brut, args.timeout)
+    for n in args.sessions:
+        print(f"▶ {n} session(s)…", flush=True)
+        res = charger(n, os.path.basename(chemin), brut, args.timeout)
+        resultats["sessions"][str(n)] = res
+        lat = res["latence"]
+        print(f"  p50 {lat['p50_s']:.3f}s  p90 {lat['p90_s']:.3f}s  p99 {lat['p99_s']:.3f}s  "
+              f"{res['reruns_par_s']:.2f} reruns/s"
+              + (f"  {res['rss_par_session_octets'] / 2**20:.1f} Mo/session" if "rss_par_session_octets" in res else ""),
+              flush=True)
+        for e in res.get("exceptions", []):
+            print(f"  ⚠️ {e}", flush=True)
+
+    historique = enregistrer(resultats, args.sortie)
+    if len(historique) > 1:
+        print("Comparaison avec l'exécution précédente :")
+        comparer(historique[-2], resultats)
+    print(f"Résultats écrits dans {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Benchmarks hors navigateur : chargement, sauvegarde, calculs des onglets
+(fonctions pures des modules calculs_*, sans Streamlit) et rendu de chaque
+onglet sur des classeurs synthétiques de 1k à 1M lignes. Avec plusieurs
+processus (VISA_PROCESSUS), les agrégations par année sont aussi mesurées
+réparties entre processus, pour choisir VISA_SEUIL_PARALLELE.
+
+    python -m benchmarks.run --tailles 1000 10000 --sortie bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RACINE not in sys.path:
+    sys.path.insert(0, RACINE)
+
+from common_data import load_xlsx, save_all  # noqa: E402
+from calculs_analyses import COLONNES_ANNUELLES, agregats_annuels  # noqa: E402
+from calculs_compta import COLONNES_SOURCE, montants_compta, synthese_compta, synthese_filtree  # noqa: E402
+from calculs_dashboard import kpis_clients  # noqa: E402
+from entonnoir import entonnoir_par_annee  # noqa: E402
+from parallele import ENV_SEUIL, executer_par_annee, nb_processus  # noqa: E402
+from statuts_escrow import statuts_escrow, synthese_escrow  # noqa: E402
+from benchmarks.synthetic import classeur_en_cache  # noqa: E402
+
+TAILLES = [1_000, 10_000, 100_000, 1_000_000]
+
+# Onglets rendus via AppTest (module, fonction)
+ONGLETS = [
+    ("tab_fichiers", "tab_fichiers"),
+    ("tab_dashboard", "tab_dashboard"),
+    ("tab_analyses", "tab_analyses"),
+    ("tab_ajouter", "tab_ajouter"),
+    ("tab_gestion", "tab_gestion"),
+    ("tab_compta", "tab_compta"),
+    ("tab_escrow", "tab_escrow"),
+]
+
+# Calculs mesurés hors Streamlit : nom -> fonction(data)
+CALCULS = {
+    "compta.synthese": lambda data: synthese_filtree(montants_compta(data["Clients"])),
+    "dashboard.kpis": kpis_clients,
+    "analyses.agregats_annuels": agregats_annuels,
+    "escrow.synthese": lambda data: synthese_escrow(statuts_escrow(data["Clients"]), pd.Timestamp.today().normalize()),
+}
+
+# Agrégations par année mesurées en direct puis réparties entre processus (seuil 0) :
+# nom -> (requête, arguments, fusion, colonnes lues)
+REQUETES_PARALLELES = {
+    "compta.synthese_visa": (synthese_compta, ("Visa",), "somme", COLONNES_SOURCE),
+    "analyses.agregats_annuels": (agregats_annuels, (), "somme", COLONNES_ANNUELLES),
+    "dashboard.kpis": (kpis_clients, (), "somme", None),
+    "analyses.entonnoir_par_annee": (entonnoir_par_annee, (), "concat", None),
+}
+
+
+# --------------- MESURES -----------------
+
+def mesurer(fn, repetitions=1):
+    """Exécute `fn` plusieurs fois et retourne les temps (s) et le dernier résultat."""
+    temps = []
+    resultat = None
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        resultat = fn()
+        temps.append(time.perf_counter() - t0)
+    return {
+        "min_s": round(min(temps), 6),
+        "median_s": round(statistics.median(temps), 6),
+        "repetitions": repetitions,
+    }, resultat
+
+
+def rendre_onglet(module, fonction, data, timeout):
+    """Rend un onglet dans un AppTest avec `data` déjà en session ; retourne les exceptions."""
+    script = (
+        f"import sys\nsys.path.insert(0, {RACINE!r})\n"
+        f"from {module} import {fonction}\n{fonction}()\n"
+    )
+    at = AppTest.from_string(script, default_timeout=timeout)
+    at.session_state["data_xlsx"] = data
+    at.run()
+    return [e.message for e in at.exception]
+
+
+def bench_taille(n, repetitions, timeout, seed=0):
+    """Mesure toutes les étapes pour un classeur de `n` lignes."""
+    res = {}
+
+    t0 = time.perf_counter()
+    chemin = classeur_en_cache(n, seed)
+    res["generation_s"] = round(time.perf_counter() - t0, 3)
+    res["taille_fichier_octets"] = os.path.getsize(chemin)
+
+    with open(chemin, "rb") as f:
+        brut = f.read()
+
+    res["load_xlsx"], data = mesurer(lambda: load_xlsx(brut), repetitions)
+    if data is None:
+        res["erreur"] = "load_xlsx a échoué"
+        return res
+
+    st.session_state["data_xlsx"] = data
+    res["save_all"], _ = mesurer(save_all, repetitions)
+
+    res["calculs"] = {nom: mesurer(lambda: calcul(data), repetitions)[0] for nom, calcul in CALCULS.items()}
+
+    if nb_processus() >= 2:
+        res["parallele"] = {}
+        # Démarrage des processus du pool hors mesure (une fois par exécution)
+        requete, args_req, fusion, colonnes = next(iter(REQUETES_PARALLELES.values()))
+        executer_par_annee(requete, data, *args_req, fusion=fusion, seuil=0, colonnes=colonnes)
+        for nom, (requete, args_req, fusion, colonnes) in REQUETES_PARALLELES.items():
+            direct, _ = mesurer(lambda: requete(data, *args_req), repetitions)
+            reparti, _ = mesurer(lambda: executer_par_annee(requete, data, *args_req, fusion=fusion,
+                                                            seuil=0, colonnes=colonnes), repetitions)
+            res["parallele"][nom] = {"direct": direct, "reparti": reparti}
+
+    res["onglets"] = {}
+    for module, fonction in ONGLETS:
+        mesure, erreurs = mesurer(lambda: rendre_onglet(module, fonction, data, timeout), repetitions)
+        if erreurs:
+            mesure["exceptions"] = erreurs
+        res["onglets"][module] = mesure
+
+    return res
+
+
+# --------------- RÉSULTATS -----------------
+
+def seuil_conseille(tailles):
+    """
+    Plus petite taille mesurée à partir de laquelle la répartition est plus
+    rapide pour toutes les requêtes (et le reste aux tailles supérieures) ; None sinon.
+    """
+    seuil = None
+    for n in sorted(tailles, key=int, reverse=True):
+        mesures = tailles[n].get("parallele")
+        if not mesures or any(m["reparti"]["min_s"] >= m["direct"]["min_s"] for m in mesures.values()):
+            break
+        seuil = int(n)
+    return seuil
+
+
+def _revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RACINE, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def enregistrer(resultats, sortie):
+    """Ajoute l'exécution courante à l'historique JSON `sortie`."""
+    historique = []
+    if os.path.exists(sortie):
+        with open(sortie, encoding="utf-8") as f:
+            historique = json.load(f)
+    historique.append(resultats)
+    with open(sortie, "w", encoding="utf-8") as f:
+        json.dump(historique, f, ensure_ascii=False, indent=2)
+    return historique
+
+
+def comparer(precedent, courant):
+    """Affiche le ratio courant / précédent pour chaque mesure commune."""
+    for taille, res in courant["tailles"].items():
+        avant = precedent.get("tailles", {}).get(taille)
+        if not avant:
+            continue
+        paires = [("load_xlsx", res.get("load_xlsx"), avant.get("load_xlsx")),
+                  ("save_all", res.get("save_all"), avant.get("save_all"))]
+        paires += [(m, v, avant.get("calculs", {}).get(m)) for m, v in res.get("calculs", {}).items()]
+        paires += [(m, v, avant.get("onglets", {}).get(m)) for m, v in res.get("onglets", {}).items()]
+        paires += [(f"{m} (réparti)", v["reparti"], avant.get("parallele", {}).get(m, {}).get("reparti"))
+                   for m, v in res.get("parallele", {}).items()]
+        for nom, v, a in paires:
+            if v and a and a["min_s"] > 0:
+                print(f"  {taille:>8} {nom:<26} {a['min_s']:>9.3f}s -> {v['min_s']:>9.3f}s  x{v['min_s'] / a['min_s']:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks Visa Manager sur classeurs synthétiques")
+    parser.add_argument("--tailles", type=int, nargs="+", default=TAILLES)
+    parser.add_argument("--repetitions", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=600, help="timeout AppTest par onglet (s)")
+    parser.add_argument("--sortie", default=os.path.join(RACINE, "bench_results.json"))
+    args = parser.parse_args(argv)
+
+    resultats = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "streamlit": st.__version__,
+        "processus": nb_processus(),
+        "tailles": {},
+    }
+    for n in args.tailles:
+        print(f"▶ {n} lignes…", flush=True)
+        resultats["tailles"][str(n)] = bench_taille(n, args.repetitions, args.timeout)
+        print(json.dumps(resultats["tailles"][str(n)], ensure_ascii=False, indent=2), flush=True)
+
+    if resultats["processus"] >= 2:
+        seuil = seuil_conseille(resultats["tailles"])
+        resultats["parallele"] = {"processus": resultats["processus"], "seuil_conseille": seuil}
+        if seuil is None:
+            print(f"Répartition sur {resultats['processus']} processus jamais plus rapide aux tailles mesurées "
+                  f"(garder {ENV_SEUIL} au-dessus de {max(args.tailles)}).")
+        else:
+            print(f"Répartition plus rapide dès {seuil} lignes : {ENV_SEUIL}={seuil}")
+
+    historique = enregistrer(resultats, args.sortie)
+    if len(historique) > 1:
+        print("Comparaison avec l'exécution précédente :")
+        comparer(historique[-2], resultats)
+    print(f"Résultats écrits dans {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
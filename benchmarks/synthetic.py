@@ -0,0 +1,157 @@
+"""Génération de classeurs « Clients BL.xlsx » synthétiques pour les benchmarks."""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common_data import DEFAULT_CLIENTS_COLUMNS, classeur_octets, ecrire_classeur
+
+# Arborescence Catégories → Sous-catégories → Visa (accents volontaires)
+ARBRE_VISA = [
+    ("1 - Affaires / Tourisme", "B-1", ["B-1 EOS", "B-1 COS"]),
+    ("1 - Affaires / Tourisme", "B-2", ["B-2 EOS", "B-2 COS"]),
+    ("2 - Étudiants", "F-1", ["F-1", "F-1 Réintégration"]),
+    ("3 - Treaty", "01     E-2", ["E-2  Inv.", "E-2 CP"]),
+    ("3 - Treaty", "03     E-2 ESE", ["E-2 ESE", "E-2 ESE ren"]),
+    ("4 - Trader", "05     H-1B", ["H-1B", "H-1B Extension"]),
+    ("4 - Trader", "06     L-2", ["L-1 - CP", "L-1-129"]),
+    ("5 - Family", "Marriage - USC", ["GC Marriage", "GC family"]),
+    ("6 - Lottery", "DV lottery", ["DV Loterie"]),
+    ("98 - Naturalization", "Naturalization", ["Naturalization"]),
+    ("99 - Other", "Divers", ["Re-entry Permit", "I-407", "Référé", "Consultation"]),
+]
+
+PRENOMS = ["HÉLÈNE", "FRANÇOIS", "JÉRÔME", "CHLOÉ", "DAVID", "ANITA", "LUCAS", "MÉLANIE", "NOÉMIE", "PIERRE"]
+NOMS = ["ATTALI", "KAKON", "RIVELLA", "ELMALEH", "LÉVY", "BENAÏM", "GARÇON", "TRECK", "COHEN", "DUPRÉ"]
+MODES = ["Chèque", "CB", "Virement", "Venmo", "Chèque, CB", "CB, Virement"]
+ESCROW = [1, 1.0, "x", "oui", "VRAI", "true", "", 0, "non"]
+COMMENTAIRES = ["Relance client", "Pièces manquantes — à réclamer", "RDV consulat fixé", "Dossier prioritaire"]
+
+
+def _montants_bruts(rng, montants):
+    """Mélange de formats réels : nombres, « 1 250,00 $ », « $1,250.00 », texte."""
+    styles = rng.integers(0, 6, size=len(montants))
+    out = np.empty(len(montants), dtype=object)
+    for i, (m, s) in enumerate(zip(montants, styles)):
+        if s == 0:
+            out[i] = float(m)
+        elif s == 1:
+            out[i] = int(m)
+        elif s == 2:
+            out[i] = f"{m:,.2f}".replace(",", " ").replace(".", ",") + " $"
+        elif s == 3:
+            out[i] = f"${m:,.2f}"
+        elif s == 4:
+            out[i] = f"{m:.2f}".replace(".", ",")
+        else:
+            out[i] = "Divers" if i % 97 == 0 else str(int(m))
+    return out
+
+
+def _dates_optionnelles(rng, base, proba, decalage_max):
+    """Dates postérieures à `base`, présentes avec une probabilité `proba`."""
+    decalage = pd.to_timedelta(rng.integers(1, decalage_max, size=len(base)), unit="D")
+    dates = pd.Series(base + decalage)
+    dates[rng.random(len(base)) >= proba] = pd.NaT
+    return dates
+
+
+def generer_clients(n, seed=0):
+    """Construit une feuille Clients de `n` lignes avec le schéma DEFAULT_CLIENTS_COLUMNS."""
+    rng = np.random.default_rng(seed)
+
+    branche = rng.integers(0, len(ARBRE_VISA), size=n)
+    cats = np.array([b[0] for b in ARBRE_VISA], dtype=object)[branche]
+    scats = np.array([b[1] for b in ARBRE_VISA], dtype=object)[branche]
+    visas = np.array([b[2][rng.integers(0, len(b[2]))] for b in (ARBRE_VISA[i] for i in branche)], dtype=object)
+    # Une partie des dossiers historiques n'a ni catégorie ni sous-catégorie
+    sans_cat = rng.random(n) < 0.1
+    cats[sans_cat] = None
+    scats[sans_cat] = None
+
+    ids = (12000 + np.arange(n)).astype(object)
+    suffixes = rng.random(n) < 0.02
+    ids[suffixes] = [f"{i}-{k}" for i, k in zip(ids[suffixes], rng.integers(1, 3, size=suffixes.sum()))]
+
+    dates = pd.Timestamp("2014-01-01") + pd.to_timedelta(rng.integers(0, 365 * 11, size=n), unit="D")
+    honoraires = rng.choice([0, 1590, 1910, 2500, 4300, 8700, 12550], size=n, p=[0.08, 0.2, 0.2, 0.2, 0.15, 0.12, 0.05])
+    honoraires = honoraires + rng.integers(0, 4, size=n) * 50
+    acompte1 = np.round(np.where(honoraires == 0, rng.integers(500, 5000, size=n), honoraires * rng.choice([0.5, 1.0], size=n)), 2)
+
+    df = pd.DataFrame({
+        "Dossier N": ids,
+        "Nom": [f"{PRENOMS[a]} {NOMS[b]}" for a, b in zip(rng.integers(0, len(PRENOMS), n), rng.integers(0, len(NOMS), n))],
+        "Date": dates,
+        "Catégories": cats,
+        "Sous-catégories": scats,
+        "Visa": visas,
+        "Montant honoraires (US $)": _montants_bruts(rng, honoraires),
+        "Autres frais (US $)": np.where(rng.random(n) < 0.2, rng.integers(50, 1200, size=n).astype(float), np.nan),
+        "Acompte 1": acompte1,
+        "Date Acompte 1": _dates_optionnelles(rng, dates, 0.8, 30),
+        "mode de paiement": np.where(rng.random(n) < 0.7, rng.choice(MODES, size=n), None),
+        "Escrow": rng.choice(np.array(ESCROW + [None] * 9, dtype=object), size=n),
+    })
+
+    for k, proba in ((2, 0.4), (3, 0.15), (4, 0.05)):
+        present = rng.random(n) < proba
+        df[f"Acompte {k}"] = np.where(present, np.round(honoraires * 0.25, 2), np.nan)
+        dates_k = _dates_optionnelles(rng, dates, 1.0, 60 * k)
+        dates_k[~present] = pd.NaT
+        df[f"Date Acompte {k}"] = dates_k
+
+    envoye = rng.random(n) < 0.6
+    date_envoi = _dates_optionnelles(rng, dates, 1.0, 90)
+    date_envoi[~envoye] = pd.NaT
+    df["Dossier envoyé"] = np.where(envoye, rng.choice(np.array([1, "x", "oui"], dtype=object), size=n), None)
+    df["Date envoi"] = date_envoi
+
+    issue = rng.choice(["accepté", "refusé", "Annulé", ""], size=n, p=[0.5, 0.1, 0.05, 0.35])
+    for statut, col_date in (("accepté", "Date acceptation"), ("refusé", "Date refus"), ("Annulé", "Date annulation")):
+        m = (issue == statut) & (envoye | (statut == "Annulé"))
+        df[f"Dossier {statut}"] = np.where(m, 1, None)
+        d = pd.Series(date_envoi.fillna(pd.Series(dates)) + pd.to_timedelta(rng.integers(10, 400, size=n), unit="D"))
+        d[~m] = pd.NaT
+        df[col_date] = d
+
+    df["RFE"] = np.where(rng.random(n) < 0.08, "RFE reçue — réponse envoyée", None)
+    df["Commentaires"] = np.where(rng.random(n) < 0.25, rng.choice(COMMENTAIRES, size=n), None)
+
+    return df[DEFAULT_CLIENTS_COLUMNS]
+
+
+def generer_visa():
+    """Feuille Visa : une ligne par (catégorie, sous-catégorie), une colonne par visa."""
+    options = sorted({v for _, _, visas in ARBRE_VISA for v in visas})
+    lignes = []
+    for cat, scat, visas in ARBRE_VISA:
+        ligne = {"Catégories": cat, "Sous-categorie": scat}
+        ligne.update({v: (1.0 if v in visas else np.nan) for v in options})
+        lignes.append(ligne)
+    return pd.DataFrame(lignes)
+
+
+def generer_feuilles(n, seed=0):
+    """Feuilles d'un classeur complet (Clients, Visa, ComptaCli, Escrow)."""
+    return {
+        "Clients": generer_clients(n, seed),
+        "Visa": generer_visa(),
+        "ComptaCli": pd.DataFrame({"ID_Client": DEFAULT_CLIENTS_COLUMNS[:8]}),
+        "Escrow": pd.DataFrame(columns=["Dossier N", "Nom", "Montant", "Date envoi", "État", "Date réclamation"]),
+    }
+
+
+def generer_classeur(n, seed=0):
+    """Retourne le contenu binaire d'un classeur complet."""
+    return classeur_octets(generer_feuilles(n, seed))
+
+
+def classeur_en_cache(n, seed=0, dossier=None):
+    """Génère (une seule fois) le classeur de `n` lignes sur disque et retourne son chemin."""
+    dossier = dossier or os.path.join(tempfile.gettempdir(), "visa_bench")
+    os.makedirs(dossier, exist_ok=True)
+    chemin = os.path.join(dossier, f"clients_{n}_{seed}.xlsx")
+    if not os.path.exists(chemin):
+        ecrire_classeur(generer_feuilles(n, seed), chemin)
+    return chemin
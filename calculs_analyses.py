@@ -0,0 +1,140 @@
+"""
+Calculs de l'onglet Analyses, sans Streamlit : base des dossiers (montants,
+date, année, mois, identifiants visa, filtrés par le service filtres),
+comparatif multi-années et comparaison de deux périodes (séries
+temporelles et entonnoir : series_temporelles et entonnoir). tab_analyses
+ne fait que l'affichage ; les résultats sont mis en cache par (version des
+données, filtres, paramètres).
+"""
+from dataclasses import dataclass
+
+import streamlit as st
+import pandas as pd
+
+from calculs_compta import AUTRES_FRAIS, HONORAIRES, montants
+from common_data import version_donnees
+from referentiel_visa import identifiants_visa
+
+# Colonne canonique -> noms acceptés dans le classeur (le premier présent est retenu)
+CANDIDATS = {
+    HONORAIRES: ["Montant honoraires (US $)", "Montant honoraires (US$)", "Honoraires (US $)"],
+    AUTRES_FRAIS: ["Autres frais (US $)", "Autres frais (US$)", "Autres Frais (US $)"],
+}
+CANDIDATS_DATE = ["Date création", "Date de création", "Date", "Date dossier", "Date Création"]
+COL_DATE = "_Date_"
+COL_FACTURE = "Montant facturé"
+INDICATEURS_MONTANTS = [COL_FACTURE, HONORAIRES, AUTRES_FRAIS]
+COLONNES_PERIODE = ["Nom", HONORAIRES, AUTRES_FRAIS, COL_FACTURE, COL_DATE]
+# Colonnes de la base indexées par le service filtres
+COLONNES_FILTRES = ["cat_id", "scat_id", "visa_id", "Année"]
+# Colonnes Clients lues par agregats_annuels
+COLONNES_ANNUELLES = ["Date", HONORAIRES, AUTRES_FRAIS]
+
+
+@dataclass(frozen=True)
+class ComparaisonAnnees:
+    """Comparatif des années sélectionnées."""
+    agregats: pd.DataFrame  # indicateurs en lignes, années en colonnes
+    par_visa: pd.DataFrame  # dossiers par libellé de visa et par année
+    dossiers: pd.DataFrame  # Année, Nom, honoraires (tri : année, honoraires décroissants)
+
+
+@dataclass(frozen=True)
+class ComparaisonPeriodes:
+    """Comparatif de deux périodes et dossiers de chacune."""
+    comparatif: pd.DataFrame  # indicateurs en lignes, « Période 1 » / « Période 2 » en colonnes
+    periodes: tuple           # dossiers de chaque période (COLONNES_PERIODE)
+
+
+# --------------- BASE -----------------
+
+def colonne_parmi(df, candidats):
+    return next((c for c in candidats if c in df.columns), None)
+
+
+def preparer_base(df, identifiants):
+    """
+    Dossiers avec montants canoniques (vides à 0), facturé, date de création,
+    année, mois et identifiants visa ; None si aucune colonne de date.
+    """
+    col_date = colonne_parmi(df, CANDIDATS_DATE)
+    if col_date is None:
+        return None
+    renommage = {}
+    for canonique, candidats in CANDIDATS.items():
+        trouvee = colonne_parmi(df, candidats)
+        if trouvee is not None and trouvee != canonique:
+            renommage[trouvee] = canonique
+    base = df.rename(columns=renommage) if renommage else df
+    m = montants(base, [HONORAIRES, AUTRES_FRAIS])
+    base = base.assign(**{
+        HONORAIRES: m[HONORAIRES],
+        AUTRES_FRAIS: m[AUTRES_FRAIS],
+        COL_FACTURE: m[HONORAIRES] + m[AUTRES_FRAIS],
+        COL_DATE: base[col_date],
+        "Année": base[col_date].dt.year,
+        "Mois": base[col_date].dt.month,
+    })
+    return base.join(identifiants)
+
+
+def base_analyses(data, version=None):
+    """Base des analyses gardée en session, recalculée à chaque révision des données."""
+    version = version or version_donnees()
+    cache = st.session_state.get("analyses_base")
+    if cache is None or cache[0] != version:
+        cache = (version, preparer_base(data["Clients"], identifiants_visa(data, version)))
+        st.session_state["analyses_base"] = cache
+    return cache[1]
+
+
+# --------------- COMPARAISONS -----------------
+
+def comparer_annees(base, annees, arbre):
+    """Agrégats, dossiers par visa et liste des dossiers des années `annees` (dans cet ordre)."""
+    sel = base[base["Année"].isin(annees)]
+    agregats = (
+        sel.groupby("Année")
+        .agg(**{c: (c, "sum") for c in INDICATEURS_MONTANTS}, **{"Nombre de dossiers": ("Dossier N", "count")})
+        .reindex(annees, fill_value=0)
+    )
+    par_visa = (sel.groupby(["visa_id", "Année"]).size().unstack(fill_value=0)
+                .reindex(columns=annees, fill_value=0).rename_axis(columns=None))
+    par_visa = par_visa.loc[sorted(par_visa.index, key=lambda i: (i < 0, i))]
+    par_visa.index = arbre.libelles_visa(par_visa.index.to_numpy()).to_numpy()
+    dossiers = sel[["Année", "Nom", HONORAIRES]].sort_values(by=["Année", HONORAIRES], ascending=[True, False])
+    return ComparaisonAnnees(agregats=agregats.T, par_visa=par_visa, dossiers=dossiers)
+
+
+def comparer_periodes(base, periodes):
+    """Comparatif de deux périodes ((début, fin), (début, fin)), bornes incluses."""
+    sels = [base[(base[COL_DATE] >= pd.Timestamp(debut)) & (base[COL_DATE] <= pd.Timestamp(fin))]
+            for debut, fin in periodes]
+    comparatif = pd.DataFrame(
+        {f"Période {i}": [len(s)] + [s[c].sum() for c in INDICATEURS_MONTANTS] for i, s in enumerate(sels, 1)},
+        index=["Nombre de dossiers"] + INDICATEURS_MONTANTS,
+    )
+    return ComparaisonPeriodes(comparatif=comparatif, periodes=tuple(s[COLONNES_PERIODE] for s in sels))
+
+
+def agregats_annuels(data):
+    """Dossiers, honoraires, frais et facturé par année de création."""
+    df = data["Clients"]
+    m = montants(df, [HONORAIRES, AUTRES_FRAIS])
+    res = pd.DataFrame({"Dossiers": 1, "Honoraires": m[HONORAIRES], "Autres frais": m[AUTRES_FRAIS]}, index=df.index)
+    res["Total facturé"] = res["Honoraires"] + res["Autres frais"]
+    return res.groupby(df["Date"].dt.year.astype("Int64").rename("Année")).sum()
+
+
+# --------------- CACHE -----------------
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def annees_en_cache(version, filtres, annees, _base, _arbre):
+    """Comparatif multi-années par (version, filtres, années) ; `_base` : dossiers filtrés, non hachés."""
+    return comparer_annees(_base, list(annees), _arbre)
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def periodes_en_cache(version, filtres, periodes, _base):
+    """Comparatif de périodes par (version, filtres, bornes des deux périodes)."""
+    return comparer_periodes(_base, periodes)
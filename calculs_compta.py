@@ -0,0 +1,108 @@
+"""
+Calculs de l'onglet Comptabilité, sans Streamlit : facturé, payé et solde
+par dossier et synthèses par visa et par année d'une sélection (filtres Visa
+/ Année / Mois résolus par le service filtres). tab_compta ne fait que
+l'affichage ; les résultats sont mis en cache par (version des données, filtres).
+"""
+from dataclasses import dataclass
+
+import streamlit as st
+import pandas as pd
+
+from common_data import version_donnees
+
+HONORAIRES = "Montant honoraires (US $)"
+AUTRES_FRAIS = "Autres frais (US $)"
+ACOMPTES = ["Acompte 1", "Acompte 2", "Acompte 3", "Acompte 4"]
+MONTANTS = [HONORAIRES, AUTRES_FRAIS] + ACOMPTES
+SYNTHESE = ["Montant facturé", "Total payé", "Solde restant"]
+COLONNES_DETAIL = ["Nom", "Visa", HONORAIRES, AUTRES_FRAIS] + SYNTHESE
+FILTRES = ["Visa", "Année", "Mois"]
+# Colonnes Clients lues par montants_compta
+COLONNES_SOURCE = ["Nom", "Visa", "Date", "Année", "Mois"] + MONTANTS
+
+
+@dataclass(frozen=True)
+class SyntheseCompta:
+    """Synthèse financière d'une sélection de dossiers."""
+    facture: float
+    paye: float
+    solde: float
+    detail: pd.DataFrame    # une ligne par dossier (COLONNES_DETAIL)
+    par_visa: pd.DataFrame  # facturé décroissant
+    par_annee: pd.DataFrame
+
+
+# --------------- CALCULS -----------------
+
+def montants(df, colonnes):
+    """Colonnes de montant de `df`, cases vides à 0 (colonne absente : 0)."""
+    return {c: df[c].fillna(0.0) if c in df.columns else pd.Series(0.0, index=df.index) for c in colonnes}
+
+
+def _periode(df, col, attribut):
+    """Année ou mois : colonne du classeur si elle existe, sinon tirée de la date de création."""
+    if col in df.columns:
+        return df[col]
+    return getattr(df["Date"].dt, attribut).astype("Int64")
+
+
+def montants_compta(df):
+    """Une ligne par dossier : nom, visa, montants, facturé, payé, solde, année et mois."""
+    m = montants(df, MONTANTS)
+    facture = m[HONORAIRES] + m[AUTRES_FRAIS]
+    paye = m["Acompte 1"] + m["Acompte 2"] + m["Acompte 3"] + m["Acompte 4"]
+    return pd.DataFrame({
+        "Nom": df["Nom"],
+        "Visa": df["Visa"],
+        HONORAIRES: m[HONORAIRES],
+        AUTRES_FRAIS: m[AUTRES_FRAIS],
+        "Montant facturé": facture,
+        "Total payé": paye,
+        "Solde restant": facture - paye,
+        "Année": _periode(df, "Année", "year"),
+        "Mois": _periode(df, "Mois", "month"),
+    }, index=df.index)
+
+
+def table_compta(data, version=None):
+    """
+    Montants par dossier gardés en session, recalculés à chaque révision des
+    données (`version` : celle de `data` s'il ne s'agit pas des données de la session).
+    """
+    version = version or version_donnees()
+    cache = st.session_state.get("compta_table")
+    if cache is None or cache[0] != version:
+        cache = (version, montants_compta(data["Clients"]))
+        st.session_state["compta_table"] = cache
+    return cache[1]
+
+
+def synthese_filtree(table, masque=None):
+    """Synthèse des dossiers de `table` (montants_compta) retenus par `masque` (None : tous)."""
+    sel = table if masque is None else table[masque]
+    return SyntheseCompta(
+        facture=float(sel["Montant facturé"].sum()),
+        paye=float(sel["Total payé"].sum()),
+        solde=float(sel["Solde restant"].sum()),
+        detail=sel[COLONNES_DETAIL],
+        par_visa=(sel.groupby("Visa", observed=True)[SYNTHESE].sum()
+                  .sort_values("Montant facturé", ascending=False).reset_index()),
+        par_annee=sel.groupby("Année")[SYNTHESE].sum().sort_index().reset_index(),
+    )
+
+
+def synthese_compta(data, par):
+    """Facturé, payé, solde et nombre de dossiers par `par` (« Visa » ou « Année »), dossiers sans clé compris."""
+    table = montants_compta(data["Clients"])
+    cle = table[par].astype("Int64") if par == "Année" else table[par].astype(object)
+    res = table[SYNTHESE].assign(Dossiers=1)
+    return res.groupby(cle.rename(par), observed=True, dropna=False).sum()
+
+
+# --------------- CACHE -----------------
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def synthese_en_cache(version, filtres, _table, _masque):
+    """Synthèse mise en cache par (version des données, filtres) ; `_masque` : lignes retenues, non haché."""
+    return synthese_filtree(_table, _masque)
@@ -0,0 +1,48 @@
+"""
+Calculs du tableau de bord, sans Streamlit : totaux des dossiers (honoraires,
+frais, acomptes, escrow) et indicateurs tirés de la table des statuts escrow.
+tab_dashboard ne fait que l'affichage.
+"""
+import streamlit as st
+import pandas as pd
+
+from calculs_compta import ACOMPTES, AUTRES_FRAIS, HONORAIRES, montants
+from statuts_escrow import masque_escrow
+
+COLONNES_ESCROW = ["Dossier N", "Nom", "Acompte 1", "Montant escrow", "Escrow", "Statut"]
+COLONNES_LISTE = ["Dossier N", "Nom", HONORAIRES, "Acompte 1"]
+
+
+# --------------- CALCULS -----------------
+
+def kpis_clients(data):
+    """Totaux du tableau de bord : dossiers, honoraires, frais, acomptes, escrow."""
+    df = data["Clients"]
+    m = montants(df, [HONORAIRES, AUTRES_FRAIS] + ACOMPTES)
+    escrow = masque_escrow(df)
+    return pd.Series({
+        "Dossiers": len(df),
+        "Honoraires (US $)": m[HONORAIRES].sum(),
+        "Autres frais (US $)": m[AUTRES_FRAIS].sum(),
+        "Total facturé (US $)": m[HONORAIRES].sum() + m[AUTRES_FRAIS].sum(),
+        "Acomptes reçus (US $)": sum(m[c].sum() for c in ACOMPTES),
+        "Dossiers en Escrow": int(escrow.sum()),
+        "Montant Escrow (US $)": m["Acompte 1"][escrow].sum(),
+    })
+
+
+def kpis_escrow(table):
+    """Dossiers, montant total et montant réclamé de la table des statuts escrow."""
+    return pd.Series({
+        "Dossiers en Escrow": len(table),
+        "Montant Escrow (US $)": table["Montant escrow"].sum(),
+        "Escrow réclamé (US $)": table.loc[table["Statut"] == "Réclamé", "Montant escrow"].sum(),
+    })
+
+
+# --------------- CACHE -----------------
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def kpis_en_cache(version, _data):
+    """Totaux par version des données ; `_data` n'est pas haché."""
+    return kpis_clients(_data)
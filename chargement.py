@@ -0,0 +1,82 @@
+"""
+Import d'un classeur en étapes (lecture, typage, validation, index, cache) :
+un générateur qui rend la main à l'interface entre chaque étape et chaque bloc
+de lignes, pour afficher la progression et permettre l'annulation.
+"""
+import os
+import time
+
+import streamlit as st
+
+from common_data import (
+    definir_donnees, definir_source, empreinte_contenu, etapes_lecture, installer_mesures, lire_identifiant, version_donnees,
+    TAILLE_BLOC,
+)
+from recherche import IndexRecherche
+
+# Étape -> (libellé, part de la barre de progression atteinte en fin d'étape)
+ETAPES = {
+    "lecture": ("Lecture et typage des lignes", 0.80),
+    "typage": ("Assemblage des blocs", 0.85),
+    "validation": ("Validation", 0.90),
+    "index": ("Index de recherche", 0.97),
+    "cache": ("Mise en session", 1.0),
+}
+
+
+def progression(evt):
+    """Fraction (0-1) de la barre de progression pour un événement d'étape."""
+    etapes = list(ETAPES)
+    i = etapes.index(evt["etape"])
+    debut = ETAPES[etapes[i - 1]][1] if i else 0.0
+    fin = ETAPES[evt["etape"]][1]
+    if evt.get("total"):
+        return debut + (fin - debut) * min(evt["lignes"] / evt["total"], 1.0)
+    return fin
+
+
+def libelle(evt):
+    texte = ETAPES[evt["etape"]][0]
+    if evt["etape"] == "lecture":
+        total = f" / {evt['total']:,}" if evt.get("total") else ""
+        texte += f" : {evt['lignes']:,}{total}".replace(",", " ")
+    return texte
+
+
+def etape_en_cours(evt):
+    """Étape qui suit l'événement `evt` (pour situer une éventuelle erreur)."""
+    etapes = list(ETAPES)
+    if evt["etape"] == "lecture":
+        return "lecture"
+    return etapes[min(etapes.index(evt["etape"]) + 1, len(etapes) - 1)]
+
+
+def importer_par_etapes(source, cle_source=None, taille_bloc=TAILLE_BLOC, annule=None):
+    """
+    Pipeline complet d'import. Produit les événements de etapes_lecture puis
+    ceux des étapes « index » et « cache ». Les données, les durées
+    (session_state["import_durees"]), la mémoire et le rapport de validation ne
+    remplacent ceux de la session qu'à la dernière étape : une annulation ou une
+    erreur en cours de route laisse la session intacte.
+    """
+    data, mesures = yield from etapes_lecture(source, taille_bloc, annule)
+    durees = mesures["import_durees"]
+
+    t0 = time.perf_counter()
+    index = IndexRecherche(None).construire(data["Clients"])
+    durees["index"] = time.perf_counter() - t0
+    yield {"etape": "index", "lignes": len(data["Clients"]), "total": None, "apercu": None}
+
+    t0 = time.perf_counter()
+    definir_donnees(data)
+    index.version = version_donnees()
+    st.session_state["index_recherche"] = index
+    if cle_source is not None:
+        st.session_state["fichier_importe"] = cle_source
+    nom = getattr(source, "name", None) or (source if isinstance(source, str) else "classeur.xlsx")
+    definir_source(f"upload:{os.path.basename(nom)}", empreinte_contenu(source), lire_identifiant(source))
+    durees["cache"] = time.perf_counter() - t0
+    # Durées, mémoire et rapport de validation : seulement pour un import installé
+    installer_mesures(mesures)
+    yield {"etape": "cache", "lignes": len(data["Clients"]), "total": None, "apercu": None}
+    return data
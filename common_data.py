@@ -1,8 +1,21 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import hashlib
 import io
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+from xml.etree import ElementTree
+import xlsxwriter
+from profiling import profile
 
 MAIN_FILE = "Clients BL.xlsx"
+# Propriété personnalisée du .xlsx portant l'identifiant du classeur : clé stable des
+# instantanés et de l'historique d'un classeur importé, quel que soit le nom du fichier
+PROPRIETE_IDENTIFIANT = "VisaManagerId"
 
 # Définition des colonnes exactes
 DEFAULT_CLIENTS_COLUMNS = [
@@ -36,64 +49,578 @@ DEFAULT_CLIENTS_COLUMNS = [
     "Commentaires"
 ]
 
+# --------------- TYPAGE DES COLONNES -----------------
+
+COLONNES_CATEGORIES = ["Catégories", "Sous-catégories", "Visa", "mode de paiement"]
+COLONNES_CASES = ["Escrow", "Dossier envoyé", "Dossier accepté", "Dossier refusé", "Dossier Annulé"]
+VALEURS_VRAI = ["true", "vrai", "1", "1.0", "oui", "yes", "y", "x", "ok"]
+
+
+def _type_colonne(col):
+    """Déduit le type logique d'une colonne Clients à partir de son nom."""
+    if col.startswith("Date"):
+        return "date"
+    if "(US $)" in col or col.startswith("Acompte"):
+        return "montant"
+    if col in COLONNES_CASES:
+        return "case"
+    if col in COLONNES_CATEGORIES:
+        return "categorie"
+    return "texte"
+
+
+CLIENTS_TYPES = {c: _type_colonne(c) for c in DEFAULT_CLIENTS_COLUMNS}
+COLONNES_MONTANTS = [c for c, t in CLIENTS_TYPES.items() if t == "montant"]
+COLONNES_DATES = [c for c, t in CLIENTS_TYPES.items() if t == "date"]
+
+# Feuille Escrow : journal des événements (une ligne par envoi ou réclamation d'un dossier)
+ESCROW_COLONNES = ["Dossier N", "Nom", "Montant", "Date envoi", "État", "Date réclamation", "Horodatage"]
+ETATS_ESCROW = ["Envoyé", "Réclamé"]
+ESCROW_TYPES = {
+    "Dossier N": "texte",
+    "Nom": "texte",
+    "Montant": "montant",
+    "Date envoi": "date",
+    "Date réclamation": "date",
+    "Horodatage": "date",
+}
+
 DEFAULT_SHEETS = {
     "Clients": DEFAULT_CLIENTS_COLUMNS,
     "Visa": [],
     "ComptaCli": [],
-    "Escrow": []
+    "Escrow": ESCROW_COLONNES
 }
 
 
-# --------------- LECTURE FICHIER -----------------
+# --------------- CONVERSIONS -----------------
 
-def load_xlsx(file_bytes):
-    """Charge correctement un XLSX uploadé sur Streamlit."""
+def montant_numerique(serie):
+    """Convertit une colonne de montants (« 1 250,00 $ », « $1,250.00 », 1250…) en float64."""
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype("float64")
+
+    txt = (
+        serie.astype(str)
+        .str.replace("\u00A0", "", regex=False)
+        .str.replace(r"[\s$]|US", "", regex=True)
+    )
+    # Si « , » et « . » sont présents, le dernier des deux est la décimale ;
+    # une virgule seule suivie de 3 chiffres est un séparateur de milliers
+    virgule, point = txt.str.rfind(","), txt.str.rfind(".")
+    les_deux = (virgule >= 0) & (point >= 0)
+    decimale_virgule = (les_deux & (virgule > point)) | (
+        (point < 0) & (virgule >= 0) & ~txt.str.contains(r",\d{3}(?:,|$)", regex=True)
+    )
+    txt = txt.where(~decimale_virgule, txt.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    txt = txt.where(decimale_virgule, txt.str.replace(",", "", regex=False))
+    return pd.to_numeric(txt, errors="coerce").astype("float64")
+
+
+def case_cochee(serie):
+    """Convertit une colonne de cases à cocher (1, « x », « oui », True…) en booléen nullable."""
+    if pd.api.types.is_bool_dtype(serie):
+        return serie.astype("boolean").fillna(False)
+    return serie.astype(str).str.strip().str.lower().isin(VALEURS_VRAI).astype("boolean")
+
+
+def date_typee(serie):
+    """Convertit une colonne de dates (datetime, texte jj/mm/aaaa, n° de série Excel) en datetime64."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_datetime(serie, unit="D", origin="1899-12-30", errors="coerce")
+    return pd.to_datetime(serie, errors="coerce", dayfirst=True, format="mixed")
+
+
+def _texte(serie):
+    """Texte nettoyé, valeurs vides conservées comme manquantes (12001.0 -> « 12001 »)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object)
+    vide = serie.isna()
+    txt = serie.astype(str).str.strip()
+    # Seules les vraies valeurs numériques sont réécrites (« 0123 » saisi en texte reste intact)
+    if pd.api.types.is_numeric_dtype(serie):
+        nombres = ~vide
+    elif serie.dtype == object:
+        nombres = serie.map(type).isin([int, float, np.int64, np.float64]) & ~vide
+    else:
+        nombres = pd.Series(False, index=serie.index)
+    if nombres.any():
+        num = pd.to_numeric(serie[nombres], errors="coerce")
+        entier = num[num % 1 == 0]
+        txt = txt.where(~txt.index.isin(entier.index), entier.astype("int64").astype(str).reindex(txt.index))
+    return txt.mask(vide | txt.eq(""))
+
+
+def _categorie(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return _texte(serie).astype("category")
+
+
+_CONVERTISSEURS = {
+    "montant": montant_numerique,
+    "case": case_cochee,
+    "date": date_typee,
+    "categorie": _categorie,
+    "texte": _texte,
+}
+
+
+def typer_clients(df):
+    """Applique le typage compact (CLIENTS_TYPES) aux colonnes présentes de la feuille Clients."""
+    df = df.copy()
+    for col, typ in CLIENTS_TYPES.items():
+        if col in df.columns:
+            serie = df[col]
+            if serie.dtype == object:
+                serie = serie.infer_objects()
+            df[col] = _CONVERTISSEURS[typ](serie)
+    return df
+
+
+def memoire_octets(df):
+    """Empreinte mémoire réelle d'un DataFrame (objets Python inclus)."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def typer_escrow(df):
+    """Type le journal Escrow (ESCROW_TYPES) ; « État » est une catégorie fixe (ETATS_ESCROW)."""
+    df = df.copy()
+    for col, typ in ESCROW_TYPES.items():
+        if col in df.columns:
+            df[col] = _CONVERTISSEURS[typ](df[col].infer_objects() if df[col].dtype == object else df[col])
+    if "État" in df.columns:
+        df["État"] = pd.Categorical(_texte(df["État"]), categories=ETATS_ESCROW)
+    return df
+
+
+# --------------- VALIDATION -----------------
+
+# Dates qui ne peuvent pas précéder le premier acompte
+CONTROLES_CHRONOLOGIE = [(f"Date Acompte {i}", "Date Acompte 1") for i in (2, 3, 4)]
+NB_EXEMPLES = 5
+
+
+def _renseigne(serie):
+    """Cellules effectivement saisies (ni vides, ni blanches)."""
+    if serie.dtype != object and not pd.api.types.is_string_dtype(serie):
+        return serie.notna().to_numpy()
+    return (serie.notna() & serie.astype(str).str.strip().ne("")).to_numpy()
+
+
+def valider_clients(brut, typee):
+    """
+    Contrôle la feuille Clients en une passe de masques NumPy et retourne un
+    rapport par colonne : conversions échouées, Dossier N en double, montants
+    négatifs, acomptes datés avant le premier.
+    """
+    controles = []
+    for col, typ in CLIENTS_TYPES.items():
+        if col not in typee.columns or col not in brut.columns:
+            continue
+        if typ in ("montant", "date"):
+            controles.append((col, "Conversion impossible", _renseigne(brut[col]) & typee[col].isna().to_numpy()))
+        if typ == "montant":
+            controles.append((col, "Montant négatif", (typee[col] < 0).to_numpy()))
+    if "Dossier N" in typee.columns:
+        ids = typee["Dossier N"]
+        controles.append(("Dossier N", "Doublon", (ids.notna() & ids.duplicated(keep=False)).to_numpy()))
+    for col, reference in CONTROLES_CHRONOLOGIE:
+        if col in typee.columns and reference in typee.columns:
+            controles.append((col, f"Antérieure à {reference}", (typee[col] < typee[reference]).to_numpy()))
+
+    colonnes = ["Colonne", "Contrôle", "Lignes", "Exemples (Dossier N)"]
+    if not controles:
+        return pd.DataFrame(columns=colonnes)
+
+    masques = np.column_stack([m for _, _, m in controles])
+    comptes = masques.sum(axis=0)
+    ids = typee["Dossier N"].astype(object).to_numpy() if "Dossier N" in typee.columns else typee.index.to_numpy()
+    lignes = []
+    for j in np.flatnonzero(comptes):
+        col, controle, _ = controles[j]
+        exemples = ids[np.flatnonzero(masques[:, j])[:NB_EXEMPLES]]
+        lignes.append((col, controle, int(comptes[j]), ", ".join(str(x) for x in exemples)))
+    return pd.DataFrame(lignes, columns=colonnes)
+
+
+def empreinte_contenu(source):
+    """Empreinte BLAKE2 du classeur (bytes, chemin ou fichier ouvert), clé du cache de validation."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (bytes, bytearray)):
+        h.update(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for bloc in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloc)
+    else:
+        h.update(source.getbuffer())
+    return h.hexdigest()
+
+
+def lire_identifiant(source):
+    """Identifiant enregistré dans les propriétés du classeur (bytes, chemin ou fichier ouvert), ou None."""
+    contenu = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    position = contenu.tell() if hasattr(contenu, "tell") else None
     try:
-        file_bytes = io.BytesIO(file_bytes)
+        with zipfile.ZipFile(contenu) as z:
+            proprietes = ElementTree.fromstring(z.read("docProps/custom.xml"))
+    except (KeyError, OSError, zipfile.BadZipFile, ElementTree.ParseError):
+        return None
+    finally:
+        if position is not None:
+            contenu.seek(position)
+    for prop in proprietes:
+        if prop.get("name") == PROPRIETE_IDENTIFIANT and len(prop) and prop[0].text:
+            return prop[0].text.strip()
+    return None
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def rapport_en_cache(empreinte, _brut, _typee):
+    """Rapport de validation mis en cache par empreinte du fichier ; les DataFrames ne sont pas hachés."""
+    return valider_clients(_brut, _typee)
+
+
+# --------------- LECTURE FICHIER -----------------
+
+TAILLE_BLOC = 20_000
+
+
+class ImportAnnule(Exception):
+    """Lecture interrompue à la demande de l'utilisateur."""
 
-        xls = pd.ExcelFile(file_bytes)
-        data = {}
 
-        for sheet, cols in DEFAULT_SHEETS.items():
-            if sheet in xls.sheet_names:
-                df = pd.read_excel(xls, sheet_name=sheet)
+def _entetes(ligne):
+    """Noms de colonnes comme read_excel : cellules vides « Unnamed: i », doublons suffixés « .1 »."""
+    vus, noms = {}, []
+    for i, v in enumerate(ligne):
+        nom = f"Unnamed: {i}" if v is None or str(v).strip() == "" else v
+        if nom in vus:
+            vus[nom] += 1
+            nom = f"{nom}.{vus[nom]}"
+        else:
+            vus[nom] = 0
+        noms.append(nom)
+    return noms
 
-                # Ajoute les colonnes manquantes (sécurité)
-                for c in cols:
-                    if c not in df.columns:
-                        df[c] = ""
-            else:
-                df = pd.DataFrame(columns=cols)
 
-            data[sheet] = df
+def _blocs_lignes(ws, taille_bloc):
+    """Lit une feuille openpyxl (read_only) par blocs de lignes ; retourne des DataFrames bruts."""
+    lignes = ws.iter_rows(values_only=True)
+    entete = list(next(lignes, ()))
+    while entete and entete[-1] is None:
+        entete.pop()
+    colonnes = _entetes(entete)
+    bloc, produits = [], 0
+    for ligne in lignes:
+        ligne = ligne[:len(colonnes)]
+        # Lignes entièrement vides ignorées, comme read_excel
+        if any(v is not None and v != "" for v in ligne):
+            bloc.append(ligne)
+        if len(bloc) >= taille_bloc:
+            yield pd.DataFrame(bloc, columns=colonnes)
+            bloc, produits = [], produits + 1
+    if bloc or not produits:
+        yield pd.DataFrame(bloc, columns=colonnes)
 
-        return data
 
+def _assembler(blocs):
+    """Concatène des blocs typés ; les catégories sont recalculées sur l'ensemble."""
+    if len(blocs) == 1:
+        return blocs[0]
+    df = pd.concat(blocs, ignore_index=True)
+    for col in df.columns:
+        if isinstance(blocs[0][col].dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def etapes_lecture(source, taille_bloc=TAILLE_BLOC, annule=None, en_session=True):
+    """
+    Lecture d'un classeur en étapes (générateur) : « lecture » et « typage » de la
+    feuille Clients par blocs de `taille_bloc` lignes, puis « validation ».
+    Chaque étape produit un dict {etape, lignes, total, apercu} ; `apercu` est le
+    premier bloc typé, affichable avant la fin du chargement. `annule()` est
+    consulté entre deux blocs. Retourne (valeur de StopIteration) le couple
+    (dict des feuilles, mesures) ; `mesures` regroupe les clés de session
+    import_durees, memoire_clients et rapport_validation, que l'appelant installe
+    avec les données (installer_mesures) : rien n'est écrit en session pendant la
+    lecture. Avec `en_session=False` (base de fusion, partition d'un autre bureau,
+    lecture possible hors du thread du script), seules les durées sont mesurées.
+    """
+    duree = {etape: 0.0 for etape in ("lecture", "typage", "validation")}
+    mesures = {"import_durees": duree}
+
+    t0 = time.perf_counter()
+    contenu = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    xls = pd.ExcelFile(contenu, engine="openpyxl")
+    data = {}
+    bruts, types = [], []
+    for sheet in DEFAULT_SHEETS:
+        if sheet in xls.sheet_names and sheet != "Clients":
+            data[sheet] = pd.read_excel(xls, sheet_name=sheet)
+
+    if "Clients" in xls.sheet_names:
+        ws = xls.book["Clients"]
+        total = max((ws.max_row or 1) - 1, 0) or None
+        lus = 0
+        blocs = _blocs_lignes(ws, taille_bloc)
+        while True:
+            bloc = next(blocs, None)
+            duree["lecture"] += time.perf_counter() - t0
+            if bloc is None:
+                break
+            t0 = time.perf_counter()
+            bloc = bloc.infer_objects()
+            for c in DEFAULT_CLIENTS_COLUMNS:
+                if c not in bloc.columns:
+                    bloc[c] = np.nan
+            bruts.append(bloc)
+            types.append(typer_clients(bloc))
+            duree["typage"] += time.perf_counter() - t0
+            lus += len(bloc)
+            yield {"etape": "lecture", "lignes": lus, "total": total, "apercu": types[0] if len(types) == 1 else None}
+            if annule is not None and annule():
+                raise ImportAnnule()
+            t0 = time.perf_counter()
+    xls.close()
+
+    if not bruts:
+        bruts = [pd.DataFrame(columns=DEFAULT_CLIENTS_COLUMNS)]
+        types = [typer_clients(bruts[0])]
+    t0 = time.perf_counter()
+    brut = pd.concat(bruts, ignore_index=True) if len(bruts) > 1 else bruts[0]
+    data["Clients"] = _assembler(types)
+    duree["typage"] += time.perf_counter() - t0
+    yield {"etape": "typage", "lignes": len(brut), "total": len(brut), "apercu": None}
+
+    t0 = time.perf_counter()
+    if en_session:
+        mesures["memoire_clients"] = {"avant": memoire_octets(brut), "apres": memoire_octets(data["Clients"])}
+        mesures["rapport_validation"] = rapport_en_cache(empreinte_contenu(source), brut, data["Clients"])
+    duree["validation"] = time.perf_counter() - t0
+    yield {"etape": "validation", "lignes": len(brut), "total": len(brut), "apercu": None}
+
+    # Feuilles absentes et colonnes manquantes (sécurité)
+    for sheet, cols in DEFAULT_SHEETS.items():
+        if sheet not in data:
+            data[sheet] = pd.DataFrame(columns=cols)
+        for c in cols:
+            if c not in data[sheet].columns:
+                data[sheet][c] = np.nan
+    data["Escrow"] = typer_escrow(data["Escrow"])
+    return {sheet: data[sheet] for sheet in DEFAULT_SHEETS}, mesures
+
+
+def installer_mesures(mesures):
+    """Met en session les mesures d'une lecture (etapes_lecture), une fois ses données installées."""
+    st.session_state.update(mesures)
+
+
+def lire_classeur(source):
+    """Classeur lu hors session (base de fusion, bureau, batch) : dict des feuilles seul."""
+    return executer(etapes_lecture(source, en_session=False))[0]
+
+
+def executer(etapes):
+    """Consomme un générateur d'étapes et retourne sa valeur finale."""
+    while True:
+        try:
+            next(etapes)
+        except StopIteration as fin:
+            return fin.value
+
+
+@profile()
+def load_xlsx(file_bytes):
+    """Charge correctement un XLSX uploadé sur Streamlit (bytes, chemin ou fichier ouvert)."""
+    try:
+        data, mesures = executer(etapes_lecture(file_bytes))
     except Exception as e:
         st.error(f"❌ Erreur lecture XLSX : {e}")
         return None
+    installer_mesures(mesures)
+    return data
+
+
+# ----------------- VERSION DES DONNÉES --------------------
+
+def version_donnees():
+    """Identifiant « chargement:révision » des données en session (clé des caches dérivés)."""
+    if "data_version" not in st.session_state:
+        # Données installées sans definir_donnees : on leur attribue un chargement propre
+        if st.session_state.get("data_xlsx") is None:
+            return "0:0"
+        st.session_state["data_version"] = f"{uuid.uuid4().hex[:8]}:0"
+    return st.session_state["data_version"]
+
+
+def definir_donnees(data):
+    """Installe un nouveau jeu de données en session (nouveau chargement, journal remis à zéro)."""
+    st.session_state["data_xlsx"] = data
+    st.session_state["data_version"] = f"{uuid.uuid4().hex[:8]}:0"
+    st.session_state["journal_modifs"] = []
+
+
+def definir_source(source, revision, classeur=None):
+    """
+    Mémorise l'origine des données en session (« drive:Clients BL.xlsx »,
+    « upload:fichier.xlsx »…), la révision chargée ou enregistrée, la
+    version des données à cet instant (pour savoir s'il y a des modifications
+    locales) et l'identifiant du classeur : `classeur` (lu dans le fichier),
+    sinon celui déjà en session pour la même source, sinon un nouveau.
+    """
+    precedente = st.session_state.get("source_donnees") or {}
+    if classeur is None and precedente.get("source") == source:
+        classeur = precedente.get("classeur")
+    st.session_state["source_donnees"] = {
+        "source": source,
+        "revision": revision,
+        "version": version_donnees(),
+        "classeur": classeur or uuid.uuid4().hex,
+    }
+
+
+def identifiant_classeur():
+    """Identifiant du classeur en session (écrit dans le fichier à chaque enregistrement), ou None."""
+    return (st.session_state.get("source_donnees") or {}).get("classeur")
+
+
+def marquer_modifie(lignes):
+    """
+    Incrémente la révision et note les index de lignes Clients modifiés, pour que
+    les structures dérivées (index de recherche…) se mettent à jour sans tout recalculer.
+    """
+    chargement, rev = version_donnees().split(":")
+    nouvelle = f"{chargement}:{int(rev) + 1}"
+    journal = st.session_state.setdefault("journal_modifs", [])
+    journal.append((nouvelle, list(lignes)))
+    del journal[:-200]
+    st.session_state["data_version"] = nouvelle
+    return nouvelle
+
+
+def modifs_depuis(version):
+    """Lignes modifiées depuis `version`, ou None si le journal ne permet pas de le savoir."""
+    courante = version_donnees()
+    if version == courante:
+        return []
+    if version.split(":")[0] != courante.split(":")[0]:
+        return None
+    rev = int(version.split(":")[1])
+    suivantes = [
+        (int(v.split(":")[1]), lignes)
+        for v, lignes in st.session_state.get("journal_modifs", [])
+        if int(v.split(":")[1]) > rev
+    ]
+    if not suivantes or suivantes[0][0] != rev + 1:
+        return None
+    return sorted({i for _, lignes in suivantes for i in lignes})
+
+
+# ----------------- MODIFICATIONS --------------------
+
+def ajouter_dossier(data, ligne):
+    """Ajoute un dossier à data['Clients'] en conservant le typage compact."""
+    df = data["Clients"]
+    nouvelle = typer_clients(pd.DataFrame([ligne]).reindex(columns=df.columns))
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            cats = df[col].cat.categories.union(nouvelle[col].dropna().astype(str).unique())
+            df[col] = df[col].cat.set_categories(cats)
+            nouvelle[col] = nouvelle[col].astype(df[col].dtype)
+    data["Clients"] = pd.concat([df, nouvelle], ignore_index=True)
+    marquer_modifie([data["Clients"].index[-1]])
+    return data["Clients"]
+
+
+def modifier_dossier(data, index, valeurs):
+    """Met à jour en place la ligne `index` de data['Clients'] (champs de `valeurs`) en conservant le typage compact."""
+    df = data["Clients"]
+    nouvelle = typer_clients(pd.DataFrame([valeurs]))
+    for col in nouvelle.columns:
+        if col not in df.columns:
+            continue
+        valeur = nouvelle[col].iloc[0]
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and pd.notna(valeur) and valeur not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories([valeur])
+        df.loc[index, col] = valeur
+    marquer_modifie([index])
+    return df.loc[index]
 
 
 # ----------------- SAUVEGARDE --------------------
 
+LIGNES_PAR_BLOC = 20_000
+
+
+def dossier_session():
+    """Répertoire temporaire propre à la session (sauvegardes, bases de fusion)."""
+    chemin = st.session_state.get("dossier_temp")
+    if not chemin or not os.path.isdir(chemin):
+        chemin = tempfile.mkdtemp(prefix="visa_manager_")
+        st.session_state["dossier_temp"] = chemin
+    return chemin
+
+
+def fichier_temp(prefixe, suffixe=".xlsx"):
+    """Chemin unique dans le répertoire temporaire de la session."""
+    return os.path.join(dossier_session(), f"{prefixe}_{uuid.uuid4().hex[:8]}{suffixe}")
+
+
+def ecrire_classeur(data, chemin, identifiant=None):
+    """
+    Écrit toutes les feuilles dans `chemin` avec xlsxwriter en mode constant_memory :
+    les lignes sont écrites bloc par bloc et vidées sur disque au fil de l'eau, le pic
+    mémoire ne dépend donc pas de la taille du classeur. (DataFrame.to_excel écrit
+    colonne par colonne et n'est pas compatible avec ce mode.) `identifiant` est
+    enregistré dans les propriétés du fichier (PROPRIETE_IDENTIFIANT).
+    """
+    tmp = chemin + ".tmp"
+    wb = xlsxwriter.Workbook(tmp, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+    if identifiant:
+        wb.set_custom_property(PROPRIETE_IDENTIFIANT, identifiant)
+    entete = wb.add_format({"bold": True, "border": 1, "align": "center"})
+    try:
+        for sheet, df in data.items():
+            ws = wb.add_worksheet(sheet)
+            colonnes = [str(c) for c in df.columns] or [" "]
+            ws.write_row(0, 0, colonnes, entete)
+            for debut in range(0, len(df), LIGNES_PAR_BLOC):
+                bloc = df.iloc[debut:debut + LIGNES_PAR_BLOC]
+                bloc = bloc.astype(object).where(bloc.notna(), None)
+                for i, ligne in enumerate(bloc.itertuples(index=False, name=None), start=debut + 1):
+                    ws.write_row(i, 0, ligne)
+    finally:
+        wb.close()
+    os.replace(tmp, chemin)
+    return chemin
+
+
+def classeur_octets(data, identifiant=None):
+    """Sérialise toutes les feuilles en un classeur XLSX (bytes)."""
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = ecrire_classeur(data, os.path.join(dossier, MAIN_FILE), identifiant)
+        with open(chemin, "rb") as f:
+            return f.read()
+
+
+@profile()
 def save_all():
-    """Sauvegarde dans session_state['last_saved_file'] un excel propre."""
+    """Sauvegarde un excel propre sur disque ; son chemin est dans session_state['last_saved_path']."""
     try:
         if "data_xlsx" not in st.session_state:
             st.error("Aucune donnée à sauvegarder.")
             return False
 
         data = st.session_state["data_xlsx"]
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-            for sheet, df in data.items():
-                if df.empty:
-                    df = pd.DataFrame({" ": []})
-                df.to_excel(writer, sheet_name=sheet, index=False)
-
-        output.seek(0)
-        st.session_state["last_saved_file"] = output.getvalue()
+        chemin = os.path.join(dossier_session(), MAIN_FILE)
+        st.session_state["last_saved_path"] = ecrire_classeur(data, chemin, identifiant_classeur())
+        from historique import historiser
+        historiser(data)
         st.success("💾 Sauvegarde effectuée.")
         return True
 
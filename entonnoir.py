@@ -0,0 +1,116 @@
+"""
+Entonnoir des dossiers (créé → envoyé → accepté / refusé / annulé, RFE) et
+délais de traitement (médiane et 90e centile) par visa et par année de
+création, calculés de façon vectorisée sur les colonnes de statut typées.
+"""
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+
+# Étape -> (case à cocher, date) : l'étape est franchie si l'une des deux est renseignée
+ETAPES = {
+    "Envoyés": ("Dossier envoyé", "Date envoi"),
+    "Acceptés": ("Dossier accepté", "Date acceptation"),
+    "Refusés": ("Dossier refusé", "Date refus"),
+    "Annulés": ("Dossier Annulé", "Date annulation"),
+}
+# Délai -> (date de début, date de fin)
+DELAIS = {
+    "Préparation": ("Date", "Date envoi"),
+    "Instruction": ("Date envoi", "Date acceptation"),
+    "Délai total": ("Date", "Date acceptation"),
+}
+QUANTILES = {"médiane": 0.5, "p90": 0.9}
+COMPTES = ["Dossiers"] + list(ETAPES) + ["RFE"]
+TAUX = ["Taux d'envoi %", "Taux d'acceptation %", "Taux de refus %"]
+COLONNES_DELAIS = [f"{d} {q} (j)" for q in QUANTILES for d in DELAIS]
+RFE_NEGATIF = ["", "0", "non", "no", "false", "faux"]
+
+
+# --------------- CALCULS -----------------
+
+def _colonne(df, col, defaut):
+    return df[col] if col in df.columns else pd.Series(defaut, index=df.index)
+
+
+def indicateurs_dossiers(df):
+    """Un indicateur 0/1 par étape et un délai en jours par couple de dates, pour chaque dossier."""
+    res = pd.DataFrame({"Dossiers": 1}, index=df.index)
+    for etape, (case, date) in ETAPES.items():
+        coche = _colonne(df, case, False).fillna(False).astype(bool)
+        res[etape] = (coche | _colonne(df, date, pd.NaT).notna()).astype("int64")
+    rfe = _colonne(df, "RFE", None)
+    res["RFE"] = (rfe.notna() & ~rfe.astype(str).str.strip().str.lower().isin(RFE_NEGATIF)).astype("int64")
+    for delai, (debut, fin) in DELAIS.items():
+        jours = (_colonne(df, fin, pd.NaT) - _colonne(df, debut, pd.NaT)).dt.days
+        res[delai] = jours.where(jours >= 0)  # dates incohérentes écartées
+    return res
+
+
+def agreger(indicateurs, cles=None):
+    """Comptes, taux de conversion et quantiles des délais par groupe `cles` (None : total)."""
+    if cles is None:
+        groupes = indicateurs.groupby(pd.Series("Total", index=indicateurs.index, name=""))
+    else:
+        groupes = indicateurs.groupby(cles, observed=True, sort=True)
+    res = groupes[COMPTES].sum()
+    for nom, q in QUANTILES.items():
+        res[[f"{d} {nom} (j)" for d in DELAIS]] = groupes[list(DELAIS)].quantile(q).to_numpy()
+
+    envoyes = res["Envoyés"].where(res["Envoyés"] > 0)
+    res["Taux d'envoi %"] = res["Envoyés"] / res["Dossiers"] * 100
+    res["Taux d'acceptation %"] = res["Acceptés"] / envoyes * 100
+    res["Taux de refus %"] = res["Refusés"] / envoyes * 100
+    return res[COMPTES + TAUX + COLONNES_DELAIS]
+
+
+def entonnoir_par_annee(data):
+    """Entonnoir par année de création des dossiers Clients datés (chaque année se calcule seule)."""
+    clients = data["Clients"]
+    ind = indicateurs_dossiers(clients)
+    ind["Année"] = clients["Date"].dt.year.astype("Int64")
+    return agreger(ind.dropna(subset=["Année"]), ["Année"])
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def entonnoir_en_cache(version, filtres, _df, _visas):
+    """
+    Entonnoir total, par visa, par année et par visa × année, mis en cache par
+    (version des données, filtres). `_df` porte les colonnes de statut et
+    « Année » ; `_visas` le libellé du visa de chaque ligne (ArbreVisa.libelles_visa :
+    libellé du référentiel, ou texte saisi pour un visa hors référentiel).
+    """
+    ind = indicateurs_dossiers(_df)
+    ind["Visa"] = _visas.reindex(_df.index).to_numpy()
+    ind["Année"] = _df["Année"].astype("Int64").to_numpy()
+    dates = ind.dropna(subset=["Année"])
+    return {
+        "total": agreger(ind),
+        "visa": agreger(ind, ["Visa"]),
+        "annee": agreger(dates, ["Année"]),
+        "visa_annee": agreger(dates, ["Visa", "Année"]),
+    }
+
+
+# --------------- GRAPHIQUES -----------------
+
+def figure_entonnoir(total):
+    """Entonnoir Dossiers → Envoyés → Acceptés (pourcentages rapportés aux dossiers)."""
+    ligne = total.iloc[0]
+    etapes = ["Dossiers", "Envoyés", "Acceptés"]
+    fig = go.Figure(go.Funnel(y=etapes, x=[int(ligne[e]) for e in etapes], textinfo="value+percent initial"))
+    fig.update_layout(margin=dict(l=10, r=10, t=10, b=10), height=260)
+    return fig
+
+
+def figure_delais(par_annee):
+    """Médiane et p90 des délais d'instruction et total, par année de création."""
+    fig = go.Figure()
+    for delai in ("Instruction", "Délai total"):
+        for nom, trait in (("médiane", "solid"), ("p90", "dot")):
+            col = f"{delai} {nom} (j)"
+            fig.add_trace(go.Scatter(x=par_annee.index.astype(str), y=par_annee[col], name=col,
+                                     mode="lines+markers", line=dict(dash=trait)))
+    fig.update_layout(title="Délais (jours) par année de création", margin=dict(l=10, r=10, t=40, b=10),
+                      legend=dict(orientation="h"))
+    return fig
@@ -0,0 +1,79 @@
+"""Export des feuilles en formats natifs (Parquet, Arrow IPC, CSV gzip), sans passer par Excel."""
+import os
+import zipfile
+
+import streamlit as st
+import pyarrow as pa
+import pyarrow.ipc
+
+from common_data import fichier_temp
+
+# format -> (extension, type MIME)
+FORMATS_EXPORT = {
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": (".arrow", "application/vnd.apache.arrow.file"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+}
+
+
+def _compatible_arrow(df):
+    """Les colonnes objet hétérogènes (ex. 12001 et « 12937-1 ») sont exportées en texte."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype(str).where(df[col].notna())
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def ecrire_feuille(df, fmt, cible):
+    """Sérialise une feuille dans le format demandé, vers `cible` (chemin ou fichier binaire ouvert en écriture)."""
+    if fmt == "Parquet":
+        _compatible_arrow(df).to_parquet(cible, index=False, compression="zstd")
+    elif fmt == "Arrow IPC":
+        table = pa.Table.from_pandas(_compatible_arrow(df), preserve_index=False)
+        with pa.ipc.new_file(cible, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+            writer.write_table(table)
+    elif fmt == "CSV (gzip)":
+        df.to_csv(cible, index=False, compression={"method": "gzip", "compresslevel": 6})
+    else:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+
+
+def ecrire_zip(data, feuilles, fmt, chemin):
+    """Archive ZIP contenant une entrée par feuille, écrite au fil de l'eau (déjà compressées : stockage simple)."""
+    ext = FORMATS_EXPORT[fmt][0]
+    with zipfile.ZipFile(chemin, "w", compression=zipfile.ZIP_STORED) as zf:
+        for sheet in feuilles:
+            with zf.open(f"{sheet}{ext}", "w", force_zip64=True) as entree:
+                ecrire_feuille(data[sheet], fmt, entree)
+
+
+def exporter(data, feuilles, fmt, zip_multi):
+    """
+    Écrit l'export dans un fichier temporaire de la session (jamais en bytes en
+    mémoire, comme la sauvegarde XLSX) ; retourne (chemin, extension, type MIME).
+    """
+    if zip_multi or len(feuilles) > 1:
+        chemin = fichier_temp("export", ".zip")
+        ecrire_zip(data, feuilles, fmt, chemin)
+        return chemin, ".zip", "application/zip"
+    ext, mime = FORMATS_EXPORT[fmt]
+    chemin = fichier_temp("export", ext)
+    ecrire_feuille(data[feuilles[0]], fmt, chemin)
+    return chemin, ext, mime
+
+
+def export_session(demande, data):
+    """
+    Export de la session pour `demande` (version, feuilles, format, zip) : refait
+    seulement si la demande change, le fichier précédent étant alors supprimé.
+    """
+    precedent = st.session_state.get("export_fichier")
+    if precedent is not None and precedent[0] == demande and os.path.exists(precedent[1]):
+        return precedent[1:]
+    if precedent is not None and os.path.exists(precedent[1]):
+        os.remove(precedent[1])
+    resultat = exporter(data, list(demande[1]), demande[2], demande[3])
+    st.session_state["export_fichier"] = (demande, *resultat)
+    return resultat
@@ -0,0 +1,148 @@
+"""
+Service de filtres des onglets : valeurs proposées et masque de lignes par
+valeur, calculés une fois par version des données.
+
+Pour chaque colonne filtrable, un tableau NumPy booléen (valeurs × lignes)
+donne les lignes de chaque valeur. Une sélection se résout par OU des lignes
+de ses valeurs puis ET entre colonnes ; les derniers masques combinés sont
+gardés dans un petit LRU. Après une modification (marquer_modifie), seules
+les lignes touchées sont déplacées d'une valeur à l'autre.
+"""
+from collections import OrderedDict
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+from common_data import modifs_depuis, version_donnees
+
+TAILLE_LRU = 32
+
+
+# --------------- INDEX -----------------
+
+class IndexFiltres:
+    """
+    Valeurs distinctes triées et masques de lignes par valeur pour quelques
+    colonnes d'un DataFrame (dans l'ordre de ses lignes). Les lignes sans
+    valeur ne correspondent à aucune sélection.
+    """
+
+    def __init__(self, version, colonnes):
+        self.version = version
+        self.colonnes = list(colonnes)
+        self.index = None
+        self.valeurs = {}    # colonne -> valeurs distinctes triées
+        self.position = {}   # colonne -> {valeur: ligne de `bits`}
+        self.bits = {}       # colonne -> tableau booléen (nb valeurs, nb lignes)
+        self.codes = {}      # colonne -> ligne de `bits` de chaque ligne (-1 : vide)
+        self._lru = OrderedDict()
+
+    def construire(self, df):
+        """Construction vectorisée : factorisation de chaque colonne puis un masque par valeur."""
+        self.index = df.index
+        n = len(df)
+        for col in self.colonnes:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            bits = np.zeros((len(uniques), n), dtype=bool)
+            renseigne = codes >= 0
+            bits[codes[renseigne], np.flatnonzero(renseigne)] = True
+            self.valeurs[col] = list(uniques.tolist() if hasattr(uniques, "tolist") else uniques)
+            self.position[col] = {v: i for i, v in enumerate(self.valeurs[col])}
+            self.bits[col] = bits
+            self.codes[col] = codes.astype("int64")
+        self._lru.clear()
+        return self
+
+    def mettre_a_jour(self, df, lignes):
+        """Déplace les lignes modifiées `lignes` (index de `df`) vers leurs nouvelles valeurs."""
+        pos = self.index.get_indexer(lignes)
+        for col in self.colonnes:
+            nouvelles = df[col].to_numpy(dtype=object)[pos]
+            for p, v in zip(pos, nouvelles):
+                ancien = self.codes[col][p]
+                if ancien >= 0:
+                    self.bits[col][ancien, p] = False
+                code = -1 if pd.isna(v) else self._code(col, v)
+                if code >= 0:
+                    self.bits[col][code, p] = True
+                self.codes[col][p] = code
+            # Valeurs qui n'ont plus de ligne retirées des options
+            self.valeurs[col] = [v for v in sorted(self.position[col]) if self.bits[col][self.position[col][v]].any()]
+        self._lru.clear()
+
+    def _code(self, col, valeur):
+        code = self.position[col].get(valeur)
+        if code is None:
+            code = len(self.position[col])
+            self.position[col][valeur] = code
+            self.bits[col] = np.vstack([self.bits[col], np.zeros((1, len(self.index)), dtype=bool)])
+        return code
+
+    def options(self, col, masque=None):
+        """Valeurs de `col`, triées ; avec `masque`, seulement celles présentes dans les lignes retenues."""
+        if masque is None:
+            return list(self.valeurs[col])
+        presentes = self.bits[col][:, masque].any(axis=1)
+        return [v for v in self.valeurs[col] if presentes[self.position[col][v]]]
+
+    def _masque_colonne(self, col, choisies):
+        codes = [self.position[col][v] for v in choisies if v in self.position[col]]
+        if len(codes) == len(self.position[col]) and (self.codes[col] >= 0).all():
+            return None  # toutes les valeurs : pas de contrainte
+        if not codes:
+            return np.zeros(len(self.index), dtype=bool)
+        return np.logical_or.reduce(self.bits[col][codes], axis=0)
+
+    def masque(self, selection):
+        """
+        Masque booléen des lignes retenues par `selection` (colonne -> valeurs
+        choisies, None : pas de filtre) : OU dans une colonne, ET entre colonnes.
+        """
+        cle = tuple(sorted((col, None if v is None else frozenset(v)) for col, v in selection.items()))
+        if cle in self._lru:
+            self._lru.move_to_end(cle)
+            return self._lru[cle]
+
+        res = np.ones(len(self.index), dtype=bool)
+        for col, choisies in selection.items():
+            if choisies is None:
+                continue
+            m = self._masque_colonne(col, choisies)
+            if m is not None:
+                res &= m
+        res.flags.writeable = False
+        self._lru[cle] = res
+        if len(self._lru) > TAILLE_LRU:
+            self._lru.popitem(last=False)
+        return res
+
+
+# --------------- INDEX EN SESSION -----------------
+
+def obtenir_filtres(nom, df, colonnes, version=None):
+    """
+    Index de filtres `nom` sur `colonnes` de `df`, gardé en session : construit
+    une fois par chargement, puis mis à jour à partir des seules lignes modifiées
+    (reconstruit si des lignes ont été ajoutées ou si le journal ne suffit pas).
+    `version` : celle de `df` s'il ne provient pas des données de la session.
+    """
+    version = version or version_donnees()
+    indexes = st.session_state.setdefault("index_filtres", {})
+    index = indexes.get(nom)
+
+    if index is not None and (index.version != version or index.colonnes != list(colonnes)):
+        # Mise à jour incrémentale seulement vers la version courante de la session
+        incremental = index.colonnes == list(colonnes) and version == version_donnees()
+        lignes = modifs_depuis(index.version) if incremental else None
+        if lignes is None or not index.index.equals(df.index):
+            index = None
+        else:
+            if lignes:
+                index.mettre_a_jour(df, lignes)
+            index.version = version
+
+    if index is None:
+        index = IndexFiltres(version, colonnes).construire(df)
+    indexes[nom] = index
+    return index
@@ -0,0 +1,249 @@
+"""
+Historique des enregistrements : chaque sauvegarde du classeur est gardée
+localement, par classeur (identité stable : fichier distant, ou identifiant
+enregistré dans le classeur importé), sous forme de delta colonnaire (Parquet des seules
+lignes modifiées ou ajoutées, numéros des lignes supprimées) par rapport à
+l'enregistrement précédent, avec un point de reprise complet périodique.
+
+L'état à un instant donné est reconstruit à partir du dernier point de
+reprise antérieur, en une passe sur les lignes des deltas qui suivent :
+le coût dépend du nombre de deltas, pas du nombre d'enregistrements.
+"""
+import json
+import os
+import re
+import threading
+import uuid
+
+import streamlit as st
+import pandas as pd
+
+from common_data import typer_clients, typer_escrow
+from instantane import fichier_source, identite
+
+REPRISE_TOUS = 20       # point de reprise complet au plus tous les N enregistrements
+PART_DELTA_MAX = 0.5    # ... ou dès qu'un delta touche plus de la moitié des lignes
+COL_LIGNE = "_ligne"
+FORMAT_INSTANT = "%Y%m%dT%H%M%S%f"
+
+# Plusieurs sessions peuvent enregistrer le même classeur (fichier distant partagé)
+_verrou = threading.Lock()
+
+
+# --------------- STOCKAGE -----------------
+
+def source_courante():
+    """
+    Identité du classeur de la session (historique partagé par les seules
+    sessions qui enregistrent ce classeur) ; à défaut, propre à la session.
+    """
+    origine = st.session_state.get("source_donnees")
+    if origine:
+        return identite(origine)
+    return "session:" + st.session_state.setdefault("historique_session", uuid.uuid4().hex)
+
+
+def dossier_historique(source):
+    dossier = fichier_source(source, ".historique")
+    os.makedirs(dossier, exist_ok=True)
+    return dossier
+
+
+def _nom_feuille(feuille):
+    return re.sub(r"[^\w-]+", "_", feuille, flags=re.UNICODE)
+
+
+def lire_journal(source):
+    """Enregistrements de `source`, du plus ancien au plus récent."""
+    chemin = os.path.join(dossier_historique(source), "journal.json")
+    if not os.path.exists(chemin):
+        return []
+    with open(chemin, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _ecrire_json(chemin, contenu):
+    tmp = chemin + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(contenu, f, ensure_ascii=False)
+    os.replace(tmp, chemin)
+
+
+def _compatible_parquet(df):
+    """Lignes d'une feuille pour Parquet : numéro de ligne en colonne, colonnes objet en texte."""
+    df = df.reset_index(names=COL_LIGNE)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype(str).where(df[col].notna())
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def _empreintes(df):
+    """Empreinte 64 bits de chaque ligne (valeurs et numéro de ligne)."""
+    return pd.util.hash_pandas_object(df, index=True).to_numpy()
+
+
+# --------------- ENREGISTREMENT -----------------
+
+def enregistrer_historique(data, source=None, instant=None):
+    """
+    Ajoute l'état de `data` à l'historique de `source` : delta par rapport au
+    dernier enregistrement, ou point de reprise complet. Retourne l'entrée du journal.
+    """
+    source = source or source_courante()
+    instant = pd.Timestamp(instant) if instant is not None else pd.Timestamp.now()
+    with _verrou:
+        return _enregistrer(data, source, instant)
+
+
+def _enregistrer(data, source, instant):
+    dossier = dossier_historique(source)
+    journal = lire_journal(source)
+    chemin_empreintes = os.path.join(dossier, "empreintes.parquet")
+    precedentes = pd.read_parquet(chemin_empreintes) if journal and os.path.exists(chemin_empreintes) else None
+
+    dernier = journal[-1] if journal else None
+    depuis_reprise = next((i for i, e in enumerate(reversed(journal)) if e["type"] == "complet"), len(journal))
+    complet = (
+        precedentes is None
+        or depuis_reprise + 1 >= REPRISE_TOUS
+        or set(data) != set(dernier["colonnes"])
+        or any(list(map(str, df.columns)) != dernier["colonnes"][f] for f, df in data.items())
+    )
+
+    stamp = instant.strftime(FORMAT_INSTANT)
+    entree = {"instant": instant.isoformat(), "type": "complet", "fichiers": {}, "supprimees": {},
+              "colonnes": {f: list(map(str, df.columns)) for f, df in data.items()},
+              "lignes": {f: len(df) for f, df in data.items()}}
+    lignes_delta = {}
+    empreintes = {}
+    for feuille, df in data.items():
+        emp = pd.Series(_empreintes(df), index=df.index)
+        empreintes[feuille] = emp
+        if complet:
+            continue
+        avant = precedentes.loc[precedentes["feuille"] == feuille].set_index("ligne")["empreinte"]
+        # Lignes nouvelles ou dont l'empreinte a changé
+        changees = emp.index[(avant.reindex(emp.index) != emp).to_numpy()]
+        lignes_delta[feuille] = changees
+        entree["supprimees"][feuille] = [int(i) for i in avant.index.difference(emp.index)]
+        if len(changees) > PART_DELTA_MAX * max(len(df), 1):
+            complet = True
+    if not complet:
+        entree["type"] = "delta"
+
+    for feuille, df in data.items():
+        lignes = df if complet else df.loc[lignes_delta[feuille]]
+        if not complet and lignes.empty:
+            continue
+        nom = f"{stamp}_{_nom_feuille(feuille)}.parquet"
+        _compatible_parquet(lignes).to_parquet(os.path.join(dossier, nom), index=False, compression="zstd")
+        entree["fichiers"][feuille] = nom
+    if complet:
+        entree["supprimees"] = {}
+
+    pd.concat(
+        [pd.DataFrame({"feuille": f, "ligne": e.index.to_numpy(dtype="int64"), "empreinte": e.to_numpy()})
+         for f, e in empreintes.items()],
+        ignore_index=True,
+    ).to_parquet(chemin_empreintes, index=False)
+    journal.append(entree)
+    _ecrire_json(os.path.join(dossier, "journal.json"), journal)
+    return entree
+
+
+def historiser(data):
+    """Ajoute une sauvegarde à l'historique du classeur courant ; un échec n'empêche pas la sauvegarde."""
+    try:
+        return enregistrer_historique(data)
+    except Exception as e:
+        st.warning(f"⚠️ Sauvegarde non ajoutée à l'historique : {e}")
+        return None
+
+
+# --------------- RECONSTRUCTION -----------------
+
+def _lire_feuille(dossier, nom):
+    return pd.read_parquet(os.path.join(dossier, nom))
+
+
+def etat_au(source, instant):
+    """
+    Classeur de `source` tel qu'enregistré au plus tard à `instant` :
+    (data, entrée du journal), ou (None, None) s'il n'y a pas d'enregistrement avant.
+    """
+    journal = [e for e in lire_journal(source) if pd.Timestamp(e["instant"]) <= pd.Timestamp(instant)]
+    if not journal:
+        return None, None
+    debut = max(i for i, e in enumerate(journal) if e["type"] == "complet")
+    reprise, deltas, cible = journal[debut], journal[debut + 1:], journal[-1]
+    dossier = dossier_historique(source)
+
+    data = {}
+    for feuille, colonnes in cible["colonnes"].items():
+        base = _lire_feuille(dossier, reprise["fichiers"][feuille]).set_index(COL_LIGNE)
+        # Dernière version de chaque ligne touchée par les deltas (ou sa suppression)
+        morceaux, supprimees = [], []
+        for rang, e in enumerate(deltas):
+            if feuille in e["fichiers"]:
+                morceaux.append(_lire_feuille(dossier, e["fichiers"][feuille]).assign(_rang=rang))
+            if e["supprimees"].get(feuille):
+                supprimees.append(pd.DataFrame({COL_LIGNE: e["supprimees"][feuille], "_rang": rang}))
+        if morceaux or supprimees:
+            touchees = pd.concat(morceaux + [s.assign(_supprimee=True) for s in supprimees], ignore_index=True)
+            touchees = touchees.sort_values("_rang", kind="stable").drop_duplicates(COL_LIGNE, keep="last")
+            garder = touchees["_supprimee"].isna() if "_supprimee" in touchees else pd.Series(True, index=touchees.index)
+            nouvelles = touchees[garder.to_numpy()].set_index(COL_LIGNE)[base.columns.intersection(colonnes)]
+            base = base.drop(index=touchees[COL_LIGNE], errors="ignore")
+            base = pd.concat([base, nouvelles]) if len(nouvelles) else base
+        base = base.sort_index().reindex(columns=colonnes)
+        base.index = base.index.astype("int64")
+        base.index.name = None
+        data[feuille] = base
+
+    if "Clients" in data:
+        data["Clients"] = typer_clients(data["Clients"])
+    if "Escrow" in data:
+        data["Escrow"] = typer_escrow(data["Escrow"])
+    return data, cible
+
+
+# --------------- SESSION -----------------
+
+def version_historique(source, entree):
+    """Version d'un état historique (clé des caches dérivés, distincte de tout chargement)."""
+    stamp = pd.Timestamp(entree["instant"]).strftime(FORMAT_INSTANT)
+    return f"hist-{os.path.basename(fichier_source(source, ''))}-{stamp}:0"
+
+
+def choisir_etat_historique(key):
+    """
+    Bascule « état historique » d'un onglet. Retourne None pour les données
+    courantes ; sinon (data, version) de l'état reconstruit à la date et
+    l'heure choisies, ou (None, None) s'il n'existe pas d'enregistrement avant.
+    """
+    source = source_courante()
+    journal = lire_journal(source)
+    if not journal or not st.toggle("📜 Analyser un état historique", key=key,
+                                    help="État du classeur tel qu'enregistré à une date donnée."):
+        return None
+
+    premier = pd.Timestamp(journal[0]["instant"])
+    c1, c2 = st.columns(2)
+    jour = c1.date_input("État au", value=pd.Timestamp.today().date(), min_value=premier.date(), key=f"{key}_jour")
+    heure = c2.time_input("Heure", value=pd.Timestamp("23:59").time(), key=f"{key}_heure")
+    instant = pd.Timestamp.combine(jour, heure)
+
+    cache = st.session_state.get("historique_etat")
+    if cache is None or cache["source"] != source or cache["instant"] != instant:
+        data, entree = etat_au(source, instant)
+        cache = {"source": source, "instant": instant, "data": data, "entree": entree}
+        st.session_state["historique_etat"] = cache
+    if cache["data"] is None:
+        st.warning(f"Aucun enregistrement avant le {instant:%d/%m/%Y %H:%M} (premier : {premier:%d/%m/%Y %H:%M}).")
+        return None, None
+    entree = cache["entree"]
+    st.caption(f"📜 État enregistré le {pd.Timestamp(entree['instant']):%d/%m/%Y à %H:%M} "
+               f"({entree['lignes'].get('Clients', 0)} dossiers) — lecture seule.")
+    return cache["data"], version_historique(source, entree)
@@ -0,0 +1,293 @@
+"""
+Instantanés locaux du jeu de données typé (démarrage à chaud).
+
+Après un redémarrage du processus Streamlit (déploiement, OOM, mise en veille),
+la session est vide : son dernier instantané est restauré. Un instantané est
+identifié par un jeton aléatoire gardé dans l'URL de la session
+(?instantane=…) : seule une session qui le présente retrouve ses données, une
+nouvelle session part vide. Pour une source distante, la révision courante
+est comparée avant restauration et le fichier n'est retéléchargé que s'il a
+changé.
+
+Les feuilles sont stockées en Parquet dans un répertoire privé (0700). Les
+fichiers annexes d'un classeur (journal escrow, historique) sont rangés sous
+son identité : fichier distant, ou identifiant enregistré dans le classeur.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+import streamlit as st
+import pandas as pd
+
+from common_data import definir_donnees, definir_source, fichier_temp, typer_clients, typer_escrow, version_donnees
+
+# Répertoire des instantanés (VISA_SNAPSHOT_DIR pour le placer sur un disque persistant)
+ENV_DOSSIER = "VISA_SNAPSHOT_DIR"
+DOSSIER_DEFAUT = os.path.join(os.path.expanduser("~"), ".visa_manager", "instantanes")
+INTERVALLE_S = 60
+CONSERVATION_S = 7 * 24 * 3600  # instantanés des sessions abandonnées
+# Paramètre d'URL portant le jeton d'instantané de la session
+PARAM_URL = "instantane"
+SOURCES_DISTANTES = ("drive", "dropbox", "local", "http", "https")
+
+
+def dossier_instantanes():
+    """Répertoire des instantanés, accessible au seul utilisateur du serveur."""
+    dossier = os.getenv(ENV_DOSSIER) or DOSSIER_DEFAUT
+    if not os.path.isdir(dossier):
+        os.makedirs(os.path.dirname(dossier), mode=0o700, exist_ok=True)
+        os.makedirs(dossier, mode=0o700, exist_ok=True)
+        os.chmod(dossier, 0o700)
+    return dossier
+
+
+def identite(origine):
+    """
+    Identité stable du classeur d'une origine (source_donnees) : le fichier
+    distant, sinon l'identifiant enregistré dans le classeur importé.
+    """
+    if origine["source"].partition(":")[0] in SOURCES_DISTANTES:
+        return origine["source"]
+    return f"classeur:{origine['classeur']}"
+
+
+def _cle(identite_classeur):
+    return hashlib.sha256(identite_classeur.encode("utf-8")).hexdigest()[:24]
+
+
+def _jeton_valide(jeton):
+    return bool(jeton) and re.fullmatch(r"[0-9a-f]{32}", jeton) is not None
+
+
+def jeton_session():
+    """Jeton d'instantané de la session : celui de l'URL, sinon un nouveau (ajouté à l'URL)."""
+    jeton = st.query_params.get(PARAM_URL)
+    if not _jeton_valide(jeton):
+        jeton = uuid.uuid4().hex
+        st.query_params[PARAM_URL] = jeton
+    return jeton
+
+
+def _chemins(cle, revision):
+    """(préfixe des feuilles, base de fusion, métadonnées) pour un jeton et une révision."""
+    dossier = dossier_instantanes()
+    nom = cle + "@" + re.sub(r"[^\w.-]+", "_", str(revision))
+    return (
+        os.path.join(dossier, nom),
+        os.path.join(dossier, nom + ".base.xlsx"),
+        os.path.join(dossier, cle + ".json"),
+    )
+
+
+def fichier_source(identite_classeur, extension):
+    """Fichier annexe d'un classeur (identite()) dans le répertoire des instantanés (journal escrow…)."""
+    return os.path.join(dossier_instantanes(), _cle(identite_classeur) + extension)
+
+
+def _ecrire_atomique(chemin, ecrire):
+    tmp = chemin + ".tmp"
+    with open(tmp, "wb") as f:
+        ecrire(f)
+    os.replace(tmp, chemin)
+
+
+def _nom_feuille(feuille):
+    return re.sub(r"[^\w-]+", "_", feuille, flags=re.UNICODE)
+
+
+def _ecrire_feuilles(data, prefixe):
+    """Une feuille par fichier Parquet ; retourne feuille -> nom de fichier."""
+    fichiers = {}
+    for feuille, df in data.items():
+        df = df.copy()
+        objets = [c for c in df.columns if df[c].dtype == object]
+        for col in objets:
+            df[col] = df[col].astype(str).where(df[col].notna())  # Parquet : un type par colonne
+        df.columns = [str(c) for c in df.columns]
+        chemin = f"{prefixe}.{_nom_feuille(feuille)}.parquet"
+        _ecrire_atomique(chemin, lambda f: df.to_parquet(f, compression="zstd"))
+        fichiers[feuille] = os.path.basename(chemin)
+    return fichiers
+
+
+def _lire_feuilles(fichiers):
+    dossier = dossier_instantanes()
+    data = {feuille: pd.read_parquet(os.path.join(dossier, nom)) for feuille, nom in fichiers.items()}
+    if "Clients" in data:
+        data["Clients"] = typer_clients(data["Clients"])
+    if "Escrow" in data:
+        data["Escrow"] = typer_escrow(data["Escrow"])
+    return data
+
+
+# --------------- ÉCRITURE -----------------
+
+def ecrire_instantane():
+    """Écrit l'instantané des données de la session ; retourne le chemin ou None."""
+    origine = st.session_state.get("source_donnees")
+    data = st.session_state.get("data_xlsx")
+    if not origine or data is None:
+        return None
+
+    source, revision = origine["source"], origine["revision"]
+    cle = jeton_session()
+    prefixe, chemin_base, chemin_meta = _chemins(cle, revision)
+    fichiers = _ecrire_feuilles(data, prefixe)
+
+    # Base de fusion (classeur distant à cette révision) : nécessaire pour fusionner après restauration
+    base = st.session_state.get("synchro_base", {}).get("chemin")
+    if base and os.path.exists(base) and not os.path.exists(chemin_base):
+        shutil.copyfile(base, chemin_base)
+
+    meta = {
+        "source": source,
+        "revision": revision,
+        "classeur": origine.get("classeur"),
+        "donnees": fichiers,
+        "base": os.path.basename(chemin_base) if os.path.exists(chemin_base) else None,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "modifie": version_donnees() != origine["version"],
+    }
+    _ecrire_atomique(chemin_meta, lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+
+    # Une seule révision conservée par session
+    gardes = set(fichiers.values()) | {meta["base"]}
+    for ancien in glob.glob(os.path.join(dossier_instantanes(), cle + "@*")):
+        if os.path.basename(ancien) not in gardes:
+            os.remove(ancien)
+    _purger()
+
+    st.session_state["instantane"] = {"version": version_donnees(), "heure": time.time()}
+    return chemin_meta
+
+
+def _purger(conservation_s=CONSERVATION_S):
+    """Supprime les instantanés des sessions sans écriture depuis `conservation_s` secondes."""
+    dossier = dossier_instantanes()
+    limite = time.time() - conservation_s
+    for meta in glob.glob(os.path.join(dossier, "*.json")):
+        jeton = os.path.basename(meta)[:-len(".json")]
+        if not _jeton_valide(jeton):
+            continue
+        try:
+            if os.path.getmtime(meta) >= limite:
+                continue
+            for chemin in glob.glob(os.path.join(dossier, jeton + "@*")) + [meta]:
+                os.remove(chemin)
+        except OSError:
+            pass  # supprimé entre-temps
+
+
+def instantane_periodique(intervalle=INTERVALLE_S):
+    """
+    À appeler en fin de rerun : écrit un instantané si les données ont changé
+    depuis le dernier, au plus une fois par `intervalle` secondes (immédiatement
+    après un nouveau chargement).
+    """
+    if st.session_state.get("data_xlsx") is None or "source_donnees" not in st.session_state:
+        return None
+    dernier = st.session_state.get("instantane")
+    version = version_donnees()
+    if dernier:
+        if dernier["version"] == version:
+            return None
+        meme_chargement = dernier["version"].split(":")[0] == version.split(":")[0]
+        if meme_chargement and time.time() - dernier["heure"] < intervalle:
+            return None
+    try:
+        return ecrire_instantane()
+    except OSError as e:
+        st.warning(f"⚠️ Instantané local non écrit : {e}")
+        return None
+
+
+# --------------- RESTAURATION -----------------
+
+def instantane_de(jeton):
+    """Métadonnées de l'instantané de la session de jeton `jeton`, ou None."""
+    if not _jeton_valide(jeton):
+        return None
+    dossier = dossier_instantanes()
+    try:
+        with open(os.path.join(dossier, jeton + ".json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta.get("donnees"), dict):
+        return None  # ancien format (pickle) : ignoré
+    if not all(os.path.exists(os.path.join(dossier, nom)) for nom in meta["donnees"].values()):
+        return None
+    return meta
+
+
+def remote_depuis_source(source):
+    """Stockage distant correspondant à une source (None pour un fichier importé)."""
+    from synchro import RemoteDrive, RemoteDropbox, RemoteHttp, RemoteLocal
+
+    genre, _, nom = source.partition(":")
+    if genre in ("http", "https"):
+        return RemoteHttp(source)
+    return {"drive": RemoteDrive, "dropbox": RemoteDropbox, "local": RemoteLocal}.get(genre, lambda _: None)(nom)
+
+
+def _installer(meta):
+    dossier = dossier_instantanes()
+    data = _lire_feuilles(meta["donnees"])
+    definir_donnees(data)
+    if meta.get("base"):
+        base = fichier_temp("base")
+        shutil.copyfile(os.path.join(dossier, meta["base"]), base)
+        st.session_state["synchro_base"] = {"chemin": base, "revision": meta["revision"]}
+    definir_source(meta["source"], meta["revision"], meta.get("classeur"))
+    from journal_escrow import rejouer_journal
+    rejouer_journal(data)  # événements escrow postérieurs à l'instantané
+    if meta.get("modifie"):
+        # Les modifications non enregistrées restent signalées comme telles
+        st.session_state["source_donnees"]["version"] = None
+    st.session_state["instantane"] = {"version": version_donnees(), "heure": time.time()}
+    return data
+
+
+def restaurer_au_demarrage():
+    """
+    Restaure l'instantané désigné par le jeton de l'URL de la session
+    (?instantane=…) si elle n'a pas de données (une seule tentative par
+    session) ; une session sans ce jeton ne reprend aucun classeur. Pour une source
+    distante, la révision courante est vérifiée : si le fichier a changé et
+    que l'instantané n'a pas de modifications locales, il est retéléchargé ;
+    sinon l'instantané est repris.
+    Retourne un message décrivant ce qui a été fait, ou None.
+    """
+    if st.session_state.get("data_xlsx") is not None or st.session_state.get("instantane_essaye"):
+        return None
+    st.session_state["instantane_essaye"] = True
+
+    meta = instantane_de(st.query_params.get(PARAM_URL))
+    if meta is None:
+        return None
+
+    remote = remote_depuis_source(meta["source"])
+    if remote is not None:
+        try:
+            courante = remote.revision()
+        except Exception:
+            courante = meta["revision"]  # hors ligne : l'instantané fait foi
+        if courante != meta["revision"]:
+            if not meta.get("modifie"):
+                from synchro import charger_distant
+                if charger_distant(remote) is not None:
+                    ecrire_instantane()
+                    return f"Classeur retéléchargé ({meta['source']}, révision {courante})."
+            _installer(meta)
+            return (f"Instantané du {meta['date']} restauré avec vos modifications non enregistrées ; "
+                    f"le fichier distant a changé depuis (révision {courante}).")
+
+    _installer(meta)
+    return f"Instantané du {meta['date']} restauré ({meta['source']})."
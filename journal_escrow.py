@@ -0,0 +1,97 @@
+"""
+Journal des événements escrow (envoi du dossier, réclamation des fonds).
+
+Chaque action ajoute une ligne typée à la feuille « Escrow » et au fichier
+journal de la source (CSV en ajout seul, à côté des instantanés) : rien
+n'est réécrit, le classeur complet n'est sérialisé qu'à l'enregistrement.
+La ligne Clients concernée est signalée par marquer_modifie, les vues
+dérivées (statuts escrow, tableau de bord) ne recalculent que ce dossier.
+"""
+import os
+
+import streamlit as st
+import pandas as pd
+
+from common_data import ESCROW_COLONNES, dossier_session, marquer_modifie, typer_escrow
+from instantane import fichier_source, identite
+
+
+def chemin_journal():
+    """Journal du classeur courant ; à défaut, dans le répertoire de la session."""
+    origine = st.session_state.get("source_donnees")
+    if origine:
+        return fichier_source(identite(origine), ".escrow.csv")
+    return os.path.join(dossier_session(), "escrow_evenements.csv")
+
+
+def _ajouter_au_journal(lignes):
+    chemin = chemin_journal()
+    lignes.to_csv(chemin, mode="a", header=not os.path.exists(chemin), index=False, date_format="%Y-%m-%dT%H:%M:%S.%f")
+
+
+def _appliquer(data, evenements):
+    """Reporte des événements typés sur Clients et la feuille Escrow ; retourne les lignes Clients touchées."""
+    clients = data["Clients"]
+    position = pd.Series(clients.index, index=clients["Dossier N"].to_numpy())
+    position = position[~position.index.duplicated()]
+    lignes = position.reindex(evenements["Dossier N"].to_numpy())
+
+    envois = (evenements["État"] == "Envoyé").to_numpy() & lignes.notna().to_numpy()
+    if envois.any():
+        idx = lignes[envois].astype("int64").to_numpy()
+        clients.loc[idx, "Dossier envoyé"] = True
+        clients.loc[idx, "Date envoi"] = evenements.loc[envois, "Date envoi"].to_numpy()
+
+    data["Escrow"] = pd.concat([data["Escrow"], evenements], ignore_index=True) if len(data["Escrow"]) else evenements
+    return sorted(set(lignes.dropna().astype("int64")))
+
+
+def enregistrer_evenement(data, dossier_n, etat, date):
+    """
+    Enregistre « Envoyé » ou « Réclamé » pour un dossier à la date `date` :
+    ajout à la feuille Escrow et au journal, mise à jour de la ligne Clients.
+    """
+    clients = data["Clients"]
+    trouve = clients.index[clients["Dossier N"] == dossier_n]
+    if len(trouve) == 0:
+        raise KeyError(f"Dossier {dossier_n} introuvable")
+    idx = trouve[0]
+    date = pd.Timestamp(date)
+    evenement = typer_escrow(pd.DataFrame([{
+        "Dossier N": dossier_n,
+        "Nom": clients.at[idx, "Nom"],
+        "Montant": clients.at[idx, "Acompte 1"],
+        "Date envoi": date if etat == "Envoyé" else clients.at[idx, "Date envoi"],
+        "État": etat,
+        "Date réclamation": date if etat == "Réclamé" else pd.NaT,
+        "Horodatage": pd.Timestamp.now().floor("ms"),
+    }], columns=ESCROW_COLONNES))
+
+    _ajouter_au_journal(evenement)
+    marquer_modifie(_appliquer(data, evenement))
+    return evenement
+
+
+def _cles(evenements):
+    """Identité d'un événement : dossier, état et horodatage (à la milliseconde, comme à l'écriture)."""
+    return pd.MultiIndex.from_arrays([
+        evenements["Dossier N"].astype(str),
+        evenements["État"].astype(str),
+        evenements["Horodatage"].dt.floor("ms"),
+    ])
+
+
+def rejouer_journal(data):
+    """
+    Rejoue les événements du journal absents de la feuille Escrow (après
+    restauration d'un instantané). Retourne le nombre d'événements repris.
+    """
+    chemin = chemin_journal()
+    if not os.path.exists(chemin):
+        return 0
+    journal = typer_escrow(pd.read_csv(chemin, dtype=str))
+    journal = journal[~_cles(journal).isin(_cles(data["Escrow"]))]
+    if journal.empty:
+        return 0
+    marquer_modifie(_appliquer(data, journal.reset_index(drop=True)))
+    return len(journal)
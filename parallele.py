@@ -0,0 +1,195 @@
+"""
+Exécution multi-processus des agrégations lourdes (historiques de plusieurs
+années, plusieurs bureaux) : la feuille Clients est découpée par année de
+création, chaque tranche est déposée en Arrow IPC dans un segment de mémoire
+partagée et relue sans copie par un processus du pool, qui calcule
+l'agrégat partiel. Les partiels sont ensuite fusionnés :
+
+- « somme » : agrégats additifs (sommes, comptes), ajoutés clé par clé ;
+- « concat » : regroupements qui contiennent l'année (quantiles par année…),
+  chaque groupe étant entier dans sa tranche.
+
+En dessous de SEUIL_LIGNES lignes, avec une seule année ou sans processus
+configurés, la requête est exécutée directement : démarrer les tranches
+coûte plus que le calcul. Le seuil est mesuré par benchmarks.run (section
+« parallele ») et se règle par la variable VISA_SEUIL_PARALLELE ;
+VISA_PROCESSUS fixe le nombre de processus (0 : désactivé).
+
+Les processus exécutent _calculer_tranche, fonction de ce module (préchargé
+par le serveur « forkserver ») ; comme tout processus multiprocessing, ils
+réimportent le script principal sous le nom « __mp_main__ » : un script qui
+appelle executer_par_annee protège son exécution par `if __name__ == "__main__"`
+(app.py, batch.py).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import reduce
+from multiprocessing import shared_memory, util
+
+import pandas as pd
+import pyarrow as pa
+
+ENV_PROCESSUS = "VISA_PROCESSUS"
+ENV_SEUIL = "VISA_SEUIL_PARALLELE"
+SEUIL_LIGNES = 200_000
+MAX_PROCESSUS = 8
+FUSIONS = ("somme", "concat")
+
+logger = logging.getLogger("visa_manager.parallele")
+
+_pool = None
+_pid = None
+_verrou = threading.Lock()
+
+
+# --------------- CONFIGURATION -----------------
+
+def nb_processus():
+    """Processus du pool : VISA_PROCESSUS, sinon les cœurs disponibles (au plus MAX_PROCESSUS)."""
+    valeur = os.getenv(ENV_PROCESSUS)
+    if valeur is not None:
+        return max(0, int(valeur))
+    return min(MAX_PROCESSUS, os.cpu_count() or 1)
+
+
+def seuil_lignes():
+    return int(os.getenv(ENV_SEUIL, SEUIL_LIGNES))
+
+
+def _contexte():
+    """
+    Démarrage des processus sans fork du serveur (qui a déjà des threads) :
+    serveur « forkserver » qui n'importe que ce module, sinon « spawn ».
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    contexte = multiprocessing.get_context("forkserver")
+    contexte.set_forkserver_preload([__name__])
+    return contexte
+
+
+def _obtenir_pool():
+    """Pool de processus partagé par les sessions, créé au premier calcul réparti."""
+    global _pool, _pid
+    with _verrou:
+        # Processus issu d'un fork (batch) : le pool hérité appartient au parent
+        if _pool is None or _pid != os.getpid():
+            _pid = os.getpid()
+            _pool = ProcessPoolExecutor(max_workers=nb_processus(), mp_context=_contexte())
+            # Arrêt avant que multiprocessing n'attende les processus enfants et ne ferme
+            # ses files (priorité 10), y compris à la sortie d'un processus de batch
+            util.Finalize(_pool, _pool.shutdown, kwargs={"cancel_futures": True}, exitpriority=20)
+        return _pool
+
+
+# --------------- DÉCOUPAGE -----------------
+
+def tranches_par_annee(df, n):
+    """
+    Masques de `n` tranches au plus, faites d'années entières et de tailles
+    proches (la plus grosse année d'abord dans la tranche la moins remplie).
+    Les dossiers sans date forment une année à part.
+    """
+    annees = df["Date"].dt.year.fillna(-1).astype("int64").to_numpy()
+    tailles = pd.Series(annees).value_counts()
+    remplissage = [0] * min(n, len(tailles))
+    affectation = {}
+    for annee, taille in tailles.items():
+        i = remplissage.index(min(remplissage))
+        affectation[annee] = i
+        remplissage[i] += taille
+    numeros = pd.Series(annees).map(affectation).to_numpy()
+    return [numeros == i for i in range(len(remplissage))]
+
+
+def _compatible_arrow(df):
+    """Colonnes objet hétérogènes en texte (Arrow exige un type par colonne)."""
+    objets = [c for c in df.columns if df[c].dtype == object]
+    if objets:
+        df = df.assign(**{c: df[c].astype(str).where(df[c].notna()) for c in objets})
+    return df
+
+
+def _deposer(df):
+    """Écrit `df` en Arrow IPC dans un nouveau segment de mémoire partagée ; retourne (segment, taille)."""
+    table = pa.Table.from_pandas(_compatible_arrow(df), preserve_index=True)
+    mesure = pa.MockOutputStream()
+    with pa.ipc.new_stream(mesure, table.schema) as ecrivain:
+        ecrivain.write_table(table)
+    taille = mesure.size()
+    segment = shared_memory.SharedMemory(create=True, size=max(taille, 1))
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(segment.buf)), table.schema) as ecrivain:
+        ecrivain.write_table(table)
+    return segment, taille
+
+
+def _calculer_tranche(nom_segment, taille, requete, args):
+    """Exécuté dans un processus du pool : relit la tranche depuis la mémoire partagée et calcule."""
+    segment = shared_memory.SharedMemory(name=nom_segment)
+    tampon = pa.py_buffer(segment.buf)
+    try:
+        # Colonnes numériques sans valeurs manquantes : vues directes sur le segment
+        clients = pa.ipc.open_stream(tampon[:taille]).read_all().to_pandas()
+        res = requete({"Clients": clients}, *args)
+        del clients
+        return res
+    finally:
+        del tampon
+        try:
+            segment.close()
+        except BufferError:
+            pass  # vues encore tenues (exception en cours) : libérées avec le processus
+
+
+# --------------- EXÉCUTION -----------------
+
+def fusionner_partiels(partiels, fusion="somme"):
+    """Fusion des agrégats partiels des tranches (Series ou DataFrame indexés par les clés de regroupement)."""
+    partiels = [p for p in partiels if p is not None]
+    if fusion == "concat":
+        return pd.concat(partiels).sort_index()
+    res = reduce(lambda a, b: a.add(b, fill_value=0), partiels)
+    if isinstance(res, pd.DataFrame):
+        res = res.astype(partiels[0].dtypes.to_dict())  # comptes entiers : l'alignement les passe en flottants
+    return res
+
+
+def executer_par_annee(requete, data, *args, fusion="somme", seuil=None, colonnes=None):
+    """
+    `requete(data, *args)` sur la feuille Clients, répartie par année de
+    création entre les processus du pool au-delà de `seuil` lignes (par défaut
+    VISA_SEUIL_PARALLELE). `requete` doit être une fonction de module (envoyée
+    par nom aux processus) qui n'utilise que data["Clients"] ; `colonnes` :
+    les seules colonnes qu'elle lit, transmises seules aux processus.
+    """
+    if fusion not in FUSIONS:
+        raise ValueError(f"Fusion inconnue : {fusion}")
+    df = data["Clients"]
+    n = nb_processus()
+    if n < 2 or len(df) < (seuil_lignes() if seuil is None else seuil):
+        return requete(data, *args)
+    masques = tranches_par_annee(df, n)
+    if len(masques) < 2:
+        return requete(data, *args)
+
+    if colonnes is not None:
+        df = df[[c for c in colonnes if c in df.columns]]
+
+    pool = _obtenir_pool()
+    segments, taches = [], []
+    try:
+        for masque in masques:
+            segment, taille = _deposer(df[masque])
+            segments.append(segment)
+            taches.append(pool.submit(_calculer_tranche, segment.name, taille, requete, args))
+        partiels = [t.result() for t in taches]
+    finally:
+        wait(taches)  # aucun processus ne lit plus les segments
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+    logger.debug("%s réparti en %d tranches (%d lignes)", getattr(requete, "__name__", requete), len(masques), len(df))
+    return fusionner_partiels(partiels, fusion)
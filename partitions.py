@@ -0,0 +1,170 @@
+"""
+Mode multi-bureaux : chaque bureau a son propre classeur Clients BL.xlsx,
+chargé comme une partition d'un même jeu de données logique.
+
+Chaque partition est chargée et rafraîchie seule (empreinte du contenu). Les
+requêtes de synthèse (fonctions pures des modules calculs_*) sont exécutées
+partition par partition dans un pool de threads (et par année dans un pool de
+processus pour les grosses partitions) ; les résultats partiels sont
+gardés par version de partition et fusionnés (sommes et comptes). Un rapport
+consolidé ne recalcule donc que les bureaux qui ont changé.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+import pandas as pd
+
+from common_data import empreinte_contenu, lire_classeur, version_donnees
+from parallele import executer_par_annee
+
+MAX_THREADS = min(8, os.cpu_count() or 1)
+COL_BUREAU = "Bureau"
+CLASSEUR_COURANT = "Classeur courant"
+PERIMETRES = ["Bureau courant", "Tous les bureaux"]
+
+
+# --------------- PARTITIONS -----------------
+
+def partitions_chargees():
+    """Partitions importées : nom du bureau -> {data, empreinte, version, cle_source}."""
+    return st.session_state.setdefault("partitions", {})
+
+
+def noms_bureaux(fichiers):
+    """Nom de partition de chaque fichier reçu : son nom, suffixé s'il est déjà pris (« Clients BL.xlsx (2) »)."""
+    noms = {}
+    for f in fichiers:
+        nom, n = f.name, 1
+        while nom in noms:
+            n += 1
+            nom = f"{f.name} ({n})"
+        noms[nom] = (f.file_id, f)
+    return noms
+
+
+def partitions_en_echec():
+    """Bureaux non chargés : nom -> message d'erreur (le même fichier n'est pas relu)."""
+    return {nom: message for nom, (_, message) in st.session_state.get("partitions_echecs", {}).items()}
+
+
+def _erreur(e):
+    return f"{type(e).__name__}: {e}"
+
+
+def _lire(source):
+    """(données, None), ou (None, erreur) : un classeur illisible n'empêche pas de charger les autres bureaux."""
+    try:
+        return lire_classeur(source), None
+    except Exception as e:
+        return None, _erreur(e)
+
+
+def charger_partitions(sources):
+    """
+    Aligne les partitions sur `sources` (nom -> (clé, fichier), la clé identifiant
+    le fichier reçu sans le relire). Seuls les classeurs nouveaux ou modifiés sont
+    lus, en parallèle. Retourne les noms (re)chargés ; un bureau illisible est
+    écarté (partitions_en_echec) sans retirer les autres, et garde sa version
+    précédente s'il en avait une.
+    """
+    parts = partitions_chargees()
+    echecs = st.session_state.setdefault("partitions_echecs", {})
+    for nom in set(parts) - set(sources):
+        del parts[nom]
+    for nom in set(echecs) - set(sources):
+        del echecs[nom]
+
+    a_lire = {}
+    for nom, (cle_source, source) in sources.items():
+        actuelle = parts.get(nom)
+        if actuelle is not None and actuelle["cle_source"] == cle_source:
+            continue
+        if nom in echecs and echecs[nom][0] == cle_source:
+            continue
+        try:
+            empreinte = empreinte_contenu(source)
+        except Exception as e:
+            echecs[nom] = (cle_source, _erreur(e))
+            continue
+        if actuelle is not None and actuelle["empreinte"] == empreinte:
+            actuelle["cle_source"] = cle_source
+            continue
+        a_lire[nom] = (cle_source, source, empreinte)
+    if not a_lire:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(MAX_THREADS, len(a_lire))) as pool:
+        lus = dict(zip(a_lire, pool.map(_lire, [src for _, src, _ in a_lire.values()])))
+    charges = []
+    for nom, (cle_source, _, empreinte) in a_lire.items():
+        data, erreur = lus[nom]
+        if erreur is not None:
+            echecs[nom] = (cle_source, erreur)
+            continue
+        echecs.pop(nom, None)
+        parts[nom] = {"data": data, "empreinte": empreinte, "version": f"{nom}@{empreinte[:12]}",
+                      "cle_source": cle_source}
+        charges.append(nom)
+    return charges
+
+
+def partitions_actives():
+    """
+    Partitions du jeu logique : nom -> (version, data). Le classeur de la session
+    en fait partie (sa version suit les modifications) sauf s'il est déjà importé
+    comme bureau (même empreinte).
+    """
+    actives = {nom: (p["version"], p["data"]) for nom, p in partitions_chargees().items()}
+    data = st.session_state.get("data_xlsx")
+    if data is not None:
+        origine = st.session_state.get("source_donnees") or {}
+        if origine.get("revision") not in {p["empreinte"] for p in partitions_chargees().values()}:
+            actives = {CLASSEUR_COURANT: (version_donnees(), data), **actives}
+    return actives
+
+
+def choisir_perimetre(key):
+    """Sélecteur « bureau courant / tous les bureaux », affiché seulement s'il y a plusieurs partitions."""
+    if len(partitions_actives()) < 2:
+        return False
+    return st.radio("Périmètre", PERIMETRES, horizontal=True, key=key) == PERIMETRES[1]
+
+
+# --------------- EXÉCUTION RÉPARTIE -----------------
+
+def executer_requete(nom_requete, requete, *args, colonnes=None):
+    """
+    Résultats partiels de `requete(data, *args)` par partition. Seules les
+    partitions dont la version a changé sont recalculées, en parallèle ; une
+    grosse partition est elle-même répartie par année entre les processus du
+    pool (parallele, `colonnes` : celles que lit la requête).
+    """
+    parts = partitions_actives()
+    cache = st.session_state.setdefault("partiels", {})
+    for cle in [c for c in cache if c[0] not in parts]:
+        del cache[cle]
+
+    cles = {nom: (nom, nom_requete, args) for nom in parts}
+    a_calculer = [nom for nom in parts if cache.get(cles[nom], (None,))[0] != parts[nom][0]]
+    if a_calculer:
+        with ThreadPoolExecutor(max_workers=min(MAX_THREADS, len(a_calculer))) as pool:
+            resultats = pool.map(lambda nom: executer_par_annee(requete, parts[nom][1], *args, colonnes=colonnes),
+                                 a_calculer)
+            for nom, res in zip(a_calculer, resultats):
+                cache[cles[nom]] = (parts[nom][0], res)
+    return {nom: cache[cles[nom]][1] for nom in parts}
+
+
+def fusionner(partiels):
+    """Somme des agrégats partiels (Series ou DataFrame indexés par les clés de regroupement)."""
+    valeurs = [p for p in partiels.values() if p is not None and len(p)]
+    if not valeurs:
+        return None
+    tout = pd.concat(valeurs)
+    return tout.groupby(level=list(range(tout.index.nlevels)), sort=False, dropna=False).sum()
+
+
+def par_bureau(partiels):
+    """Agrégats partiels côte à côte : une ligne par bureau (requêtes retournant une Series)."""
+    return pd.DataFrame({nom: p for nom, p in partiels.items()}).T.rename_axis(COL_BUREAU).infer_objects()
@@ -0,0 +1,194 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import streamlit as st
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Activation : variable d'environnement VISA_PROFILE=1 ou URL ...?profile=1
+ENV_VAR = "VISA_PROFILE"
+QUERY_PARAM = "profile"
+_VRAI = ("1", "true", "oui", "yes", "on")
+
+# tracemalloc est global au processus : suivi tant qu'une session profilée
+# a fait un rerun depuis moins de SESSION_INACTIVE_S secondes
+SESSION_INACTIVE_S = 600
+
+logger = logging.getLogger("visa_manager.profil")
+_local = threading.local()
+_verrou = threading.Lock()
+_sessions = {}      # id de session profilée -> instant du dernier rerun
+_threads = {}      # thread ayant une mesure en cours -> vrai si un autre en a démarré une depuis
+
+
+def profil_actif():
+    """Vrai si l'instrumentation est demandée (env ou paramètre d'URL)."""
+    if os.getenv(ENV_VAR, "").strip().lower() in _VRAI:
+        return True
+    try:
+        return str(st.query_params.get(QUERY_PARAM, "")).strip().lower() in _VRAI
+    except Exception:
+        return False
+
+
+def _taille(obj):
+    """Décrit la taille d'un DataFrame (ou d'un dict de DataFrames)."""
+    if isinstance(obj, pd.DataFrame):
+        return {"lignes": len(obj), "colonnes": obj.shape[1]}
+    if isinstance(obj, dict):
+        frames = [v for v in obj.values() if isinstance(v, pd.DataFrame)]
+        if frames:
+            return {"lignes": sum(len(f) for f in frames), "colonnes": sum(f.shape[1] for f in frames)}
+    return {}
+
+
+# --------------- MESURES -----------------
+
+def _suivre_session(actif):
+    """
+    Tient à jour les sessions profilées ; démarre tracemalloc pour la
+    première et l'arrête quand il n'en reste plus (aucune mesure en cours).
+    """
+    ctx = get_script_run_ctx()
+    session = ctx.session_id if ctx is not None else None
+    maintenant = time.monotonic()
+    with _verrou:
+        if actif:
+            _sessions[session] = maintenant
+        else:
+            _sessions.pop(session, None)
+        for s, instant in list(_sessions.items()):
+            if maintenant - instant > SESSION_INACTIVE_S:
+                del _sessions[s]
+        if _sessions and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not _sessions and not _threads and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def debut_rerun():
+    """À appeler en tête de app.py : remet à zéro les mesures du rerun courant."""
+    st.session_state["_profil_mesures"] = []
+    actif = profil_actif()
+    _suivre_session(actif)
+    if not actif:
+        return
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+@contextmanager
+def mesure(nom, df=None):
+    """
+    Mesure le temps, le pic mémoire (tracemalloc) et la taille des données d'un bloc.
+    Sans effet si le profilage n'est pas actif.
+
+    Le pic est celui du processus : il n'est remis à zéro que si aucune autre
+    session n'a de mesure en cours. Sinon il inclut leurs allocations et la
+    mesure est marquée « pic_partage ».
+    """
+    if not profil_actif():
+        yield {}
+        return
+
+    # Pile par thread : un pic mesuré dans un bloc imbriqué est remonté au parent
+    pile = getattr(_local, "pile", None)
+    if pile is None:
+        pile = _local.pile = []
+    thread = threading.get_ident()
+    with _verrou:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _threads.setdefault(thread, False)
+        seul = len(_threads) == 1
+        for autre in _threads:
+            if autre != thread:
+                _threads[autre] = True
+        courant, pic = tracemalloc.get_traced_memory()
+        if pile:
+            pile[-1]["pic"] = max(pile[-1]["pic"], pic)
+        if seul:
+            tracemalloc.reset_peak()
+    cadre = {"depart": courant, "pic": 0, "partage": not seul}
+    pile.append(cadre)
+
+    # Ajouté dès l'entrée pour conserver l'ordre d'appel dans le panneau
+    enregistrement = {"nom": nom, "profondeur": len(pile) - 1}
+    try:
+        st.session_state.setdefault("_profil_mesures", []).append(enregistrement)
+    except Exception:
+        pass
+
+    infos = {}
+    t0 = time.perf_counter()
+    try:
+        yield infos
+    finally:
+        duree = time.perf_counter() - t0
+        with _verrou:
+            _, pic = tracemalloc.get_traced_memory()
+            partage = cadre["partage"] or _threads[thread] or len(_threads) > 1
+            pile.pop()
+            if not pile:
+                del _threads[thread]
+        pic = max(cadre["pic"], pic)
+        if pile:
+            pile[-1]["pic"] = max(pile[-1]["pic"], pic)
+            pile[-1]["partage"] = pile[-1]["partage"] or partage
+
+        enregistrement.update({
+            "duree_ms": round(duree * 1000, 2),
+            "pic_memoire_ko": round(max(pic - cadre["depart"], 0) / 1024, 1),
+            "pic_partage": partage,
+            **_taille(infos.get("resultat", df)),
+        })
+        logger.info(json.dumps(enregistrement, ensure_ascii=False))
+
+
+def profile(nom=None):
+    """Décorateur : mesure chaque appel de la fonction (taille du résultat incluse)."""
+    def decorateur(fn):
+        libelle = nom or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profil_actif():
+                return fn(*args, **kwargs)
+            entree = next((a for a in args if isinstance(a, pd.DataFrame)), None)
+            with mesure(libelle, entree) as infos:
+                resultat = fn(*args, **kwargs)
+                if isinstance(resultat, (pd.DataFrame, dict)):
+                    infos["resultat"] = resultat
+                return resultat
+        return wrapper
+    return decorateur
+
+
+# --------------- AFFICHAGE -----------------
+
+def panneau_profil():
+    """Panneau repliable dans la barre latérale avec les mesures du dernier rerun."""
+    if not profil_actif():
+        return
+    mesures = st.session_state.get("_profil_mesures", [])
+    with st.sidebar.expander("⏱️ Profil du rerun", expanded=False):
+        if not mesures:
+            st.caption("Aucune mesure pour ce rerun.")
+            return
+        df = pd.DataFrame(mesures)
+        df["nom"] = ["  " * p + n for p, n in zip(df["profondeur"], df["nom"])]
+        total = df.loc[df["profondeur"] == 0, "duree_ms"].sum()
+        st.metric("Durée totale mesurée", f"{total:,.0f} ms")
+        if "pic_partage" in df and df["pic_partage"].fillna(False).astype(bool).any():
+            st.caption("⚠️ Pics mémoire marqués « pic_partage » : mesurés pour tout le processus "
+                       "pendant que d'autres sessions profilées calculaient (surestimés).")
+        st.dataframe(df.drop(columns=["profondeur"]), use_container_width=True, hide_index=True)
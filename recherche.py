@@ -0,0 +1,209 @@
+import bisect
+import re
+import unicodedata as _ud
+from collections import defaultdict
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+from common_data import modifs_depuis, version_donnees
+
+# Champs indexés et poids dans le score
+CHAMPS_RECHERCHE = {
+    "Nom": 3.0,
+    "Visa": 2.0,
+    "Catégories": 1.0,
+    "Sous-catégories": 1.0,
+    "Commentaires": 1.0,
+    "RFE": 1.0,
+}
+BONUS_MOT_EXACT = 2.0
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae", "ß": "ss"})
+_SEPARATEURS = r"[^a-z0-9]+"
+
+
+# --------------- NORMALISATION -----------------
+
+def normaliser_texte(s):
+    """Minuscules et sans accents (« Étudiants » -> « etudiants »)."""
+    if s is None or (isinstance(s, float) and pd.isna(s)):
+        return ""
+    s = str(s).translate(_LIGATURES)
+    s = _ud.normalize("NFKD", s)
+    return s.encode("ascii", "ignore").decode("ascii").lower()
+
+
+def _mots(s):
+    return [m for m in re.split(_SEPARATEURS, normaliser_texte(s)) if m]
+
+
+def _normaliser_serie(serie):
+    """Version vectorisée de normaliser_texte pour une colonne entière."""
+    txt = serie.astype(object).where(serie.notna(), "").astype(str)
+    return (
+        txt.str.translate(_LIGATURES)
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+        .str.lower()
+    )
+
+
+# --------------- INDEX INVERSÉ -----------------
+
+class IndexRecherche:
+    """
+    Index inversé mot -> (lignes, poids) avec recherche par préfixe classée.
+
+    La base est construite en une passe vectorisée (tableaux NumPy par mot) ;
+    les ajouts et modifications vont dans un petit index delta, et les lignes
+    réindexées sont masquées dans la base.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.base = {}
+        self.delta = defaultdict(dict)
+        self.mots_delta = {}
+        self.masquees = set()
+        self._mots_tries = None
+
+    def construire(self, df):
+        """Construction vectorisée sur tout le DataFrame."""
+        morceaux = []
+        for champ, poids in CHAMPS_RECHERCHE.items():
+            if champ not in df.columns:
+                continue
+            # Normalisation sur les valeurs distinctes seulement, puis jointure sur les codes
+            codes, valeurs = pd.factorize(df[champ])
+            mots = _normaliser_serie(pd.Series(valeurs, dtype=object)).str.split(_SEPARATEURS, regex=True).explode()
+            mots = mots[mots.notna() & (mots != "")]
+            par_valeur = pd.DataFrame({"code": mots.index, "mot": mots.values})
+            par_ligne = pd.DataFrame({"ligne": df.index, "code": codes})
+            paires = par_ligne.merge(par_valeur, on="code")
+            morceaux.append(pd.DataFrame({"ligne": paires["ligne"], "mot": paires["mot"], "poids": poids}))
+        if not morceaux:
+            return self
+
+        tout = (
+            pd.concat(morceaux, ignore_index=True)
+            .groupby(["mot", "ligne"], sort=True)["poids"].sum()
+            .reset_index()
+        )
+        mots = tout["mot"].to_numpy()
+        lignes = tout["ligne"].to_numpy(dtype="int64")
+        poids = tout["poids"].to_numpy(dtype="float64")
+        bornes = np.concatenate([[0], np.flatnonzero(mots[1:] != mots[:-1]) + 1, [len(mots)]])
+        for a, b in zip(bornes[:-1], bornes[1:]):
+            self.base[mots[a]] = (lignes[a:b], poids[a:b])
+        self._mots_tries = None
+        return self
+
+    def retirer_ligne(self, ligne):
+        self.masquees.add(ligne)
+        for mot in self.mots_delta.pop(ligne, ()):
+            self.delta[mot].pop(ligne, None)
+            if not self.delta[mot]:
+                del self.delta[mot]
+                self._mots_tries = None
+
+    def indexer_ligne(self, ligne, valeurs):
+        """(Ré)indexe une seule ligne : utilisé pour les ajouts et modifications."""
+        self.retirer_ligne(ligne)
+        mots_ligne = set()
+        for champ, poids in CHAMPS_RECHERCHE.items():
+            for mot in _mots(valeurs.get(champ)):
+                if mot not in self.delta and mot not in self.base:
+                    self._mots_tries = None
+                self.delta[mot][ligne] = self.delta[mot].get(ligne, 0.0) + poids
+                mots_ligne.add(mot)
+        if mots_ligne:
+            self.mots_delta[ligne] = mots_ligne
+
+    def _completions(self, prefixe):
+        if self._mots_tries is None:
+            self._mots_tries = sorted(set(self.base) | set(self.delta))
+        i = bisect.bisect_left(self._mots_tries, prefixe)
+        while i < len(self._mots_tries) and self._mots_tries[i].startswith(prefixe):
+            yield self._mots_tries[i]
+            i += 1
+
+    def _scores_terme(self, terme):
+        """Meilleur score par ligne pour un terme (toutes ses complétions)."""
+        masquees = np.fromiter(self.masquees, dtype="int64") if self.masquees else None
+        parts_l, parts_p = [], []
+        for mot in self._completions(terme):
+            bonus = BONUS_MOT_EXACT if mot == terme else 1.0
+            if mot in self.base:
+                lignes, poids = self.base[mot]
+                if masquees is not None:
+                    garde = ~np.isin(lignes, masquees)
+                    lignes, poids = lignes[garde], poids[garde]
+                parts_l.append(lignes)
+                parts_p.append(poids * bonus)
+            if mot in self.delta:
+                parts_l.append(np.fromiter(self.delta[mot].keys(), dtype="int64"))
+                parts_p.append(np.fromiter(self.delta[mot].values(), dtype="float64") * bonus)
+        if not parts_l:
+            return pd.Series(dtype="float64")
+        scores = pd.Series(np.concatenate(parts_p), index=np.concatenate(parts_l))
+        return scores.groupby(level=0).max()
+
+    def rechercher(self, requete, limite=None):
+        """
+        Retourne les index de lignes qui contiennent tous les termes de la requête
+        (chaque terme pris comme préfixe), du plus pertinent au moins pertinent.
+        """
+        termes = _mots(requete)
+        if not termes:
+            return []
+
+        total = None
+        for terme in termes:
+            scores = self._scores_terme(terme)
+            total = scores if total is None else total.add(scores).dropna()
+            if total.empty:
+                return []
+
+        classement = total.sort_index().sort_values(ascending=False, kind="stable")
+        if limite:
+            classement = classement.iloc[:limite]
+        return classement.index.tolist()
+
+
+# --------------- INDEX EN SESSION -----------------
+
+def obtenir_index(df):
+    """
+    Index de recherche de la session, construit une fois par chargement puis
+    mis à jour ligne à ligne à partir du journal des modifications.
+    """
+    version = version_donnees()
+    index = st.session_state.get("index_recherche")
+
+    if index is not None and index.version != version:
+        lignes = modifs_depuis(index.version)
+        if lignes is None:
+            index = None
+        else:
+            for ligne in lignes:
+                if ligne in df.index:
+                    index.indexer_ligne(ligne, df.loc[ligne].to_dict())
+                else:
+                    index.retirer_ligne(ligne)
+            index.version = version
+
+    if index is None:
+        index = IndexRecherche(version).construire(df)
+
+    st.session_state["index_recherche"] = index
+    return index
+
+
+def rechercher_dossiers(df, requete, limite=None):
+    """Sous-ensemble de `df` correspondant à la requête, classé par pertinence."""
+    if not requete or not requete.strip():
+        return df
+    lignes = obtenir_index(df).rechercher(requete, limite)
+    return df.loc[[l for l in lignes if l in df.index]]
@@ -0,0 +1,220 @@
+"""
+Récupération des sources distantes au démarrage : classeur principal (Drive),
+sauvegarde de secours (Dropbox) et classeurs des autres bureaux sont
+téléchargés en parallèle, avec un délai maximal, des reprises à intervalle
+croissant et une mesure par source. Le démarrage dure autant que la source
+la plus lente, et non plus la somme de toutes.
+
+Configuration : section [sources] des secrets Streamlit, ou variable
+d'environnement VISA_SOURCES (même structure, en JSON) :
+
+    [sources]
+    principal = "drive:Clients BL.xlsx"
+    secours = "dropbox:/Clients-BL.xlsx"
+    bureaux = ["https://intranet.exemple/lyon.xlsx", "local:/mnt/partage/Paris.xlsx"]
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from urllib.error import HTTPError
+
+import streamlit as st
+
+from common_data import fichier_temp
+
+ENV_SOURCES = "VISA_SOURCES"
+DELAI_S = 60            # délai maximal de l'étape (toutes sources, toutes tentatives)
+TENTATIVES = 3
+ATTENTE_BASE_S = 0.5    # attente avant la 2e tentative, doublée ensuite
+ATTENTE_MAX_S = 8.0
+MAX_THREADS = 8
+# Erreurs définitives : inutile de réessayer
+NON_REESSAYABLES = (FileNotFoundError, PermissionError, ValueError)
+
+logger = logging.getLogger("visa_manager.recuperation")
+
+
+@dataclass
+class Telechargement:
+    """Résultat et mesures du téléchargement d'une source."""
+    nom: str
+    source: str
+    chemin: str
+    statut: str = "en cours"  # « ok », « échec », « délai dépassé »
+    revision: str = None
+    tentatives: int = 0
+    duree_s: float = 0.0
+    octets: int = 0
+    erreur: str = None
+
+
+# --------------- CONFIGURATION -----------------
+
+def sources_configurees():
+    """Sources à récupérer : {"principal": source ou None, "secours": …, "bureaux": [sources]}."""
+    config = {}
+    if os.getenv(ENV_SOURCES):
+        config = json.loads(os.environ[ENV_SOURCES])
+    else:
+        try:
+            config = dict(st.secrets.get("sources", {}))
+        except Exception:
+            config = {}  # pas de fichier de secrets
+    return {
+        "principal": config.get("principal"),
+        "secours": config.get("secours"),
+        "bureaux": list(config.get("bureaux", [])),
+    }
+
+
+# --------------- TÉLÉCHARGEMENT -----------------
+
+def _reessayable(exc):
+    if isinstance(exc, HTTPError):
+        return exc.code >= 500 or exc.code == 429
+    return not isinstance(exc, NON_REESSAYABLES)
+
+
+def _attente(tentative, base=ATTENTE_BASE_S, maximum=ATTENTE_MAX_S):
+    """Attente avant la tentative suivante : exponentielle, plafonnée, avec gigue."""
+    return min(base * 2 ** (tentative - 1), maximum) * random.uniform(0.5, 1.0)
+
+
+def _telecharger(remote, res, tentatives, arret):
+    """Télécharge `remote` dans `res.chemin` en réessayant ; remplit `res` (exécuté dans un thread)."""
+    t0 = time.perf_counter()
+    while True:
+        res.tentatives += 1
+        try:
+            res.revision = remote.lire(res.chemin)
+            res.octets = os.path.getsize(res.chemin)
+            res.statut, res.erreur = "ok", None
+            break
+        except Exception as e:
+            res.statut, res.erreur = "échec", f"{type(e).__name__}: {e}"
+            if res.tentatives >= tentatives or not _reessayable(e) or arret.wait(_attente(res.tentatives)):
+                break
+    res.duree_s = time.perf_counter() - t0
+    return res
+
+
+def telecharger_tout(remotes, delai_s=DELAI_S, tentatives=TENTATIVES):
+    """
+    Télécharge en parallèle `remotes` (nom -> (remote, chemin de destination)).
+    Retourne nom -> Telechargement ; une source encore en cours au bout de
+    `delai_s` secondes est abandonnée (« délai dépassé »).
+    """
+    resultats = {nom: Telechargement(nom, remote.source, chemin) for nom, (remote, chemin) in remotes.items()}
+    if not remotes:
+        return resultats
+    arret = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=min(MAX_THREADS, len(remotes)))
+    t0 = time.perf_counter()
+    taches = {nom: pool.submit(_telecharger, remote, resultats[nom], tentatives, arret)
+              for nom, (remote, _) in remotes.items()}
+    wait(taches.values(), timeout=delai_s)
+    arret.set()
+    pool.shutdown(wait=False, cancel_futures=True)  # les appels bloquants restants finissent seuls
+
+    for nom, res in resultats.items():
+        if not taches[nom].done():
+            # Copie figée : le thread abandonné peut encore modifier l'original
+            res = resultats[nom] = Telechargement(nom, res.source, res.chemin, "délai dépassé", None,
+                                                  res.tentatives, time.perf_counter() - t0, 0, res.erreur)
+        logger.info("Source %s (%s) : %s en %.2f s, %d tentative(s), %d octets%s", res.nom, res.source,
+                    res.statut, res.duree_s, res.tentatives, res.octets, f" — {res.erreur}" if res.erreur else "")
+    return resultats
+
+
+# --------------- DÉMARRAGE -----------------
+
+def _nom_bureau(source, pris):
+    """Nom de partition d'une source distante : nom du fichier, suffixé s'il est déjà pris."""
+    base = os.path.basename(source.rstrip("/").split("?")[0]) or source
+    nom, n = base, 1
+    while nom in pris:
+        n += 1
+        nom = f"{base} ({n})"
+    return nom
+
+
+def bureaux_distants():
+    """Partitions récupérées au démarrage : nom -> (clé, chemin), à charger avec les fichiers importés."""
+    return st.session_state.get("bureaux_distants", {})
+
+
+def recuperer_au_demarrage(delai_s=DELAI_S):
+    """
+    Une fois par session : télécharge en parallèle les sources configurées.
+    Le classeur principal (à défaut, la sauvegarde de secours) est installé si
+    la session n'a pas de données ; les bureaux deviennent des partitions.
+    Retourne des messages (niveau, texte) à afficher.
+    """
+    if st.session_state.get("recuperation_essayee"):
+        return []
+    st.session_state["recuperation_essayee"] = True
+    config = sources_configurees()
+
+    from instantane import remote_depuis_source
+    from synchro import installer_distant
+
+    remotes = {}
+    if st.session_state.get("data_xlsx") is None:
+        for role in ("principal", "secours"):
+            if config[role]:
+                remotes[role] = config[role]
+    for source in config["bureaux"]:
+        remotes[_nom_bureau(source, remotes)] = source
+    # Objets distants et fichiers de destination créés ici : les threads n'accèdent pas à la session
+    remotes = {nom: (remote_depuis_source(src), fichier_temp("source")) for nom, src in remotes.items()}
+    inconnues = [nom for nom, (remote, _) in remotes.items() if remote is None]
+    remotes = {nom: r for nom, r in remotes.items() if r[0] is not None}
+    if not remotes:
+        return [("warning", f"Source(s) non reconnue(s) : {', '.join(inconnues)}")] if inconnues else []
+
+    with st.spinner("Récupération des sources distantes…"):
+        t0 = time.perf_counter()
+        resultats = telecharger_tout(remotes, delai_s)
+        total = time.perf_counter() - t0
+    st.session_state["recuperation"] = {"total_s": total, "sources": [asdict(r) for r in resultats.values()]}
+
+    messages = [("warning", f"Source non reconnue : {nom}") for nom in inconnues]
+    for role in ("principal", "secours"):
+        res = resultats.get(role)
+        if res is not None and res.statut == "ok":
+            if installer_distant(remotes[role][0], res.chemin, res.revision) is not None:
+                texte = f"Classeur chargé depuis {res.source} ({res.duree_s:.1f} s)."
+                messages.append(("info" if role == "principal" else "warning",
+                                 texte if role == "principal" else f"Source principale indisponible : {texte}"))
+                break
+    else:
+        if "principal" in resultats or "secours" in resultats:
+            messages.append(("error", "Classeur principal indisponible : "
+                             + " ; ".join(f"{r.source} ({r.statut})" for n, r in resultats.items()
+                                          if n in ("principal", "secours"))))
+
+    bureaux = {nom: (res.revision or res.chemin, res.chemin) for nom, res in resultats.items()
+               if nom not in ("principal", "secours") and res.statut == "ok"}
+    base = (st.session_state.get("synchro_base") or {}).get("chemin")
+    for nom in ("principal", "secours"):
+        res = resultats.get(nom)
+        if res is not None and res.statut == "ok" and res.chemin != base:
+            os.remove(res.chemin)  # téléchargé mais non retenu
+    if bureaux:
+        st.session_state["bureaux_distants"] = bureaux
+        from partitions import charger_partitions, partitions_en_echec
+        charges = charger_partitions(bureaux)
+        if charges:
+            messages.append(("info", f"{len(charges)} bureau(x) récupéré(s) en {total:.1f} s."))
+        illisibles = {nom: e for nom, e in partitions_en_echec().items() if nom in bureaux}
+        if illisibles:
+            messages.append(("error", "Bureaux illisibles : " + " ; ".join(f"{n} ({e})" for n, e in illisibles.items())))
+    echecs = [r for nom, r in resultats.items() if nom not in ("principal", "secours") and r.statut != "ok"]
+    if echecs:
+        messages.append(("warning", "Bureaux indisponibles : " + ", ".join(f"{r.nom} ({r.statut})" for r in echecs)))
+    return messages
@@ -0,0 +1,268 @@
+"""
+Référentiel des visas : la feuille « Visa » (une ligne par catégorie /
+sous-catégorie, une colonne par visa, cellule marquée si le visa existe)
+est compilée une fois par chargement en arbre catégorie → sous-catégorie →
+visa, avec des identifiants canoniques et des tables de correspondance
+normalisées pour des recherches en O(1).
+
+Les saisies libres des dossiers sont comparées par alias (sans casse,
+accents, espaces, tirets ni ponctuation) : libellé complet, option de la
+sous-catégorie (« CP » sous « E-2 ESE »), ou nom de sous-catégorie seul
+(« H-1B »). Un visa absent du référentiel garde son texte : il forme un
+groupe « hors référentiel » (identifiant après ceux du référentiel) au lieu
+d'être confondu avec les autres sous « (Non référencé) ».
+"""
+import re
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+from common_data import version_donnees
+from recherche import normaliser_texte
+
+NON_REFERENCE = "(Non référencé)"
+_ORDINAL_SOUS_CAT = re.compile(r"^\d+\s+")
+_ORDINAL_OPTION = re.compile(r"^\d+-")
+_SUFFIXE_DOUBLON = re.compile(r"\.\d+$")
+_NON_ALPHANUMERIQUE = re.compile(r"[^0-9a-z]+")
+PREFIXE_MIN = 2  # longueur minimale d'un nom de sous-catégorie reconnu en tête de saisie
+
+
+def cle(s):
+    """Clé de comparaison : sans accents, minuscules, espaces réduits."""
+    return " ".join(normaliser_texte(s).split())
+
+
+def alias(s):
+    """Clé d'alias : cle() sans espaces, tirets ni ponctuation (« E-2  Inv. » -> « e2inv »)."""
+    return _NON_ALPHANUMERIQUE.sub("", normaliser_texte(s))
+
+
+def _nom_sous_categorie(scat):
+    """Nom d'une sous-catégorie sans son numéro d'ordre (« 03     E-2 ESE » -> « E-2 ESE »)."""
+    return _ORDINAL_SOUS_CAT.sub("", str(scat).strip()).strip()
+
+
+def _option(option):
+    """Option d'une colonne sans suffixe de doublon ni numéro d'ordre (« 2-CP.1 » -> « CP »)."""
+    return _ORDINAL_OPTION.sub("", _SUFFIXE_DOUBLON.sub("", str(option)).strip())
+
+
+def _colonnes_hierarchie(visa_df):
+    """Colonnes catégorie et sous-catégorie de la feuille Visa (les deux premières à défaut)."""
+    colonnes = [str(c) for c in visa_df.columns]
+    cat = next((c for c in colonnes if cle(c).startswith("cat")), colonnes[0])
+    scat = next((c for c in colonnes if cle(c).startswith("sous")), colonnes[1])
+    return cat, scat
+
+
+def _marquee(v):
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return False
+    return str(v).strip().lower() not in ("", "0", "0.0", "false", "non", "nan")
+
+
+def libelle_visa(sous_categorie, option):
+    """
+    Libellé du visa d'une colonne de la feuille : une option ordinale (« 1-COS »)
+    complète le nom de la sous-catégorie (« B-1 COS ») ; sinon la colonne est le visa.
+    """
+    option = _SUFFIXE_DOUBLON.sub("", str(option)).strip()
+    if _ORDINAL_OPTION.match(option):
+        nom = _ORDINAL_SOUS_CAT.sub("", str(sous_categorie)).strip()
+        return f"{nom} {_ORDINAL_OPTION.sub('', option)}".strip()
+    return option
+
+
+# --------------- ARBRE -----------------
+
+class ArbreVisa:
+    """Arbre catégorie → sous-catégorie → visas, identifiants canoniques et index de recherche."""
+
+    def __init__(self):
+        self.arbre = {}             # catégorie -> {sous-catégorie -> [visas]}
+        self.categories = []        # cat_id -> libellé
+        self.sous_categories = []   # scat_id -> (cat_id, libellé)
+        self.visas = []             # visa_id -> (cat_id, scat_id, libellé)
+        self.hors_referentiel = []  # visa_id - len(visas) -> (cat_id, scat_id, texte saisi)
+        self._triplets = {}         # (cat, scat, visa) exacts -> visa_id
+        self._cles_triplet = {}     # (cat, scat, visa) en alias -> visa_id
+        self._cles_visa = {}        # visa en alias -> visa_id (si non ambigu)
+        self._cles_option = {}      # (scat_id, option en alias) -> visa_id
+        self._cles_cat = {}         # catégorie normalisée -> cat_id
+        self._cles_scat = {}        # (cat_id, sous-catégorie en alias) et alias seul -> scat_id (None si ambigu)
+        self._cles_hors = {}        # visa saisi en alias -> identifiant hors référentiel
+
+    def __bool__(self):
+        return bool(self.visas)
+
+    def _id_categorie(self, cat):
+        k = cle(cat)
+        if k not in self._cles_cat:
+            self._cles_cat[k] = len(self.categories)
+            self.categories.append(cat)
+            self.arbre[cat] = {}
+        return self._cles_cat[k]
+
+    def _id_sous_categorie(self, cat_id, scat):
+        a = alias(_nom_sous_categorie(scat))
+        k = (cat_id, a)
+        if k not in self._cles_scat:
+            scat_id = len(self.sous_categories)
+            self._cles_scat[k] = scat_id
+            # Nom seul : résolu s'il n'appartient qu'à une catégorie
+            self._cles_scat[a] = None if a in self._cles_scat else scat_id
+            self.sous_categories.append((cat_id, scat))
+            self.arbre[self.categories[cat_id]][scat] = []
+        return self._cles_scat[k]
+
+    def _ajouter_visa(self, cat_id, scat_id, libelle, option):
+        cat, scat = self.categories[cat_id], self.sous_categories[scat_id][1]
+        a_cat, a_scat = alias(cat), alias(_nom_sous_categorie(scat))
+        cle_triplet = (a_cat, a_scat, alias(libelle))
+        if cle_triplet in self._cles_triplet:
+            return
+        visa_id = len(self.visas)
+        self.visas.append((cat_id, scat_id, libelle))
+        self.arbre[cat][scat].append(libelle)
+        self._triplets[(cat, scat, libelle)] = visa_id
+        self._cles_triplet[cle_triplet] = visa_id
+        cles_option = {alias(option), alias(_option(option))} - {""}
+        for k in cles_option:
+            self._cles_triplet.setdefault((a_cat, a_scat, k), visa_id)
+            self._cles_option.setdefault((scat_id, k), visa_id)
+        for k in {alias(libelle)} | cles_option:
+            # Un libellé présent sous plusieurs sous-catégories n'est pas résolu seul
+            self._cles_visa[k] = None if k in self._cles_visa and self._cles_visa[k] != visa_id else visa_id
+
+    def construire(self, visa_df):
+        if visa_df is None or visa_df.shape[1] < 2 or visa_df.empty:
+            return self
+        col_cat, col_scat = _colonnes_hierarchie(visa_df)
+        df = visa_df.copy()
+        df.columns = [str(c) for c in df.columns]
+        df[col_cat] = df[col_cat].ffill()  # cellules fusionnées
+        options = [c for c in df.columns if c not in (col_cat, col_scat)]
+        for ligne in df[[col_cat, col_scat] + options].itertuples(index=False, name=None):
+            cat, scat, marques = ligne[0], ligne[1], ligne[2:]
+            if not _marquee(cat) or not _marquee(scat):
+                continue
+            cat, scat = str(cat).strip(), str(scat).strip()
+            cat_id = self._id_categorie(cat)
+            scat_id = self._id_sous_categorie(cat_id, scat)
+            coches = [o for o, m in zip(options, marques) if _marquee(m)]
+            if not coches:
+                # Sous-catégorie sans option : elle est elle-même le visa
+                self._ajouter_visa(cat_id, scat_id, _nom_sous_categorie(scat), scat)
+            for option in coches:
+                self._ajouter_visa(cat_id, scat_id, libelle_visa(scat, option), option)
+        return self
+
+    # ---- Recherches O(1) ----
+
+    def valider(self, categorie, sous_categorie, visa):
+        """Vrai si le triplet existe dans le référentiel (tel que proposé par les listes)."""
+        return (categorie, sous_categorie, visa) in self._triplets
+
+    def _sous_categorie_en_tete(self, a_visa):
+        """
+        Sous-catégorie dont le nom (en alias) est la saisie ou son plus long
+        préfixe (« E-2 ESE ren » -> « E-2 ESE Ren. ») : (scat_id, reste de la saisie), ou (-1, saisie).
+        """
+        for fin in range(len(a_visa), PREFIXE_MIN - 1, -1):
+            scat_id = self._cles_scat.get(a_visa[:fin])
+            if scat_id is not None:
+                return scat_id, a_visa[fin:]
+        return -1, a_visa
+
+    def resoudre(self, categorie, sous_categorie, visa):
+        """(cat_id, scat_id, visa_id) canoniques d'une saisie libre ; -1 si non trouvé."""
+        kc, ks, kv = alias(categorie), alias(_nom_sous_categorie(sous_categorie)), alias(visa)
+        visa_id = self._cles_triplet.get((kc, ks, kv))
+        if visa_id is None and kv:
+            visa_id = self._cles_visa.get(kv)
+
+        cat_id = self._cles_cat.get(cle(categorie), -1)
+        scat_id = self._cles_scat.get((cat_id, ks), self._cles_scat.get(ks))
+        scat_id = -1 if scat_id is None else scat_id
+        if visa_id is None and kv:
+            # Option de la sous-catégorie (« CP »), ou nom de sous-catégorie en tête de la saisie
+            scat_saisie, reste = self._sous_categorie_en_tete(kv)
+            if scat_id == -1:
+                scat_id = scat_saisie
+            if scat_id != -1:
+                visa_id = self._cles_option.get((scat_id, kv))
+                if visa_id is None and scat_saisie == scat_id and reste:
+                    visa_id = self._cles_option.get((scat_id, reste))
+
+        if visa_id is not None:
+            cat_id, scat_id, _ = self.visas[visa_id]
+            return cat_id, scat_id, visa_id
+        if scat_id != -1 and cat_id == -1:
+            cat_id = self.sous_categories[scat_id][0]
+        return cat_id, scat_id, -1
+
+    def _id_hors_referentiel(self, cat_id, scat_id, visa):
+        """Identifiant du groupe d'un visa saisi absent du référentiel (un groupe par alias) ; -1 si vide."""
+        a = alias(visa)
+        if not a:
+            return -1
+        if a not in self._cles_hors:
+            self._cles_hors[a] = len(self.visas) + len(self.hors_referentiel)
+            self.hors_referentiel.append((cat_id, scat_id, " ".join(str(visa).split())))
+        return self._cles_hors[a]
+
+    def identifiants(self, clients):
+        """
+        Identifiants canoniques (cat_id, scat_id, visa_id) de chaque dossier.
+        Seules les combinaisons distinctes sont résolues, puis rapportées aux lignes ;
+        un visa saisi hors référentiel reçoit l'identifiant de son groupe.
+        """
+        colonnes = ["Catégories", "Sous-catégories", "Visa"]
+        brut = clients.reindex(columns=colonnes).astype(object)
+        combos = brut.drop_duplicates()
+        ids = []
+        for cat, scat, visa in combos.itertuples(index=False, name=None):
+            cat_id, scat_id, visa_id = self.resoudre(cat, scat, visa)
+            if visa_id == -1:
+                visa_id = self._id_hors_referentiel(cat_id, scat_id, visa)
+            ids.append((cat_id, scat_id, visa_id))
+        ids = np.array(ids, dtype="int64").reshape(-1, 3)
+        table = combos.assign(cat_id=ids[:, 0], scat_id=ids[:, 1], visa_id=ids[:, 2])
+        res = brut.merge(table, on=colonnes, how="left")[["cat_id", "scat_id", "visa_id"]]
+        res.index = clients.index
+        return res
+
+    # ---- Libellés ----
+
+    def tous_visas(self):
+        """Visas du référentiel puis groupes hors référentiel, indexés par visa_id."""
+        return self.visas + self.hors_referentiel
+
+    def libelles_visa(self, visa_ids):
+        visas = self.tous_visas()
+        noms = np.array([v[2] for v in visas] + [NON_REFERENCE], dtype=object)
+        return pd.Series(noms[np.where(np.asarray(visa_ids) < 0, len(visas), visa_ids)], index=getattr(visa_ids, "index", None))
+
+
+# --------------- EN SESSION -----------------
+
+def obtenir_arbre(data, version=None):
+    """Arbre du référentiel, compilé une fois par chargement de classeur (`version` : autre état que la session)."""
+    chargement = (version or version_donnees()).split(":")[0]
+    cache = st.session_state.get("arbre_visa")
+    if cache is None or cache[0] != chargement:
+        cache = (chargement, ArbreVisa().construire(data.get("Visa")))
+        st.session_state["arbre_visa"] = cache
+    return cache[1]
+
+
+def identifiants_visa(data, version=None):
+    """Identifiants canoniques des dossiers Clients, recalculés à chaque révision des données."""
+    version = version or version_donnees()
+    cache = st.session_state.get("visa_identifiants")
+    if cache is None or cache[0] != version:
+        cache = (version, obtenir_arbre(data, version).identifiants(data["Clients"]))
+        st.session_state["visa_identifiants"] = cache
+    return cache[1]
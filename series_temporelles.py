@@ -0,0 +1,112 @@
+"""
+Séries temporelles sur la feuille Clients typée : rééchantillonnage
+(jour / semaine / mois), sommes glissantes 3/6/12 mois, écart sur un an
+et cumul du facturé, puis sous-échantillonnage pour les graphiques.
+"""
+import math
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+
+# Libellé -> règle de rééchantillonnage pandas
+GRANULARITES = {"Jour": "D", "Semaine": "W-MON", "Mois": "MS"}
+FENETRES_MOIS = (3, 6, 12)
+# Un an en arrière, aligné sur la granularité (même jour de semaine pour D et W)
+DECALAGE_AN = {"D": pd.Timedelta(days=364), "W-MON": pd.Timedelta(weeks=52), "MS": pd.DateOffset(months=12)}
+MAX_POINTS = 2000
+
+COL_MONTANT = "Montant facturé"
+COL_DOSSIERS = "Dossiers"
+
+
+# --------------- CALCULS -----------------
+
+def base_temporelle(df, col_date, colonnes_montants):
+    """Montants et nombre de dossiers sur un DatetimeIndex trié (dates manquantes écartées)."""
+    dates = df[col_date]
+    garde = dates.notna().to_numpy()
+    base = pd.DataFrame(
+        {c: df[c].to_numpy(dtype="float64", na_value=0.0)[garde] for c in colonnes_montants},
+        index=pd.DatetimeIndex(dates.to_numpy()[garde], name="Date"),
+    )
+    base[COL_DOSSIERS] = 1
+    return base.sort_index(kind="stable")
+
+
+def _glissant(serie, regle, mois):
+    if regle == "MS":
+        return serie.rolling(mois, min_periods=1).sum()
+    # Fenêtre en jours sur l'index temporel pour les granularités fines
+    return serie.rolling(f"{round(mois * 30.4375)}D", min_periods=1).sum()
+
+
+def serie_temporelle(base, regle):
+    """
+    Série rééchantillonnée `regle` : facturé, dossiers, cumul, sommes
+    glissantes 3/6/12 mois et écart à l'année précédente (valeur et %).
+    """
+    if base.empty:
+        return pd.DataFrame(columns=[COL_MONTANT, COL_DOSSIERS])
+    serie = base.resample(regle).sum()
+    montant = serie[COL_MONTANT]
+
+    serie["Cumul facturé"] = montant.cumsum()
+    for mois in FENETRES_MOIS:
+        serie[f"Glissant {mois} mois"] = _glissant(montant, regle, mois)
+
+    precedent = montant.copy()
+    precedent.index = precedent.index + DECALAGE_AN[regle]
+    precedent = precedent[~precedent.index.duplicated()].reindex(serie.index)
+    serie["Écart N-1"] = montant - precedent
+    serie["Écart N-1 %"] = (serie["Écart N-1"] / precedent.where(precedent != 0)) * 100
+    return serie
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def serie_en_cache(version, filtres, granularite, col_date, colonnes_montants, _df):
+    """Série mise en cache par (version des données, filtres, granularité) ; `_df` n'est pas haché."""
+    base = base_temporelle(_df, col_date, list(colonnes_montants))
+    return serie_temporelle(base, GRANULARITES[granularite])
+
+
+def sous_echantillonner(serie, colonne, max_points=MAX_POINTS):
+    """
+    Réduit une série trop longue pour l'affichage : par paquet de points
+    consécutifs, seuls le minimum et le maximum de `colonne` sont conservés
+    (les pics restent visibles).
+    """
+    n = len(serie)
+    if n <= max_points:
+        return serie
+    taille = math.ceil(n / (max_points // 2))
+    paquets = np.arange(n) // taille
+    valeurs = pd.Series(serie[colonne].fillna(0.0).to_numpy())
+    groupes = valeurs.groupby(paquets)
+    garde = np.unique(np.concatenate([groupes.idxmin().to_numpy(), groupes.idxmax().to_numpy()]))
+    return serie.iloc[garde]
+
+
+# --------------- GRAPHIQUES -----------------
+
+def figure_courbes(serie, colonnes, titre):
+    """Courbes (WebGL) des colonnes demandées, sous-échantillonnées sur la première."""
+    affichee = sous_echantillonner(serie, colonnes[0]) if colonnes else serie
+    fig = go.Figure()
+    for col in colonnes:
+        fig.add_trace(go.Scattergl(x=affichee.index, y=affichee[col], mode="lines", name=col))
+    fig.update_layout(title=titre, hovermode="x unified", margin=dict(l=10, r=10, t=40, b=10),
+                      yaxis_tickformat=",.0f", legend=dict(orientation="h"))
+    return fig
+
+
+def figure_ecart_annuel(serie, titre="Écart sur un an (facturé)"):
+    """Barres de l'écart N-1 : vert si hausse, rouge si baisse."""
+    affichee = sous_echantillonner(serie.dropna(subset=["Écart N-1"]), "Écart N-1")
+    couleurs = np.where(affichee["Écart N-1"] >= 0, "#2e7d32", "#c62828")
+    fig = go.Figure(go.Bar(x=affichee.index, y=affichee["Écart N-1"], marker_color=couleurs,
+                           customdata=affichee["Écart N-1 %"],
+                           hovertemplate="%{x|%d/%m/%Y}<br>%{y:,.0f} $ (%{customdata:.1f} %)<extra></extra>"))
+    fig.update_layout(title=titre, margin=dict(l=10, r=10, t=40, b=10), yaxis_tickformat=",.0f")
+    return fig
@@ -0,0 +1,189 @@
+"""
+Statuts escrow vectorisés : sélection des dossiers en escrow, statut de
+déblocage à partir des colonnes typées, ancienneté depuis l'envoi et
+prévision des montants à débloquer par semaine ou par mois.
+
+La table des statuts est gardée en session et mise à jour ligne à ligne à
+partir du journal des modifications (marquer_modifie) et des nouveaux
+événements de la feuille Escrow (journal_escrow).
+"""
+from dataclasses import dataclass
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+
+from common_data import modifs_depuis, version_donnees
+from entonnoir import DELAIS
+
+STATUTS = ["Bloqué", "Envoyé sans date", "À débloquer", "Réclamé", "Annulé"]
+# Borne haute (jours, incluse) -> libellé de tranche d'ancienneté
+TRANCHES_ANCIENNETE = [(30, "0–30 j"), (60, "31–60 j"), (90, "61–90 j"), (np.inf, "> 90 j")]
+DELAI_DEFAUT_J = 30
+PERIODES = {"Semaine": "W-MON", "Mois": "MS"}
+
+COLONNES = ["Dossier N", "Nom", "Montant honoraires (US $)", "Acompte 1", "Escrow",
+            "Dossier envoyé", "Date", "Date envoi"]
+
+
+@dataclass(frozen=True)
+class SyntheseEscrow:
+    """Table des statuts avec ancienneté, dossiers à débloquer et indicateurs à une date donnée."""
+    table: pd.DataFrame        # statuts + « Jours depuis envoi » et « Ancienneté »
+    a_debloquer: pd.DataFrame  # statut « À débloquer », les plus anciens d'abord
+    par_tranche: pd.DataFrame  # dossiers et montant à débloquer par tranche d'ancienneté
+    montant_a_debloquer: float
+    montant_bloque: float
+    age_median: float          # NaN sans dossier à débloquer
+    sans_date: int             # envoyés sans date d'envoi
+
+
+# --------------- STATUTS -----------------
+
+def _case(df, col):
+    return df[col].fillna(False).astype(bool) if col in df.columns else pd.Series(False, index=df.index)
+
+
+def masque_escrow(df):
+    """Dossiers en escrow : case cochée, ou acompte versé sans honoraires."""
+    auto = (df["Montant honoraires (US $)"].fillna(0.0) == 0) & (df["Acompte 1"].fillna(0.0) > 0)
+    return _case(df, "Escrow") | auto
+
+
+def statuts_escrow(df, reclames=()):
+    """
+    Table des dossiers escrow de `df` (même index) avec montant et statut de
+    déblocage ; `reclames` : numéros des dossiers dont l'escrow a été réclamé.
+    """
+    sel = df[masque_escrow(df)]
+    date_envoi = sel["Date envoi"].notna()
+    envoye = _case(sel, "Dossier envoyé") | date_envoi
+    statut = np.select(
+        [_case(sel, "Dossier Annulé").to_numpy(), sel["Dossier N"].isin(reclames).to_numpy(),
+         (envoye & date_envoi).to_numpy(), envoye.to_numpy()],
+        ["Annulé", "Réclamé", "À débloquer", "Envoyé sans date"],
+        default="Bloqué",
+    )
+    table = sel.reindex(columns=COLONNES).copy()
+    table["Montant escrow"] = sel["Acompte 1"].fillna(0.0)
+    table["Statut"] = pd.Categorical(statut, categories=STATUTS)
+    return table
+
+
+def delai_preparation(df):
+    """Délai médian (jours) entre création et envoi, sur l'historique ; DELAI_DEFAUT_J à défaut."""
+    debut, fin = DELAIS["Préparation"]
+    jours = (df[fin] - df[debut]).dt.days
+    mediane = jours[jours >= 0].median()
+    return DELAI_DEFAUT_J if pd.isna(mediane) else float(mediane)
+
+
+def dossiers_reclames(evenements):
+    """Numéros des dossiers dont l'escrow a été réclamé (événements « Réclamé » de la feuille Escrow)."""
+    return set(evenements.loc[evenements["État"] == "Réclamé", "Dossier N"].dropna())
+
+
+def table_escrow(data):
+    """
+    Table des statuts escrow et délai de préparation, gardés en session.
+    Après une modification (marquer_modifie), seules les lignes touchées
+    sont recalculées et seuls les nouveaux événements Escrow sont lus ;
+    reconstruction complète si le journal ne suffit pas.
+    """
+    df = data["Clients"]
+    evenements = data.get("Escrow", pd.DataFrame(columns=["Dossier N", "État"]))
+    version = version_donnees()
+    cache = st.session_state.get("escrow_statuts")
+
+    if cache is not None and cache["version"] != version:
+        lignes = modifs_depuis(cache["version"])
+        if lignes is None or len(evenements) < cache["evenements"]:
+            cache = None
+        else:
+            reclames = cache["reclames"] | dossiers_reclames(evenements.iloc[cache["evenements"]:])
+            table = cache["table"].drop(index=lignes, errors="ignore")
+            maj = statuts_escrow(df.loc[df.index.intersection(lignes)], reclames)
+            if len(maj):
+                table = pd.concat([table, maj]).sort_index()
+            cache = {**cache, "version": version, "table": table, "reclames": reclames,
+                     "evenements": len(evenements)}
+
+    if cache is None:
+        reclames = dossiers_reclames(evenements)
+        cache = {"version": version, "table": statuts_escrow(df, reclames), "delai": delai_preparation(df),
+                 "reclames": reclames, "evenements": len(evenements)}
+    st.session_state["escrow_statuts"] = cache
+    return cache
+
+
+# --------------- ANCIENNETÉ ET PRÉVISION -----------------
+
+def anciennete(table, aujourdhui):
+    """Jours depuis l'envoi et tranche d'ancienneté (dossiers envoyés et datés)."""
+    jours = (aujourdhui - table["Date envoi"]).dt.days
+    bornes = [-np.inf] + [b for b, _ in TRANCHES_ANCIENNETE]
+    tranche = pd.cut(jours, bornes, labels=[l for _, l in TRANCHES_ANCIENNETE])
+    return jours, tranche
+
+
+def synthese_escrow(table, aujourdhui):
+    """Ancienneté, dossiers à débloquer et indicateurs de la table des statuts au jour `aujourdhui`."""
+    table = table.copy()
+    table["Jours depuis envoi"], table["Ancienneté"] = anciennete(table, aujourdhui)
+    a_debloquer = table[table["Statut"] == "À débloquer"].sort_values("Jours depuis envoi", ascending=False)
+    par_tranche = (
+        a_debloquer.groupby("Ancienneté", observed=False)["Montant escrow"]
+        .agg(["size", "sum"])
+        .rename(columns={"size": "Dossiers", "sum": "Montant escrow"})
+    )
+    return SyntheseEscrow(
+        table=table,
+        a_debloquer=a_debloquer,
+        par_tranche=par_tranche,
+        montant_a_debloquer=float(a_debloquer["Montant escrow"].sum()),
+        montant_bloque=float(table.loc[table["Statut"] == "Bloqué", "Montant escrow"].sum()),
+        age_median=float(a_debloquer["Jours depuis envoi"].median()),
+        sans_date=int((table["Statut"] == "Envoyé sans date").sum()),
+    )
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def synthese_en_cache(version, aujourdhui, _table):
+    """Synthèse par (version des données, date du jour) ; `_table` (table_escrow) n'est pas hachée."""
+    return synthese_escrow(_table, aujourdhui)
+
+
+def prevision_deblocages(table, delai_j, aujourdhui, periode):
+    """
+    Montants escrow attendus par période (règle pandas `periode`) : les dossiers
+    envoyés sont déblocables dès maintenant ; pour les dossiers bloqués, l'envoi
+    est attendu à Date + délai médian de préparation (au plus tôt aujourd'hui).
+    Les dossiers annulés ou déjà réclamés sont exclus.
+    """
+    ouverts = table[~table["Statut"].isin(["Annulé", "Réclamé"])]
+    bloque = (ouverts["Statut"] == "Bloqué").to_numpy()
+    attendue = (ouverts["Date"] + pd.Timedelta(days=delai_j)).fillna(aujourdhui + pd.Timedelta(days=delai_j))
+    echeance = np.where(bloque, np.maximum(attendue.to_numpy(), aujourdhui.to_datetime64()), aujourdhui.to_datetime64())
+
+    montants = ouverts["Montant escrow"].to_numpy()
+    base = pd.DataFrame(
+        {"Déblocable (US $)": np.where(bloque, 0.0, montants), "Prévu (US $)": np.where(bloque, montants, 0.0),
+         "Dossiers": 1},
+        index=pd.DatetimeIndex(echeance, name="Période"),
+    )
+    if base.empty:
+        return base
+    prev = base.resample(periode).sum()
+    prev["Total (US $)"] = prev["Déblocable (US $)"] + prev["Prévu (US $)"]
+    prev["Cumul (US $)"] = prev["Total (US $)"].cumsum()
+    return prev
+
+
+def figure_prevision(prev):
+    fig = go.Figure()
+    for col, couleur in (("Déblocable (US $)", "#2e7d32"), ("Prévu (US $)", "#90a4ae")):
+        fig.add_trace(go.Bar(x=prev.index, y=prev[col], name=col, marker_color=couleur))
+    fig.update_layout(barmode="stack", margin=dict(l=10, r=10, t=10, b=10), yaxis_tickformat=",.0f",
+                      legend=dict(orientation="h"))
+    return fig
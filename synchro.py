@@ -0,0 +1,426 @@
+"""
+Enregistrement concurrent sur un classeur distant : sauvegarde conditionnée à la
+révision chargée (compare-and-swap) et fusion à trois voies par « Dossier N ».
+"""
+import os
+import shutil
+import threading
+
+import streamlit as st
+import pandas as pd
+
+from common_data import (
+    definir_donnees, definir_source, ecrire_classeur, fichier_temp, identifiant_classeur, lire_classeur,
+    lire_identifiant, load_xlsx, typer_clients, typer_escrow,
+)
+
+CLE_DOSSIER = "Dossier N"
+CLE_EVENEMENT = ["Dossier N", "État", "Horodatage"]
+FEUILLES_JOURNAL = {"Escrow": typer_escrow}  # feuilles d'événements en ajout seul -> typage
+TENTATIVES = 3
+
+
+class ConflitRevision(Exception):
+    """La révision distante a changé depuis le dernier chargement."""
+
+    def __init__(self, revision_distante=None):
+        super().__init__(f"Révision distante modifiée ({revision_distante})")
+        self.revision_distante = revision_distante
+
+
+# --------------- STOCKAGES DISTANTS -----------------
+# lire(destination) télécharge dans un fichier et retourne la révision ;
+# ecrire(source, revision_attendue) envoie un fichier et retourne la nouvelle révision ;
+# revision() interroge seulement la révision courante ; `source` identifie le fichier.
+
+_VERROUS = {}
+_VERROU_GLOBAL = threading.Lock()
+
+
+class RemoteLocal:
+    """Fichier local + compteur de révision : simule un stockage distant (tests, poste isolé)."""
+
+    def __init__(self, chemin):
+        self.chemin = os.path.abspath(chemin)
+        with _VERROU_GLOBAL:
+            self._verrou = _VERROUS.setdefault(self.chemin, threading.Lock())
+
+    @property
+    def source(self):
+        return f"local:{self.chemin}"
+
+    def _revision(self):
+        try:
+            with open(self.chemin + ".rev", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def revision(self):
+        return self._revision()
+
+    def lire(self, destination):
+        with self._verrou:
+            shutil.copyfile(self.chemin, destination)
+            return self._revision()
+
+    def ecrire(self, source, revision_attendue):
+        with self._verrou:
+            courante = self._revision()
+            if courante != revision_attendue:
+                raise ConflitRevision(courante)
+            tmp = self.chemin + ".tmp"
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, self.chemin)
+            nouvelle = str(int(courante or 0) + 1)
+            with open(self.chemin + ".rev", "w", encoding="utf-8") as f:
+                f.write(nouvelle)
+            return nouvelle
+
+
+class RemoteDrive:
+    """
+    Fichier Google Drive ; la révision est le champ `version` du fichier.
+    Drive n'offre pas d'écriture conditionnelle : la version est revérifiée
+    juste avant l'envoi, ce qui réduit la fenêtre de course sans la supprimer.
+    """
+
+    MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    @property
+    def source(self):
+        return f"drive:{self.filename}"
+
+    def _service(self):
+        from utils_gdrive_oauth import get_gdrive_service
+        service = get_gdrive_service()
+        if not service:
+            raise RuntimeError("Service Google Drive indisponible.")
+        return service
+
+    def _fichier(self, service):
+        files = service.files().list(
+            q=f"name='{self.filename}' and trashed=false",
+            fields="files(id, name, version)"
+        ).execute().get("files", [])
+        return files[0] if files else None
+
+    def revision(self):
+        fichier = self._fichier(self._service())
+        return fichier.get("version") if fichier else None
+
+    def lire(self, destination):
+        from googleapiclient.http import MediaIoBaseDownload
+
+        service = self._service()
+        fichier = self._fichier(service)
+        if fichier is None:
+            raise FileNotFoundError(self.filename)
+        with open(destination, "wb") as f:
+            downloader = MediaIoBaseDownload(f, service.files().get_media(fileId=fichier["id"]))
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+        return fichier.get("version")
+
+    def ecrire(self, source, revision_attendue):
+        from googleapiclient.http import MediaFileUpload
+
+        service = self._service()
+        fichier = self._fichier(service)
+        courante = fichier.get("version") if fichier else None
+        if courante != revision_attendue:
+            raise ConflitRevision(courante)
+        # Envoi reprenable par blocs, lu directement depuis le disque
+        media = MediaFileUpload(source, mimetype=self.MIME, resumable=True)
+        if fichier:
+            res = service.files().update(fileId=fichier["id"], media_body=media, fields="version").execute()
+        else:
+            res = service.files().create(body={"name": self.filename}, media_body=media, fields="version").execute()
+        return res.get("version")
+
+
+class RemoteDropbox:
+    """Fichier Dropbox ; écriture conditionnelle native via WriteMode.update(rev)."""
+
+    BLOC = 8 * 1024 * 1024
+
+    def __init__(self, chemin, token=None):
+        self.chemin = chemin
+        self.token = token or os.getenv("DROPBOX_TOKEN") or st.secrets.get("DROPBOX_TOKEN")
+
+    @property
+    def source(self):
+        return f"dropbox:{self.chemin}"
+
+    def revision(self):
+        import dropbox
+        return dropbox.Dropbox(self.token).files_get_metadata(self.chemin).rev
+
+    def lire(self, destination):
+        import dropbox
+        meta = dropbox.Dropbox(self.token).files_download_to_file(destination, self.chemin)
+        return meta.rev
+
+    def _envoyer(self, dbx, source, mode):
+        """Petit fichier : un appel ; gros fichier : session d'envoi par blocs."""
+        import dropbox
+        taille = os.path.getsize(source)
+        with open(source, "rb") as f:
+            if taille <= self.BLOC:
+                return dbx.files_upload(f.read(), self.chemin, mode=mode)
+            session = dbx.files_upload_session_start(f.read(self.BLOC))
+            curseur = dropbox.files.UploadSessionCursor(session.session_id, offset=f.tell())
+            while taille - f.tell() > self.BLOC:
+                dbx.files_upload_session_append_v2(f.read(self.BLOC), curseur)
+                curseur.offset = f.tell()
+            commit = dropbox.files.CommitInfo(path=self.chemin, mode=mode)
+            return dbx.files_upload_session_finish(f.read(self.BLOC), curseur, commit)
+
+    def ecrire(self, source, revision_attendue):
+        import dropbox
+        mode = dropbox.files.WriteMode.update(revision_attendue) if revision_attendue else dropbox.files.WriteMode.add
+        try:
+            meta = self._envoyer(dropbox.Dropbox(self.token), source, mode)
+        except dropbox.exceptions.ApiError as e:
+            if e.error.is_path() and e.error.get_path().reason.is_conflict():
+                raise ConflitRevision() from e
+            raise
+        return meta.rev
+
+
+class RemoteHttp:
+    """
+    Classeur publié en HTTP(S), en lecture seule (intranet d'un bureau, serveur
+    de test) ; la révision est l'ETag, à défaut la date Last-Modified.
+    """
+
+    BLOC = 1024 * 1024
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    @property
+    def source(self):
+        return self.url
+
+    @staticmethod
+    def _revision_reponse(reponse):
+        return reponse.headers.get("ETag") or reponse.headers.get("Last-Modified")
+
+    def revision(self):
+        from urllib.request import Request, urlopen
+        with urlopen(Request(self.url, method="HEAD"), timeout=self.timeout) as reponse:
+            return self._revision_reponse(reponse)
+
+    def lire(self, destination):
+        from urllib.request import urlopen
+        with urlopen(self.url, timeout=self.timeout) as reponse, open(destination, "wb") as f:
+            shutil.copyfileobj(reponse, f, self.BLOC)
+            return self._revision_reponse(reponse)
+
+    def ecrire(self, source, revision_attendue):
+        raise PermissionError(f"Source en lecture seule : {self.url}")
+
+
+# --------------- FUSION À TROIS VOIES -----------------
+
+def _indexer(df, cle):
+    """Indexe par (Dossier N, n° d'occurrence) pour tolérer les doublons de clé."""
+    df = df.astype(object)
+    ids = df[cle].astype(str)
+    df.index = pd.MultiIndex.from_arrays([ids, ids.groupby(ids).cumcount()], names=["cle", "occ"])
+    return df
+
+
+def _egal(a, b):
+    return (a == b) | (a.isna() & b.isna())
+
+
+def _conflits_cellules(masque, base, locale, distante):
+    """Liste les cellules en conflit ; `masque` est le DataFrame booléen empilé (stack)."""
+    conflits = []
+    for dossier, occ, col in masque[masque].index:
+        cle = (dossier, occ)
+        conflits.append({
+            "Dossier N": dossier,
+            "colonne": col,
+            "base": None if base is None else base.at[cle, col],
+            "locale": locale.at[cle, col],
+            "distante": distante.at[cle, col],
+        })
+    return conflits
+
+
+def fusionner(base, locale, distante, cle=CLE_DOSSIER):
+    """
+    Fusion à trois voies de la feuille Clients, cellule par cellule, par dossier.
+    Retourne (fusion, conflits) ; en cas de conflit la valeur locale est conservée.
+    """
+    colonnes = list(dict.fromkeys(list(locale.columns) + list(distante.columns)))
+    b, l, d = (_indexer(x.reindex(columns=colonnes), cle) for x in (base, locale, distante))
+    conflits = []
+
+    # Dossiers présents partout : une cellule modifiée d'un seul côté est reprise
+    commun = l.index.intersection(b.index).intersection(d.index)
+    B, L, D = b.loc[commun], l.loc[commun], d.loc[commun]
+    l_mod, d_mod = ~_egal(L, B), ~_egal(D, B)
+    fusion_commun = L.mask(d_mod & ~l_mod, D)
+    conflit = l_mod & d_mod & ~_egal(L, D)
+    conflits += _conflits_cellules(conflit.stack(), B, L, D)
+
+    # Ajoutés des deux côtés avec le même numéro
+    ajout_double = l.index.intersection(d.index).difference(b.index)
+    diff = ~_egal(l.loc[ajout_double], d.loc[ajout_double])
+    conflits += _conflits_cellules(diff.stack(), None, l.loc[ajout_double], d.loc[ajout_double])
+
+    # Supprimés d'un côté : suppression appliquée si l'autre côté n'a pas modifié le dossier
+    garder = []
+    for cle_l in l.index.intersection(b.index).difference(d.index):
+        if not _egal(l.loc[cle_l], b.loc[cle_l]).all():
+            garder.append(cle_l)
+            conflits.append({"Dossier N": cle_l[0], "colonne": None, "base": None,
+                             "locale": "modifié", "distante": "supprimé"})
+    for cle_d in d.index.intersection(b.index).difference(l.index):
+        if not _egal(d.loc[cle_d], b.loc[cle_d]).all():
+            garder.append(cle_d)
+            conflits.append({"Dossier N": cle_d[0], "colonne": None, "base": None,
+                             "locale": "supprimé", "distante": "modifié"})
+
+    ajouts_locaux = l.index.difference(b.index)
+    ajouts_distants = d.index.difference(b.index).difference(l.index)
+    supprimes_distants_gardes = [k for k in garder if k in l.index]
+    restaures_distants = [k for k in garder if k not in l.index]
+
+    ordre_local = [k for k in l.index if k in commun or k in ajouts_locaux or k in supprimes_distants_gardes]
+    morceaux = [
+        pd.concat([fusion_commun, l.loc[l.index.difference(commun)]]).loc[ordre_local],
+        d.loc[list(ajouts_distants) + restaures_distants],
+    ]
+    fusion = pd.concat(morceaux).reset_index(drop=True)
+    return typer_clients(fusion), conflits
+
+
+def fusionner_evenements(locale, distante, typer, cle=CLE_EVENEMENT):
+    """
+    Union de deux journaux d'événements en ajout seul : les événements distants,
+    puis les locaux qu'il n'a pas (identité : dossier, état, horodatage à la ms).
+    Deux sessions qui ajoutent chacune des événements ne sont jamais en conflit.
+    """
+    morceaux = [x for x in (distante, locale) if len(x)]
+    if not morceaux:
+        return distante
+    tout = typer(pd.concat(morceaux, ignore_index=True))
+    cles = pd.DataFrame({
+        c: (tout[c].dt.floor("ms") if c == "Horodatage" else tout[c]).astype(str) for c in cle
+    })
+    return tout[~cles.duplicated()].reset_index(drop=True)
+
+
+def fusionner_classeurs(base, locale, distante):
+    """Fusionne chaque feuille : Clients par dossier, les journaux par union d'événements, les autres feuille entière."""
+    fusion, conflits = {}, []
+    for sheet in dict.fromkeys(list(locale) + list(distante)):
+        l, d, b = locale.get(sheet), distante.get(sheet), base.get(sheet)
+        if sheet == "Clients" and l is not None and d is not None:
+            fusion[sheet], c = fusionner(b if b is not None else l.iloc[0:0], l, d)
+            conflits += c
+        elif sheet in FEUILLES_JOURNAL and l is not None and d is not None:
+            fusion[sheet] = fusionner_evenements(l, d, FEUILLES_JOURNAL[sheet])
+        elif l is None or (b is not None and l.equals(b)):
+            fusion[sheet] = d
+        else:
+            fusion[sheet] = l
+            if d is not None and b is not None and not d.equals(b) and not d.equals(l):
+                conflits.append({"Dossier N": None, "colonne": f"feuille {sheet}", "base": None,
+                                 "locale": "modifiée", "distante": "modifiée"})
+    return fusion, conflits
+
+
+def _supprimer(chemin):
+    if chemin and os.path.exists(chemin):
+        os.remove(chemin)
+
+
+def enregistrer_distant(remote, data, base_chemin, base_revision, forcer=False, identifiant=None):
+    """
+    Écrit `data` si la révision distante est toujours `base_revision`, sinon
+    fusionne avec la version distante et réessaie. Les classeurs transitent par
+    des fichiers temporaires de la session (jamais en bytes en mémoire).
+    Retourne (revision, chemin_ecrit, data, conflits) ; si des conflits restent
+    (et que `forcer` est faux), rien n'est écrit, `revision` vaut None et le
+    chemin est celui de la version distante téléchargée. `identifiant` : celui
+    du classeur, enregistré dans le fichier envoyé.
+    """
+    base = lire_classeur(base_chemin) if base_chemin else {}
+    telechargee = False
+    for _ in range(TENTATIVES):
+        chemin = ecrire_classeur(data, fichier_temp("envoi"), identifiant)
+        try:
+            return remote.ecrire(chemin, base_revision), chemin, data, []
+        except ConflitRevision:
+            _supprimer(chemin)
+            distant_chemin = fichier_temp("distant")
+            distante_revision = remote.lire(distant_chemin)
+            distant = lire_classeur(distant_chemin)
+            data, conflits = fusionner_classeurs(base, data, distant)
+            if conflits and not forcer:
+                return None, distant_chemin, data, conflits
+            if telechargee:
+                _supprimer(base_chemin)
+            base, base_chemin, base_revision = distant, distant_chemin, distante_revision
+            telechargee = True
+    raise ConflitRevision(base_revision)
+
+
+# --------------- SESSION -----------------
+
+def _remplacer_base(chemin, revision):
+    """Mémorise la nouvelle base de fusion et supprime l'ancien fichier."""
+    ancienne = st.session_state.get("synchro_base", {}).get("chemin")
+    if ancienne != chemin:
+        _supprimer(ancienne)
+    st.session_state["synchro_base"] = {"chemin": chemin, "revision": revision}
+
+
+def charger_distant(remote):
+    """Charge le classeur distant en session et mémorise sa révision comme base de fusion."""
+    chemin = fichier_temp("base")
+    revision = remote.lire(chemin)
+    return installer_distant(remote, chemin, revision)
+
+
+def installer_distant(remote, chemin, revision):
+    """Installe en session un classeur déjà téléchargé de `remote` (base de fusion : `chemin`)."""
+    data = load_xlsx(chemin)
+    if data is None:
+        _supprimer(chemin)
+        return None
+    definir_donnees(data)
+    _remplacer_base(chemin, revision)
+    definir_source(remote.source, revision, lire_identifiant(chemin))
+    return data
+
+
+def enregistrer_session(remote, forcer=False):
+    """Enregistre les données de la session ; retourne la liste des conflits (vide si succès)."""
+    base = st.session_state.get("synchro_base", {})
+    revision, chemin, data, conflits = enregistrer_distant(
+        remote, st.session_state["data_xlsx"], base.get("chemin"), base.get("revision"), forcer, identifiant_classeur()
+    )
+    if conflits and revision is None:
+        _supprimer(chemin)
+        st.session_state["synchro_conflits"] = conflits
+        return conflits
+    if data is not st.session_state["data_xlsx"]:
+        definir_donnees(data)
+    _remplacer_base(chemin, revision)
+    definir_source(remote.source, revision)
+    st.session_state.pop("synchro_conflits", None)
+    from historique import historiser
+    historiser(st.session_state["data_xlsx"])
+    return []
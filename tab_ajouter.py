@@ -1,38 +1,8 @@
 import streamlit as st
 import pandas as pd
-from common_data import ensure_loaded, save_all
-
-# ----------------------------------------------------------------------
-# PARTIE 1 : Fonction de Nettoyage (Ajoutée pour corriger l'erreur)
-# ----------------------------------------------------------------------
-
-@st.cache_data
-def nettoyer_colonne_montant(df, colonne_nom):
-    """
-    Nettoie et convertit une colonne de montant en format numérique (float).
-    Cette fonction est mise en cache pour améliorer les performances.
-    """
-    # Crée une copie pour éviter le SettingWithCopyWarning
-    df_clean = df.copy() 
-    
-    # 1. Nettoyer la colonne (retirer symboles et espaces)
-    df_clean[colonne_nom] = (
-        df_clean[colonne_nom]
-        .astype(str)
-        .str.replace('$', '', regex=False) # Supprime le symbole dollar
-        .str.replace(',', '', regex=False) # Supprime les séparateurs de milliers (s'ils existent)
-        .str.strip()  # Supprime les espaces
-    )
-
-    # 2. Convertir en numérique, en forçant les erreurs à NaN
-    # errors='coerce' est la clé : toute valeur non convertible devient NaN
-    df_clean[colonne_nom] = pd.to_numeric(df_clean[colonne_nom], errors='coerce')
-    
-    return df_clean
-
-# ----------------------------------------------------------------------
-# PARTIE 2 : Fonction Principale (tab_ajouter)
-# ----------------------------------------------------------------------
+from common_data import ajouter_dossier, ensure_loaded, save_all
+from recherche import rechercher_dossiers
+from referentiel_visa import obtenir_arbre
 
 def tab_ajouter():
     st.header("➕ Ajouter un dossier")
@@ -44,14 +14,8 @@ def tab_ajouter():
 
     df = data["Clients"]
     
-    # --- *** CORRECTION APPLIQUÉE ICI *** ---
-    # Nettoyer et convertir la colonne de montant avant toute opération de filtrage
+    # Montants déjà numériques : la feuille est typée et validée au chargement
     COLONNE_MONTANT = "Montant honoraires (US $)"
-    df_clean = nettoyer_colonne_montant(df, COLONNE_MONTANT)
-    # Remplacer le DataFrame original par sa version nettoyée pour le reste de la fonction
-    df = df_clean 
-    # ----------------------------------------
-
 
     # --- AUTO-ID sécurisé ---
     valid_ids = pd.to_numeric(df["Dossier N"], errors="coerce").dropna()
@@ -61,13 +25,23 @@ def tab_ajouter():
 
     nom = st.text_input("Nom du client")
 
+    # Listes en cascade issues de la feuille Visa (saisie libre si le référentiel est vide)
+    arbre = obtenir_arbre(data)
     col1, col2, col3 = st.columns(3)
-    with col1:
-        categorie = st.text_input("Catégories")
-    with col2:
-        sous_cat = st.text_input("Sous-catégories")
-    with col3:
-        visa = st.text_input("Visa")
+    if arbre:
+        with col1:
+            categorie = st.selectbox("Catégories", list(arbre.arbre), key="ajout_categorie")
+        with col2:
+            sous_cat = st.selectbox("Sous-catégories", list(arbre.arbre[categorie]), key="ajout_sous_categorie")
+        with col3:
+            visa = st.selectbox("Visa", arbre.arbre[categorie].get(sous_cat, []), key="ajout_visa")
+    else:
+        with col1:
+            categorie = st.text_input("Catégories")
+        with col2:
+            sous_cat = st.text_input("Sous-catégories")
+        with col3:
+            visa = st.text_input("Visa")
 
     # Montant Honoraires et Autres Frais (cols fines) + Total
     colA, colB, colC = st.columns([1, 1, 1])
@@ -110,29 +84,18 @@ def tab_ajouter():
 
     # ---------- Tableau des dossiers existants avec filtres ----------
     st.subheader("Liste des dossiers existants")
-    # Filtres basiques
-    df_filtered = df.copy() # df est maintenant la version nettoyée
-    filt_cols = st.columns(4)
+    # Recherche plein texte (index inversé construit une fois par chargement)
+    filt_cols = st.columns([3, 1])
     with filt_cols[0]:
-        nom_filtre = st.text_input("Filtrer par nom", "")
-        if nom_filtre:
-            # S'assurer que la colonne "Nom" est de type chaîne de caractères pour .str.lower()
-            df_filtered = df_filtered[df_filtered["Nom"].astype(str).str.lower().str.contains(nom_filtre.lower())]
+        requete = st.text_input(
+            "Rechercher (nom, catégorie, visa, commentaires, RFE)", "",
+            help="Insensible aux accents ; chaque mot est cherché comme début de mot.",
+        )
+        df_filtered = rechercher_dossiers(df, requete)
     with filt_cols[1]:
-        cat_filtre = st.text_input("Filtrer par catégories", "")
-        if cat_filtre:
-            df_filtered = df_filtered[df_filtered["Catégories"].astype(str).str.lower().str.contains(cat_filtre.lower())]
-    with filt_cols[2]:
-        visa_filtre = st.text_input("Filtrer par visa", "")
-        if visa_filtre:
-            df_filtered = df_filtered[df_filtered["Visa"].astype(str).str.lower().str.contains(visa_filtre.lower())]
-    with filt_cols[3]:
         montant_min = st.number_input("Montant min facturé", min_value=0.0, value=0.0)
-        
-        # Ligne 89 corrigée : le DataFrame `df_filtered` a désormais 
-        # une colonne "Montant honoraires (US $)" de type float,
-        # donc la comparaison fonctionne.
-        df_filtered = df_filtered[df_filtered[COLONNE_MONTANT] >= montant_min]
+        if montant_min > 0:
+            df_filtered = df_filtered[df_filtered[COLONNE_MONTANT] >= montant_min]
 
     # Affichage tableau résumé
     display_cols = [
@@ -145,6 +108,10 @@ def tab_ajouter():
 
     # ---------- Enregistrement dossier ----------
     if st.button("💾 Enregistrer le dossier"):
+        if arbre and not arbre.valider(categorie, sous_cat, visa):
+            st.error("❌ Combinaison catégorie / sous-catégorie / visa absente de la feuille Visa.")
+            return
+
         # Lors de l'enregistrement, on s'assure que les colonnes qui 
         # stockent des nombres le sont bien (même si st.number_input le garantit).
         new_row = {
@@ -161,19 +128,17 @@ def tab_ajouter():
             "Date Acompte 1": pd.to_datetime(date_acompte1) if date_acompte1 else pd.NaT,
             "mode de paiement": mode_paiement_str,
             "Escrow": escrow,
-            "Acompte 2": "",
-            "Date Acompte 2": "",
-            "Acompte 3": "",
-            "Date Acompte 3": "",
-            "Acompte 4": "",
-            "Date Acompte 4": "",
+            "Acompte 2": None,
+            "Date Acompte 2": None,
+            "Acompte 3": None,
+            "Date Acompte 3": None,
+            "Acompte 4": None,
+            "Date Acompte 4": None,
             "Commentaires": commentaires,
         }
 
-        # Pour l'ajout de ligne, il est plus sûr d'ajouter à la version originale 
-        # (non-nettoyée si l'on voulait garder le format original) ou 
-        # à la version nettoyée. Puisque nous avons nettoyé df au début, nous 
-        # ajoutons ici.
-        df.loc[len(df)] = new_row
+        # Ajout dans la feuille partagée (data["Clients"]) et non dans la copie
+        # nettoyée : le typage compact des colonnes est conservé.
+        ajouter_dossier(data, new_row)
         save_all()
         st.success("Dossier ajouté avec succès !")
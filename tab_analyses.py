@@ -1,268 +1,280 @@
-import streamlit as st
-import pandas as pd
-import unicodedata as _ud
-
-def tab_analyses():
-    """Onglet Analyses : filtres + comparatif multi-années (jusqu'à 5) + comparaison libre de deux périodes."""
-    st.header("📊 Analyses comparatives")
-
-    # --- Vérif data ---
-    if "data_xlsx" not in st.session_state or not st.session_state["data_xlsx"]:
-        st.warning("⚠️ Aucune donnée disponible. Chargez d'abord le fichier Excel via l'onglet 📄 Fichiers.")
-        return
-    data = st.session_state["data_xlsx"]
-    if "Clients" not in data:
-        st.error("❌ La feuille 'Clients' est absente du fichier Excel.")
-        return
-
-    df = data["Clients"].copy()
-    if df.empty:
-        st.warning("📄 La feuille 'Clients' est vide.")
-        return
-
-    # ---------- Helpers ----------
-    def _col_first(df_, candidates):
-        for c in candidates:
-            if c in df_.columns:
-                return c
-        return None
-
-    def _to_float(x):
-        try:
-            s = str(x).replace("\u00A0", "").replace(",", ".").strip()
-            return float(s) if s not in ("", "nan", "None") else 0.0
-        except Exception:
-            return 0.0
-
-    def _fmt_money(v):
-        try:
-            return f"{float(v):,.2f}".replace(",", " ").replace(".", ",") + " $"
-        except Exception:
-            return v
-
-    def _norm_txt(s):
-        if s is None:
-            return ""
-        s = str(s).strip()
-        s = _ud.normalize("NFKD", s)
-        s = "".join(ch for ch in s if not _ud.combining(ch))
-        s = s.lower().replace("\u00A0", " ").strip()
-        s = " ".join(s.split())
-        return s
-
-    # ---------- Mapping colonnes tolérant accents ----------
-    col_cat   = _col_first(df, ["Catégories", "Categories", "Categorie", "Catégorie"])
-    col_scat  = _col_first(df, ["Sous-catégories", "Sous-categories", "Sous-categorie", "Sous-catégorie", "Sous catégorie", "Sous categorie"])
-    col_visa  = _col_first(df, ["Visa"])
-    col_mh    = _col_first(df, ["Montant honoraires (US $)", "Montant honoraires (US$)", "Honoraires (US $)"])
-    col_autre = _col_first(df, ["Autres frais (US $)", "Autres frais (US$)", "Autres Frais (US $)"])
-    col_date  = _col_first(df, ["Date création", "Date de création", "Date", "Date dossier", "Date Création"])
-
-    # Valeurs par défaut si manquants
-    if col_mh is None:
-        df["Montant honoraires (US $)"] = 0.0
-        col_mh = "Montant honoraires (US $)"
-    if col_autre is None:
-        df["Autres frais (US $)"] = 0.0
-        col_autre = "Autres frais (US $)"
-
-    # Nettoyage montants
-    df[col_mh] = df[col_mh].map(_to_float)
-    df[col_autre] = df[col_autre].map(_to_float)
-    df["Montant facturé"] = df[col_mh] + df[col_autre]
-
-    # Date -> Année / Mois
-    if col_date is None or col_date not in df.columns:
-        st.error("⚠️ Impossible d'identifier la colonne de date (ex. 'Date création').")
-        return
-    df["_Date_"] = pd.to_datetime(df[col_date], errors="coerce")
-    df["Année"] = df["_Date_"].dt.year
-    df["Mois"]  = df["_Date_"].dt.month
-
-    # ---------- Colonnes normalisées pour les filtres ----------
-    if col_cat:
-        df["_cat_norm_"] = df[col_cat].map(_norm_txt)
-    else:
-        df["_cat_norm_"] = ""
-    if col_scat:
-        df["_scat_norm_"] = df[col_scat].map(_norm_txt)
-    else:
-        df["_scat_norm_"] = ""
-    if col_visa:
-        df["_visa_norm_"] = df[col_visa].map(_norm_txt)
-    else:
-        df["_visa_norm_"] = ""
-
-    # ---------- Filtres (robustes aux accents/casse/espaces) ----------
-    st.subheader("🎛️ Filtres")
-    c1, c2, c3 = st.columns(3)
-
-    cat_opts_display  = sorted(df[col_cat].dropna().astype(str).unique().tolist()) if col_cat in df else []
-    scat_opts_display = sorted(df[col_scat].dropna().astype(str).unique().tolist()) if col_scat in df else []
-    visa_opts_display = sorted(df[col_visa].dropna().astype(str).unique().tolist()) if col_visa in df else []
-
-    sel_cat_display  = c1.multiselect("Catégories", options=cat_opts_display, default=cat_opts_display if cat_opts_display else [])
-    sel_scat_display = c2.multiselect("Sous-catégories", options=scat_opts_display, default=scat_opts_display if scat_opts_display else [])
-    sel_visa_display = c3.multiselect("Visa", options=visa_opts_display, default=visa_opts_display if visa_opts_display else [])
-
-    sel_cat_norm  = set(_norm_txt(x) for x in sel_cat_display) if sel_cat_display else set()
-    sel_scat_norm = set(_norm_txt(x) for x in sel_scat_display) if sel_scat_display else set()
-    sel_visa_norm = set(_norm_txt(x) for x in sel_visa_display) if sel_visa_display else set()
-
-    df_f = df.copy()
-    if sel_cat_norm:
-        df_f = df_f[df_f["_cat_norm_"].isin(sel_cat_norm)]
-    if sel_scat_norm:
-        df_f = df_f[df_f["_scat_norm_"].isin(sel_scat_norm)]
-    if sel_visa_norm:
-        df_f = df_f[df_f["_visa_norm_"].isin(sel_visa_norm)]
-
-    # ---------- Sélection du type de comparaison ----------
-    st.markdown("### 🔀 Type de comparaison")
-    compare_choice = st.radio(
-        "Choisissez le mode de comparaison",
-        options=["Comparaison multi-années", "Comparaison de deux périodes"],
-        index=0
-    )
-
-    # ---------- Comparaison MULTI-ANNÉES ----------
-    if compare_choice == "Comparaison multi-années":
-        years_avail = sorted([int(y) for y in df_f["Année"].dropna().unique().tolist()])
-        if len(years_avail) == 0:
-            st.info("Aucune année exploitable après filtres.")
-            return
-
-        st.markdown("#### 📅 Sélection des années (max 5)")
-        default_years = years_avail[-min(2, len(years_avail)):]  # 2 dernières si possible
-        sel_years = st.multiselect(
-            "Années à comparer",
-            options=years_avail,
-            default=default_years,
-            max_selections=5
-        )
-        if not sel_years:
-            st.info("Sélectionnez au moins une année.")
-            return
-
-        df_multi = df_f[df_f["Année"].isin(sel_years)]
-        aggr = (
-            df_multi.groupby("Année")
-                .agg({
-                    "Montant facturé": "sum",
-                    col_mh: "sum",
-                    col_autre: "sum",
-                    "Dossier N": "count"
-                })
-                .rename(columns={
-                    "Montant facturé": "Montant facturé",
-                    col_mh: "Montant honoraires (US $)",
-                    col_autre: "Autres frais (US $)",
-                    "Dossier N": "Nombre de dossiers"
-                })
-                .reindex(sel_years, fill_value=0)
-        )
-
-        pivot = aggr.T  # indicateurs x années
-
-        money_rows = ["Montant facturé", "Montant honoraires (US $)", "Autres frais (US $)"]
-        display = pivot.copy()
-        for row in money_rows:
-            if row in display.index:
-                display.loc[row] = display.loc[row].map(_fmt_money)
-
-        if "Nombre de dossiers" in display.index:
-            display.loc["Nombre de dossiers"] = display.loc["Nombre de dossiers"].map(lambda x: f"{int(x):,}".replace(",", " "))
-
-        st.markdown("#### 📊 Tableau comparatif (années en colonnes)")
-        st.dataframe(
-            display.style.set_table_styles([
-                {"selector": "th", "props": [("text-align", "center")]},
-                {"selector": "td", "props": [("text-align", "left"), ("padding-left", "12px")] }
-            ]),
-            use_container_width=True,
-            height=320
-        )
-
-        # Liste dossiers
-        st.markdown("---")
-        st.markdown("#### 🧾 Dossiers par année")
-        list_cols = ["Année", "Nom", col_mh]
-        list_cols_existing = [c for c in list_cols if c in df_multi.columns]
-        if len(list_cols_existing) < 2:
-            st.info("Colonnes nécessaires manquantes pour lister les dossiers.")
-            return
-
-        df_list = df_multi[list_cols_existing].copy()
-        if col_mh in df_list.columns:
-            df_list[col_mh] = df_list[col_mh].map(_fmt_money)
-
-        if "Année" in df_list.columns and col_mh in df_multi.columns:
-            nums = df_multi[col_mh].astype(float)
-            df_list = df_list.join(nums.rename("_num_mh_"))
-            df_list = df_list.sort_values(by=["Année", "_num_mh_"], ascending=[True, False]).drop(columns=["_num_mh_"])
-        elif "Année" in df_list.columns:
-            df_list = df_list.sort_values(by=["Année"])
-
-        st.dataframe(
-            df_list.style.set_table_styles([
-                {"selector": "th", "props": [("text-align", "left")]},
-                {"selector": "td", "props": [("text-align", "left"), ("padding-left", "12px")] }
-            ]),
-            use_container_width=True,
-            height=420
-        )
-
-    # ---------- Comparaison DEUX PÉRIODES ----------
-    else:
-        st.markdown("#### 🕑 Comparaison de deux périodes")
-
-        colp1, colp2 = st.columns(2)
-
-        with colp1:
-            st.subheader("Période 1")
-            date1_start = st.date_input("Date début 1", value=df["_Date_"].min().date())
-            date1_end = st.date_input("Date fin 1", value=df["_Date_"].max().date())
-        with colp2:
-            st.subheader("Période 2")
-            date2_start = st.date_input("Date début 2", value=df["_Date_"].min().date(), key="d2start")
-            date2_end = st.date_input("Date fin 2", value=df["_Date_"].max().date(), key="d2end")
-
-        # Filtrage des deux périodes
-        df_period1 = df_f[(df_f["_Date_"] >= pd.to_datetime(date1_start)) & (df_f["_Date_"] <= pd.to_datetime(date1_end))]
-        df_period2 = df_f[(df_f["_Date_"] >= pd.to_datetime(date2_start)) & (df_f["_Date_"] <= pd.to_datetime(date2_end))]
-
-        def aggr_period(df_):
-            return {
-                "Nombre de dossiers": len(df_),
-                "Montant facturé": df_["Montant facturé"].sum(),
-                "Montant honoraires (US $)": df_[col_mh].sum(),
-                "Autres frais (US $)": df_[col_autre].sum()
-            }
-        aggr1 = aggr_period(df_period1)
-        aggr2 = aggr_period(df_period2)
-
-        comp_df = pd.DataFrame({
-            "Période 1": [aggr1["Nombre de dossiers"], aggr1["Montant facturé"], aggr1["Montant honoraires (US $)"], aggr1["Autres frais (US $)"]],
-            "Période 2": [aggr2["Nombre de dossiers"], aggr2["Montant facturé"], aggr2["Montant honoraires (US $)"], aggr2["Autres frais (US $)"]],
-        }, index=["Nombre de dossiers", "Montant facturé", "Montant honoraires (US $)", "Autres frais (US $)"])
-
-        # Formatage des montants ($)
-        for col in comp_df.columns:
-            comp_df.loc["Montant facturé", col] = _fmt_money(comp_df.loc["Montant facturé", col])
-            comp_df.loc["Montant honoraires (US $)", col] = _fmt_money(comp_df.loc["Montant honoraires (US $)", col])
-            comp_df.loc["Autres frais (US $)", col] = _fmt_money(comp_df.loc["Autres frais (US $)", col])
-
-        st.markdown("##### 🔎 Comparatif de périodes")
-        st.dataframe(comp_df, use_container_width=True, height=220)
-
-        # Liste dossiers des périodes
-        st.markdown("#### 🧾 Dossiers de la période 1")
-        if not df_period1.empty:
-            st.dataframe(df_period1[["Nom", col_mh, col_autre, "Montant facturé", "_Date_"]], use_container_width=True)
-        else:
-            st.info("Aucun dossier sur cette période.")
-        st.markdown("#### 🧾 Dossiers de la période 2")
-        if not df_period2.empty:
-            st.dataframe(df_period2[["Nom", col_mh, col_autre, "Montant facturé", "_Date_"]], use_container_width=True)
-        else:
-            st.info("Aucun dossier sur cette période.")
+import streamlit as st
+import pandas as pd
+from profiling import mesure
+from common_data import version_donnees
+from historique import choisir_etat_historique
+from referentiel_visa import NON_REFERENCE, obtenir_arbre
+from calculs_analyses import (
+    AUTRES_FRAIS, COL_DATE, COLONNES_ANNUELLES, COLONNES_FILTRES, HONORAIRES, INDICATEURS_MONTANTS,
+    agregats_annuels, annees_en_cache, base_analyses, periodes_en_cache,
+)
+from filtres import obtenir_filtres
+from series_temporelles import (
+    COL_MONTANT, FENETRES_MOIS, GRANULARITES, figure_courbes, figure_ecart_annuel, serie_en_cache,
+)
+from entonnoir import COLONNES_DELAIS, TAUX, entonnoir_en_cache, figure_delais, figure_entonnoir
+from partitions import COL_BUREAU, choisir_perimetre, executer_requete, fusionner
+from affichage import afficher_pagine, config_dates, config_montants, fmt_entiers, fmt_montants
+
+def comparatif_consolide():
+    """Comparatif annuel de tous les bureaux : totaux par année, puis détail bureau × année."""
+    partiels = executer_requete("agregats_annuels", agregats_annuels, colonnes=COLONNES_ANNUELLES)
+    total = fusionner(partiels)
+    if total is None:
+        st.info("Aucun dossier daté dans les bureaux chargés.")
+        return
+    montants = ["Honoraires", "Autres frais", "Total facturé"]
+    config = {**config_montants(montants), "Année": st.column_config.NumberColumn("Année", format="%d")}
+
+    st.markdown("#### 📅 Tous les bureaux, par année")
+    total = total.sort_index()
+    st.bar_chart(total["Total facturé"].rename(index=str))
+    st.dataframe(total.reset_index(), use_container_width=True, column_config=config)
+
+    st.markdown("#### 🏢 Par bureau et par année")
+    detail = pd.concat(partiels, names=[COL_BUREAU]).reset_index()
+    afficher_pagine(detail, key="analyses_bureaux", column_config=config)
+
+
+def tab_analyses():
+    """Onglet Analyses : filtres + comparatif multi-années (jusqu'à 5), deux périodes, séries temporelles, entonnoir et délais."""
+    st.header("📊 Analyses comparatives")
+
+    # Mode multi-bureaux : comparatif annuel consolidé (agrégats partiels par bureau)
+    if choisir_perimetre("perimetre_analyses"):
+        comparatif_consolide()
+        return
+
+    # --- Vérif data ---
+    if "data_xlsx" not in st.session_state or not st.session_state["data_xlsx"]:
+        st.warning("⚠️ Aucune donnée disponible. Chargez d'abord le fichier Excel via l'onglet 📄 Fichiers.")
+        return
+    data, version = st.session_state["data_xlsx"], version_donnees()
+    historique = choisir_etat_historique("historique_analyses")
+    if historique is not None:
+        data, version = historique
+        if data is None:
+            return
+    if "Clients" not in data:
+        st.error("❌ La feuille 'Clients' est absente du fichier Excel.")
+        return
+
+    if data["Clients"].empty:
+        st.warning("📄 La feuille 'Clients' est vide.")
+        return
+
+    # ---------- Base des analyses (calculs_analyses), recalculée une fois par révision ----------
+    with mesure("analyses.base", data["Clients"]):
+        arbre = obtenir_arbre(data, version)
+        df = base_analyses(data, version)
+    if df is None:
+        st.error("⚠️ Impossible d'identifier la colonne de date (ex. 'Date création').")
+        return
+    index = obtenir_filtres("analyses", df, COLONNES_FILTRES, version)
+
+    def _libelle(liste, i):
+        if i < 0:
+            return NON_REFERENCE
+        item = liste[i]
+        return item if isinstance(item, str) else item[-1]
+
+    # ---------- Filtres en cascade sur les identifiants ----------
+    st.subheader("🎛️ Filtres")
+    c1, c2, c3 = st.columns(3)
+
+    cat_opts = list(range(len(arbre.categories))) + [-1]
+    sel_cat = c1.multiselect("Catégories", options=cat_opts, default=cat_opts,
+                             format_func=lambda i: _libelle(arbre.categories, i))
+    scat_opts = [i for i, (c, _) in enumerate(arbre.sous_categories) if c in sel_cat] + [-1]
+    sel_scat = c2.multiselect("Sous-catégories", options=scat_opts, default=scat_opts,
+                              format_func=lambda i: _libelle(arbre.sous_categories, i))
+    # Visas saisis hors référentiel : proposés d'après les sous-catégories de leurs dossiers
+    hors = df.loc[df["scat_id"].isin(sel_scat) & (df["visa_id"] >= len(arbre.visas)), "visa_id"]
+    visa_opts = ([i for i, (_, sc, _) in enumerate(arbre.visas) if sc in sel_scat]
+                 + sorted(hors.unique().tolist()) + [-1])
+    tous_visas = arbre.tous_visas()
+    sel_visa = c3.multiselect("Visa", options=visa_opts, default=visa_opts,
+                              format_func=lambda i: _libelle(tous_visas, i))
+
+    # Masque des sélections (service filtres) : OU des valeurs choisies, ET entre filtres
+    with mesure("analyses.filtres", df):
+        masque = index.masque({"cat_id": sel_cat, "scat_id": sel_scat, "visa_id": sel_visa})
+    df_f = df[masque]
+    filtres = (tuple(sel_cat), tuple(sel_scat), tuple(sel_visa))
+
+    # ---------- Sélection du type de comparaison ----------
+    st.markdown("### 🔀 Type de comparaison")
+    compare_choice = st.radio(
+        "Choisissez le mode de comparaison",
+        options=["Comparaison multi-années", "Comparaison de deux périodes", "Séries temporelles",
+                 "Entonnoir et délais"],
+        index=0
+    )
+
+    # ---------- Comparaison MULTI-ANNÉES ----------
+    if compare_choice == "Comparaison multi-années":
+        years_avail = [int(a) for a in index.options("Année", masque)]
+        if len(years_avail) == 0:
+            st.info("Aucune année exploitable après filtres.")
+            return
+
+        st.markdown("#### 📅 Sélection des années (max 5)")
+        default_years = years_avail[-min(2, len(years_avail)):]  # 2 dernières si possible
+        sel_years = st.multiselect(
+            "Années à comparer",
+            options=years_avail,
+            default=default_years,
+            max_selections=5
+        )
+        if not sel_years:
+            st.info("Sélectionnez au moins une année.")
+            return
+
+        with mesure("analyses.groupby_annees", df_f):
+            res = annees_en_cache(version, filtres, tuple(sel_years), df_f, arbre)
+
+        # Formatage vectorisé ligne par ligne (tableau de 4 x 5 cellules au plus)
+        pivot = res.agregats
+        display = pd.DataFrame(index=pivot.index, columns=pivot.columns, dtype=object)
+        for row in pivot.index:
+            if row in INDICATEURS_MONTANTS:
+                display.loc[row] = fmt_montants(pivot.loc[row]).values
+            else:
+                display.loc[row] = fmt_entiers(pivot.loc[row]).values
+        display.columns = [str(c) for c in display.columns]
+
+        st.markdown("#### 📊 Tableau comparatif (années en colonnes)")
+        st.dataframe(display, use_container_width=True, height=320)
+
+        # Répartition par visa canonique
+        st.markdown("#### 🛂 Dossiers par visa")
+        st.dataframe(res.par_visa.rename(columns=str), use_container_width=True)
+
+        # Liste dossiers
+        st.markdown("---")
+        st.markdown("#### 🧾 Dossiers par année")
+        afficher_pagine(
+            res.dossiers,
+            key="analyses_dossiers_annee",
+            column_config={
+                "Année": st.column_config.NumberColumn("Année", format="%d"),
+                **config_montants([HONORAIRES]),
+            },
+            height=420,
+        )
+
+    # ---------- Comparaison DEUX PÉRIODES ----------
+    elif compare_choice == "Comparaison de deux périodes":
+        st.markdown("#### 🕑 Comparaison de deux périodes")
+
+        colp1, colp2 = st.columns(2)
+
+        with colp1:
+            st.subheader("Période 1")
+            date1_start = st.date_input("Date début 1", value=df[COL_DATE].min().date())
+            date1_end = st.date_input("Date fin 1", value=df[COL_DATE].max().date())
+        with colp2:
+            st.subheader("Période 2")
+            date2_start = st.date_input("Date début 2", value=df[COL_DATE].min().date(), key="d2start")
+            date2_end = st.date_input("Date fin 2", value=df[COL_DATE].max().date(), key="d2end")
+
+        periodes = ((date1_start, date1_end), (date2_start, date2_end))
+        with mesure("analyses.agregats_periodes", df_f):
+            res = periodes_en_cache(version, filtres, periodes, df_f)
+
+        # Formatage des montants ($) sur les seules lignes affichées
+        comp_display = res.comparatif.astype(object)
+        comp_display.loc["Nombre de dossiers"] = fmt_entiers(res.comparatif.loc["Nombre de dossiers"]).values
+        for row in INDICATEURS_MONTANTS:
+            comp_display.loc[row] = fmt_montants(res.comparatif.loc[row]).values
+
+        st.markdown("##### 🔎 Comparatif de périodes")
+        st.dataframe(comp_display, use_container_width=True, height=220)
+
+        # Liste dossiers des périodes
+        period_config = {
+            **config_montants(INDICATEURS_MONTANTS),
+            **config_dates([COL_DATE]),
+        }
+        for i, dossiers in enumerate(res.periodes, 1):
+            st.markdown(f"#### 🧾 Dossiers de la période {i}")
+            if not dossiers.empty:
+                afficher_pagine(dossiers, key=f"analyses_periode{i}", column_config=period_config)
+            else:
+                st.info("Aucun dossier sur cette période.")
+
+    # ---------- SÉRIES TEMPORELLES ----------
+    elif compare_choice == "Séries temporelles":
+        st.markdown("#### 📈 Séries temporelles")
+        s1, s2 = st.columns([1, 3])
+        granularite = s1.selectbox("Granularité", list(GRANULARITES), index=2, key="series_granularite")
+        courbes_dispo = [COL_MONTANT] + [f"Glissant {m} mois" for m in FENETRES_MOIS]
+        courbes = s2.multiselect("Courbes", courbes_dispo, default=[COL_MONTANT, "Glissant 12 mois"], key="series_courbes")
+
+        # Cache par (données, filtres, granularité) : changer de courbes ne recalcule rien
+        with mesure("analyses.series", df_f):
+            serie = serie_en_cache(version, filtres, granularite, COL_DATE,
+                                   (COL_MONTANT, HONORAIRES, AUTRES_FRAIS), df_f)
+        if serie.empty:
+            st.info("Aucun dossier daté après filtres.")
+            return
+
+        if courbes:
+            st.plotly_chart(figure_courbes(serie, courbes, f"Facturé ({granularite.lower()})"), use_container_width=True)
+        g1, g2 = st.columns(2)
+        with g1:
+            st.plotly_chart(figure_courbes(serie, ["Cumul facturé"], "Cumul du facturé"), use_container_width=True)
+        with g2:
+            st.plotly_chart(figure_ecart_annuel(serie), use_container_width=True)
+
+        st.markdown("#### 🧾 Détail par période")
+        colonnes_montants = [COL_MONTANT, HONORAIRES, AUTRES_FRAIS, "Cumul facturé", "Écart N-1"] + courbes_dispo[1:]
+        afficher_pagine(
+            serie.reset_index(),
+            key="analyses_series",
+            column_config={
+                **config_dates(["Date"]),
+                **config_montants(colonnes_montants),
+                "Écart N-1 %": st.column_config.NumberColumn("Écart N-1 %", format="%.1f %%"),
+            },
+        )
+
+    # ---------- ENTONNOIR ET DÉLAIS ----------
+    else:
+        st.markdown("#### 🧭 Entonnoir et délais de traitement")
+        with mesure("analyses.entonnoir", df_f):
+            res = entonnoir_en_cache(version, filtres, df_f, arbre.libelles_visa(df_f["visa_id"]))
+        total = res["total"]
+        if total.empty:
+            st.info("Aucun dossier après filtres.")
+            return
+
+        ligne = total.iloc[0]
+        comptes = fmt_entiers(ligne[["Dossiers", "Envoyés", "Acceptés", "Refusés", "Annulés", "RFE"]])
+        taux_envoi, taux_acceptation = ligne["Taux d'envoi %"], ligne["Taux d'acceptation %"]
+        k1, k2, k3, k4, k5 = st.columns(5)
+        k1.metric("Dossiers", comptes["Dossiers"])
+        k2.metric("Envoyés", comptes["Envoyés"], f"{taux_envoi:.1f} %", delta_color="off")
+        k3.metric("Acceptés", comptes["Acceptés"],
+                  None if pd.isna(taux_acceptation) else f"{taux_acceptation:.1f} % des envoyés", delta_color="off")
+        k4.metric("Refusés / Annulés", f"{comptes['Refusés']} / {comptes['Annulés']}")
+        k5.metric("RFE", comptes["RFE"])
+
+        g1, g2 = st.columns(2)
+        with g1:
+            st.plotly_chart(figure_entonnoir(total), use_container_width=True)
+        with g2:
+            if not res["annee"].empty:
+                st.plotly_chart(figure_delais(res["annee"]), use_container_width=True)
+
+        config = {
+            "Année": st.column_config.NumberColumn("Année", format="%d"),
+            **{c: st.column_config.NumberColumn(c, format="%.1f %%") for c in TAUX},
+            **{c: st.column_config.NumberColumn(c, format="%.0f") for c in COLONNES_DELAIS},
+        }
+        st.markdown("#### 🛂 Par visa")
+        afficher_pagine(res["visa"].reset_index(), key="analyses_entonnoir_visa", column_config=config)
+        st.markdown("#### 📅 Par année de création")
+        afficher_pagine(res["annee"].reset_index(), key="analyses_entonnoir_annee", column_config=config)
+        st.markdown("#### 🧾 Par visa et par année")
+        afficher_pagine(res["visa_annee"].reset_index(), key="analyses_entonnoir_detail", column_config=config)
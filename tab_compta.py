@@ -1,137 +1,113 @@
-import streamlit as st
-import pandas as pd
-
-def tab_compta():
-    """Onglet : Comptabilité Client"""
-    st.header("💳 Comptabilité Client")
-
-    # Vérifie si les données Excel sont chargées
-    if "data_xlsx" not in st.session_state or not st.session_state["data_xlsx"]:
-        st.warning("⚠️ Aucune donnée disponible. Importez un fichier via l’onglet Paramètres.")
-        return
-
-    data = st.session_state["data_xlsx"]
-    if "Clients" not in data:
-        st.error("La feuille 'Clients' est introuvable dans le fichier Excel.")
-        return
-
-    df = data["Clients"].copy()
-    df.columns = [c.strip() for c in df.columns]
-
-    # Conversion des colonnes numériques
-    montant_cols = [
-        "Montant honoraires (US $)",
-        "Autres frais (US $)",
-        "Acompte 1",
-        "Acompte 2",
-        "Acompte 3",
-        "Acompte 4",
-    ]
-    for col in montant_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-
-    # Calculs principaux
-    df["Montant facturé"] = df["Montant honoraires (US $)"] + df["Autres frais (US $)"]
-    df["Total payé"] = df["Acompte 1"] + df["Acompte 2"] + df["Acompte 3"] + df["Acompte 4"]
-    df["Solde restant"] = df["Montant facturé"] - df["Total payé"]
-
-    # ================== FILTRES ==================
-    st.markdown("### 🎯 Filtres")
-    c1, c2, c3 = st.columns(3)
-    visa = c1.selectbox(
-        "Visa",
-        options=["(Tous)"] + sorted(df["Visa"].dropna().unique().tolist()) if "Visa" in df else ["(Tous)"],
-        key="compta_visa"
-    )
-    annee = c2.selectbox(
-        "Année",
-        options=["(Toutes)"] + sorted(df["Année"].dropna().unique().astype(str).tolist()) if "Année" in df else ["(Toutes)"],
-        key="compta_annee"
-    )
-    mois = c3.selectbox(
-        "Mois",
-        options=["(Tous)"] + sorted(df["Mois"].dropna().unique().astype(str).tolist()) if "Mois" in df else ["(Tous)"],
-        key="compta_mois"
-    )
-
-    # Application des filtres
-    if visa != "(Tous)":
-        df = df[df["Visa"] == visa]
-    if annee != "(Toutes)":
-        df = df[df["Année"].astype(str) == annee]
-    if mois != "(Tous)":
-        df = df[df["Mois"].astype(str) == mois]
-
-    st.markdown("---")
-
-    # ================== SYNTHÈSE ==================
-    st.subheader("📊 Synthèse financière")
-    total_facture = df["Montant facturé"].sum()
-    total_paye = df["Total payé"].sum()
-    total_solde = df["Solde restant"].sum()
-
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Facturé", f"{total_facture:,.0f} $")
-    c2.metric("Payé", f"{total_paye:,.0f} $")
-    c3.metric("Solde", f"{total_solde:,.0f} $")
-
-    st.markdown("---")
-
-    # ================== TABLEAU DÉTAILLÉ ==================
-    st.subheader("📋 Détail par client")
-    colonnes_aff = [
-        "Nom",
-        "Visa",
-        "Montant honoraires (US $)",
-        "Autres frais (US $)",
-        "Montant facturé",
-        "Total payé",
-        "Solde restant",
-    ]
-    affichage = df[colonnes_aff] if all(c in df.columns for c in colonnes_aff) else df
-
-    numeric_cols = affichage.select_dtypes(include=["number"]).columns
-    st.dataframe(
-        affichage.style.format(subset=numeric_cols, formatter="{:,.2f}"),
-        use_container_width=True,
-        height=450,
-    )
-
-    st.markdown("---")
-
-    # ================== SYNTHÈSE PAR VISA ==================
-    st.subheader("🗂️ Synthèse par type de visa")
-    if "Visa" in df.columns:
-        recap_visa = (
-            df.groupby("Visa")[["Montant facturé", "Total payé", "Solde restant"]]
-            .sum()
-            .sort_values("Montant facturé", ascending=False)
-            .reset_index()
-        )
-        numeric_cols = recap_visa.select_dtypes(include=["number"]).columns
-        st.dataframe(
-            recap_visa.style.format(subset=numeric_cols, formatter="{:,.2f}"),
-            use_container_width=True,
-        )
-    else:
-        st.info("Aucune colonne 'Visa' trouvée pour regrouper les données.")
-
-    st.markdown("---")
-
-    # ================== SYNTHÈSE PAR ANNÉE ==================
-    st.subheader("📅 Synthèse par année")
-    if "Année" in df.columns:
-        recap_annee = (
-            df.groupby("Année")[["Montant facturé", "Total payé", "Solde restant"]]
-            .sum()
-            .sort_index(ascending=True)
-            .reset_index()
-        )
-        numeric_cols = recap_annee.select_dtypes(include=["number"]).columns
-        st.dataframe(
-            recap_annee.style.format(subset=numeric_cols, formatter="{:,.2f}"),
-            use_container_width=True,
-        )
-    else:
-        st.info("Aucune colonne 'Année' trouvée pour la synthèse temporelle.")
+import streamlit as st
+from profiling import mesure
+from affichage import afficher_pagine, config_montants
+from calculs_compta import COLONNES_SOURCE, FILTRES, SYNTHESE, synthese_compta, synthese_en_cache, table_compta
+from filtres import obtenir_filtres
+from common_data import version_donnees
+from historique import choisir_etat_historique
+from partitions import choisir_perimetre, executer_requete, fusionner
+
+
+def synthese_consolidee():
+    """Synthèse financière de tous les bureaux (agrégats partiels par classeur, fusionnés)."""
+    par_visa = fusionner(executer_requete("synthese_compta", synthese_compta, "Visa", colonnes=COLONNES_SOURCE))
+    par_annee = fusionner(executer_requete("synthese_compta", synthese_compta, "Année", colonnes=COLONNES_SOURCE))
+    if par_visa is None:
+        st.info("Aucun dossier dans les bureaux chargés.")
+        return
+
+    st.subheader("📊 Synthèse financière — tous les bureaux")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Facturé", f"{par_visa['Montant facturé'].sum():,.0f} $")
+    c2.metric("Payé", f"{par_visa['Total payé'].sum():,.0f} $")
+    c3.metric("Solde", f"{par_visa['Solde restant'].sum():,.0f} $")
+
+    st.subheader("🗂️ Synthèse par type de visa")
+    st.dataframe(par_visa.sort_values("Montant facturé", ascending=False).reset_index(),
+                 use_container_width=True, column_config=config_montants(SYNTHESE))
+    if par_annee is not None:
+        st.subheader("📅 Synthèse par année")
+        st.dataframe(par_annee.sort_index().reset_index(), use_container_width=True,
+                     column_config={**config_montants(SYNTHESE),
+                                    "Année": st.column_config.NumberColumn("Année", format="%d")})
+
+
+def tab_compta():
+    """Onglet : Comptabilité Client"""
+    st.header("💳 Comptabilité Client")
+
+    # Mode multi-bureaux : agrégats calculés bureau par bureau puis fusionnés
+    if choisir_perimetre("perimetre_compta"):
+        synthese_consolidee()
+        return
+
+    # Vérifie si les données Excel sont chargées
+    if "data_xlsx" not in st.session_state or not st.session_state["data_xlsx"]:
+        st.warning("⚠️ Aucune donnée disponible. Importez un fichier via l’onglet Paramètres.")
+        return
+
+    data, version = st.session_state["data_xlsx"], version_donnees()
+    historique = choisir_etat_historique("historique_compta")
+    if historique is not None:
+        data, version = historique
+        if data is None:
+            return
+    if "Clients" not in data:
+        st.error("La feuille 'Clients' est introuvable dans le fichier Excel.")
+        return
+
+    # Montants par dossier et index des filtres : une fois par révision des données
+    table = table_compta(data, version)
+    index = obtenir_filtres("compta", table, FILTRES, version)
+
+    # ================== FILTRES ==================
+    st.markdown("### 🎯 Filtres")
+    c1, c2, c3 = st.columns(3)
+    visa = c1.selectbox("Visa", options=[None] + index.options("Visa"), key="compta_visa",
+                        format_func=lambda v: "(Tous)" if v is None else str(v))
+    annee = c2.selectbox("Année", options=[None] + index.options("Année"), key="compta_annee",
+                         format_func=lambda v: "(Toutes)" if v is None else str(v))
+    mois = c3.selectbox("Mois", options=[None] + index.options("Mois"), key="compta_mois",
+                        format_func=lambda v: "(Tous)" if v is None else str(v))
+
+    filtres = (visa, annee, mois)
+    selection = {col: None if v is None else [v] for col, v in zip(FILTRES, filtres)}
+    with mesure("compta.synthese", table):
+        res = synthese_en_cache(version, filtres, table, index.masque(selection))
+
+    st.markdown("---")
+
+    # ================== SYNTHÈSE ==================
+    st.subheader("📊 Synthèse financière")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Facturé", f"{res.facture:,.0f} $")
+    c2.metric("Payé", f"{res.paye:,.0f} $")
+    c3.metric("Solde", f"{res.solde:,.0f} $")
+
+    st.markdown("---")
+
+    # ================== TABLEAU DÉTAILLÉ ==================
+    st.subheader("📋 Détail par client")
+    afficher_pagine(
+        res.detail,
+        key="compta_detail",
+        column_config=config_montants(res.detail.select_dtypes(include=["number"]).columns),
+        height=450,
+    )
+
+    st.markdown("---")
+
+    # ================== SYNTHÈSE PAR VISA ==================
+    st.subheader("🗂️ Synthèse par type de visa")
+    st.dataframe(res.par_visa, use_container_width=True, column_config=config_montants(SYNTHESE))
+
+    st.markdown("---")
+
+    # ================== SYNTHÈSE PAR ANNÉE ==================
+    st.subheader("📅 Synthèse par année")
+    if res.par_annee.empty:
+        st.info("Aucun dossier daté pour la synthèse temporelle.")
+    else:
+        st.dataframe(res.par_annee, use_container_width=True,
+                     column_config={**config_montants(SYNTHESE),
+                                    "Année": st.column_config.NumberColumn("Année", format="%d")})
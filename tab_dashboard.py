@@ -1,7 +1,26 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-from common_data import ensure_loaded
+from common_data import ensure_loaded, version_donnees
+from statuts_escrow import table_escrow
+from calculs_dashboard import COLONNES_ESCROW, COLONNES_LISTE, kpis_clients, kpis_en_cache, kpis_escrow
+from partitions import choisir_perimetre, executer_requete, fusionner, par_bureau
+from affichage import config_montants
+
+
+def tableau_consolide():
+    """KPI consolidés de tous les bureaux : totaux partiels par classeur, puis somme."""
+    partiels = executer_requete("kpis_clients", kpis_clients)
+    total = fusionner(partiels)
+    st.subheader("Indicateurs clefs (KPI) — tous les bureaux")
+    ligne1, ligne2 = st.columns(4), st.columns(4)
+    for col, (nom, valeur) in zip(list(ligne1) + list(ligne2), total.items()):
+        col.metric(nom, f"{valeur:,.0f}")
+    st.subheader("Par bureau")
+    detail = par_bureau(partiels)
+    st.dataframe(detail, use_container_width=True,
+                 column_config={**config_montants([c for c in detail.columns if "US $" in c]),
+                                **{c: st.column_config.NumberColumn(c, format="%d")
+                                   for c in detail.columns if c.startswith("Dossiers")}})
+
 
 def tab_dashboard():
     st.header("📊 Dashboard")
@@ -16,90 +35,48 @@ def tab_dashboard():
         unsafe_allow_html=True
     )
 
+    # Mode multi-bureaux : synthèse répartie sur les classeurs de chaque bureau
+    if choisir_perimetre("perimetre_dashboard"):
+        tableau_consolide()
+        return
+
     data = ensure_loaded()
     if data is None or "Clients" not in data or data["Clients"].empty:
         st.info("Aucune donnée client à afficher.")
         return
 
-    df = data["Clients"].copy()
-
-    def to_float(x):
-        try:
-            f = float(str(x).replace(",", ".").replace(" ", ""))
-            if (str(x).strip().lower() in ["none", "nan", "", "nonetype"] or pd.isna(x)):
-                return 0.0
-            return f
-        except Exception:
-            return 0.0
-
-    # Nettoyage
-    df["Montant honoraires (US $)"] = df["Montant honoraires (US $)"].apply(to_float)
-    df["Acompte 1"] = df["Acompte 1"].apply(to_float)
-    if "Autres frais (US $)" in df.columns:
-        df["Autres frais (US $)"] = df["Autres frais (US $)"].apply(to_float)
-        total_autres_frais = df["Autres frais (US $)"].sum()
-    else:
-        total_autres_frais = 0
-
-    # Calcul Escrow booléen propre
-    if "Escrow" not in df.columns:
-        df["Escrow"] = False
-    def escrow_bool(val):
-        val = str(val).strip().lower()
-        return val in ["true", "vrai", "1", "oui", "x", "ok"]
-    df["Escrow"] = df["Escrow"].apply(escrow_bool)
-
-    # Filtrage Escrow selon la règle métier (case cochée OU honoraires = 0 ET acompte 1 > 0)
-    mask_escrow = df["Escrow"] == True
-    mask_zero_honoraires = (df["Montant honoraires (US $)"] == 0)
-    mask_acompte_positif = (df["Acompte 1"] > 0)
-    mask_auto = mask_zero_honoraires & mask_acompte_positif
-    escrow_df = df[mask_escrow | mask_auto].copy()
-    escrow_df["Montant escrow"] = escrow_df["Acompte 1"]
-    total_escrow_usd = escrow_df["Montant escrow"].sum()
-    total_escrow_dossiers = len(escrow_df)
-
-    # KPI généraux
-    total_clients = len(df)
-    total_honoraires = df["Montant honoraires (US $)"].sum()
-    total_facture = total_honoraires + total_autres_frais
-    total_acomptes = df["Acompte 1"].sum()
-    for col in ["Acompte 2", "Acompte 3", "Acompte 4"]:
-        if col in df.columns:
-            total_acomptes += df[col].apply(to_float).sum()
+    # Totaux (calculs_dashboard) par version des données ; escrow : table partagée avec
+    # l'onglet Escrow, mise à jour à partir des seules lignes modifiées et des nouveaux événements
+    kpis = kpis_en_cache(version_donnees(), data)
+    escrow_df = table_escrow(data)["table"]
+    escrow = kpis_escrow(escrow_df)
 
     # KPI Ligne 1
     st.subheader("Indicateurs clefs (KPI)")
     kpi_row1 = st.columns(4)
-    kpi_row1[0].metric("Nombre total de dossiers clients", int(total_clients))
-    kpi_row1[1].metric("Honoraires facturés (US $)", f"{total_honoraires:,.0f}")
-    kpi_row1[2].metric("Total autres frais (US $)", f"{total_autres_frais:,.0f}")
-    kpi_row1[3].metric("Total facturé (honoraires + frais)", f"{total_facture:,.0f}")
+    kpi_row1[0].metric("Nombre total de dossiers clients", int(kpis["Dossiers"]))
+    kpi_row1[1].metric("Honoraires facturés (US $)", f"{kpis['Honoraires (US $)']:,.0f}")
+    kpi_row1[2].metric("Total autres frais (US $)", f"{kpis['Autres frais (US $)']:,.0f}")
+    kpi_row1[3].metric("Total facturé (honoraires + frais)", f"{kpis['Total facturé (US $)']:,.0f}")
 
     # KPI Ligne 2
     kpi_row2 = st.columns(4)
-    kpi_row2[0].metric("Total acomptes reçus (US $)", f"{total_acomptes:,.0f}")
-    kpi_row2[1].metric("Dossiers en Escrow", total_escrow_dossiers)
-    kpi_row2[2].metric("Montant total Escrow (US $)", f"{total_escrow_usd:,.0f}")
-    kpi_row2[3].metric("Acomptes Escrow (US $)", f"{total_escrow_usd:,.0f}")
+    kpi_row2[0].metric("Total acomptes reçus (US $)", f"{kpis['Acomptes reçus (US $)']:,.0f}")
+    kpi_row2[1].metric("Dossiers en Escrow", int(escrow["Dossiers en Escrow"]))
+    kpi_row2[2].metric("Montant total Escrow (US $)", f"{escrow['Montant Escrow (US $)']:,.0f}")
+    kpi_row2[3].metric("Escrow réclamé (US $)", f"{escrow['Escrow réclamé (US $)']:,.0f}")
 
     # Tableau dossiers en Escrow (résumé)
     st.subheader("Dossiers en escrow")
     if not escrow_df.empty:
-        st.dataframe(
-            escrow_df[
-                ["Dossier N", "Nom", "Acompte 1", "Montant escrow", "Escrow"]
-            ],
-            use_container_width=True
-        )
+        st.dataframe(escrow_df[COLONNES_ESCROW], use_container_width=True)
     else:
         st.info("Aucun dossier en Escrow.")
 
     # Liste synthétique des clients
     st.subheader("Liste synthétique des clients")
-    columns_to_show = ["Dossier N", "Nom", "Montant honoraires (US $)", "Acompte 1"]
-    available_columns = [col for col in columns_to_show if col in df.columns]
+    df = data["Clients"]
     st.dataframe(
-        df[available_columns],
+        df[[col for col in COLONNES_LISTE if col in df.columns]],
         use_container_width=True
     )
@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from common_data import ensure_loaded
+from common_data import ensure_loaded, version_donnees
+from journal_escrow import enregistrer_evenement
+from profiling import mesure
+from statuts_escrow import PERIODES, figure_prevision, prevision_deblocages, synthese_en_cache, table_escrow
+from affichage import afficher_pagine, config_dates, config_montants
+
 
 def tab_escrow():
     st.header("🛡️ Escrow – Suivi des dossiers")
@@ -11,54 +15,23 @@ def tab_escrow():
         st.info("Aucun fichier chargé.")
         return
 
-    df = data["Clients"].copy()
-
-    def to_float(x):
-        try:
-            f = float(str(x).replace(",", ".").replace(" ", ""))
-            if (str(x).strip().lower() in ["none", "nan", "", "nonetype"] or pd.isna(x)):
-                return 0.0
-            return f
-        except Exception:
-            return 0.0
-
-    df["Montant honoraires (US $)"] = df["Montant honoraires (US $)"].apply(to_float)
-    df["Acompte 1"] = df["Acompte 1"].apply(to_float)
-    if "Escrow" not in df.columns:
-        df["Escrow"] = False
-
-    def escrow_bool(val):
-        val = str(val).strip().lower()
-        return val in ["true", "vrai", "1", "oui", "x", "ok"]
-
-    df["Escrow"] = df["Escrow"].apply(escrow_bool)
-
-    # -- Sélection Escrow principal --
-    mask_escrow = df["Escrow"] == True
-    mask_zero_honoraires = (df["Montant honoraires (US $)"] == 0)
-    mask_acompte_positif = (df["Acompte 1"] > 0)
-    mask_auto = mask_zero_honoraires & mask_acompte_positif
-    escrow_df = df[mask_escrow | mask_auto].copy()
-
-    if escrow_df.empty:
+    # -- Statuts de déblocage (calcul vectorisé, mis à jour ligne à ligne après modification) --
+    with mesure("escrow.statuts", data["Clients"]):
+        cache = table_escrow(data)
+    if cache["table"].empty:
         st.info("Aucun dossier en Escrow pour le moment.")
         return
 
-    escrow_df["Montant escrow"] = escrow_df["Acompte 1"]
+    aujourdhui = pd.Timestamp.today().normalize()
+    synthese = synthese_en_cache(version_donnees(), aujourdhui, cache["table"])
+    escrow_df = synthese.table
 
-    # -- Statut de déblocage pour suivi opérationnel --
-    def statut_debloque(row):
-        sent = str(row.get("Dossier envoyé", "")).strip().lower() in ["true", "vrai", "1", "oui", "x", "ok"]
-        date_envoi = str(row.get("Date envoi", "")).strip()
-        if sent and date_envoi and not pd.isna(date_envoi):
-            return "À débloquer"
-        else:
-            return "Bloqué"
-    escrow_df["Statut"] = escrow_df.apply(statut_debloque, axis=1)
+    montants = ["Montant honoraires (US $)", "Acompte 1", "Montant escrow"]
+    config = {**config_montants(montants), **config_dates(["Date", "Date envoi"])}
 
     # ---- Tableau principal ---
     st.subheader("📋 Dossiers concernés par Escrow")
-    st.dataframe(
+    afficher_pagine(
         escrow_df[
             [
                 "Dossier N",
@@ -72,29 +45,83 @@ def tab_escrow():
                 "Statut"
             ]
         ],
-        use_container_width=True
+        key="escrow_dossiers",
+        column_config=config,
     )
 
     # --- Tableau Escrow à débloquer + KPIs spécifiques
-    escrow_debloquer_df = escrow_df[escrow_df["Statut"] == "À débloquer"].copy()
-    montant_total_a_debloquer = escrow_debloquer_df["Montant escrow"].sum()
-    nb_a_debloquer = len(escrow_debloquer_df)
-
     st.subheader("🔓 Escrow à débloquer")
-    kpi_col1, kpi_col2 = st.columns(2)
-    kpi_col1.metric("Montant total à débloquer (US $)", f"{montant_total_a_debloquer:,.0f}")
-    kpi_col2.metric("Nombre de dossiers à débloquer", nb_a_debloquer)
+    kpi_col1, kpi_col2, kpi_col3, kpi_col4 = st.columns(4)
+    kpi_col1.metric("Montant total à débloquer (US $)", f"{synthese.montant_a_debloquer:,.0f}")
+    kpi_col2.metric("Nombre de dossiers à débloquer", len(synthese.a_debloquer))
+    kpi_col3.metric("Ancienneté médiane (jours)", "—" if pd.isna(synthese.age_median) else f"{synthese.age_median:.0f}")
+    kpi_col4.metric("Montant encore bloqué (US $)", f"{synthese.montant_bloque:,.0f}")
 
-    st.dataframe(
-        escrow_debloquer_df[
+    if synthese.sans_date:
+        st.warning(f"⚠️ {synthese.sans_date} dossier(s) marqué(s) envoyé(s) sans date d'envoi : à compléter pour les débloquer.")
+
+    afficher_pagine(
+        synthese.a_debloquer[
             [
                 "Dossier N",
                 "Nom",
                 "Acompte 1",
                 "Montant escrow",
                 "Date envoi",
+                "Jours depuis envoi",
+                "Ancienneté",
                 "Statut"
             ]
         ],
-        use_container_width=True
+        key="escrow_a_debloquer",
+        column_config=config,
     )
+
+    # --- Ancienneté des montants à débloquer
+    st.subheader("⏳ Ancienneté depuis l'envoi")
+    st.dataframe(synthese.par_tranche, use_container_width=True, column_config=config_montants(["Montant escrow"]))
+
+    # --- Prévision des déblocages
+    st.subheader("📅 Prévision des déblocages")
+    periode = st.radio("Par", list(PERIODES), horizontal=True, key="escrow_periode")
+    prev = prevision_deblocages(escrow_df, cache["delai"], aujourdhui, PERIODES[periode])
+    if prev.empty:
+        st.info("Aucun montant escrow à débloquer.")
+    else:
+        st.caption(
+            f"Dossiers bloqués : envoi attendu {cache['delai']:.0f} jours après la création "
+            "(délai médian de préparation constaté)."
+        )
+        st.plotly_chart(figure_prevision(prev), use_container_width=True)
+        afficher_pagine(
+            prev.reset_index(),
+            key="escrow_prevision",
+            column_config={
+                **config_dates(["Période"]),
+                **config_montants(["Déblocable (US $)", "Prévu (US $)", "Total (US $)", "Cumul (US $)"]),
+            },
+        )
+
+    st.markdown("---")
+    formulaire_evenement(data, escrow_df)
+
+
+def formulaire_evenement(data, escrow_df):
+    """Envoi du dossier ou réclamation des fonds : un événement ajouté au journal escrow."""
+    st.subheader("✏️ Enregistrer l'envoi ou la réclamation d’un dossier")
+
+    noms = dict(zip(escrow_df["Dossier N"], escrow_df["Nom"]))  # une passe, pas un filtre par option
+    selected = st.selectbox("Choisir un dossier :", list(noms), key="escrow_evt_dossier",
+                            format_func=lambda n: f"{n} – {noms.get(n, '')}")
+    etat = st.radio("Événement", ["Envoyé", "Réclamé"], horizontal=True, key="escrow_evt_etat",
+                    format_func=lambda e: {"Envoyé": "Dossier envoyé", "Réclamé": "Escrow réclamé"}[e])
+    date_evt = st.date_input("Date", key="escrow_evt_date")
+
+    if st.button("💾 Enregistrer l'événement", key="escrow_evt_enregistrer"):
+        # Événement ajouté au journal (feuille Escrow + fichier en ajout seul) : pas de réécriture du classeur
+        try:
+            enregistrer_evenement(data, selected, etat, date_evt)
+        except (KeyError, OSError) as e:
+            st.error(f"❌ Événement non enregistré : {e}")
+            return
+        st.success("Dossier mis à jour !")
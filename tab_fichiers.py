@@ -1,5 +1,37 @@
+import os
+
 import streamlit as st
-from common_data import load_xlsx, save_all, MAIN_FILE
+import pandas as pd
+from affichage import TAILLE_PAGE
+from chargement import ETAPES, etape_en_cours, importer_par_etapes, libelle, progression
+from common_data import save_all, version_donnees, MAIN_FILE
+from export import FORMATS_EXPORT, export_session
+from synchro import RemoteDrive, charger_distant, enregistrer_session
+from partitions import charger_partitions, noms_bureaux, partitions_actives, partitions_chargees, partitions_en_echec
+from recuperation import bureaux_distants
+
+def importer_fichier(uploaded):
+    """Import par étapes avec barre de progression et aperçu du premier bloc."""
+    barre = st.progress(0.0, text="Ouverture du classeur…")
+    apercu = st.empty()
+    etape = "lecture"
+    try:
+        # Lecture directe du fichier reçu, sans copie supplémentaire en bytes
+        for evt in importer_par_etapes(uploaded, cle_source=uploaded.file_id):
+            barre.progress(progression(evt), text=libelle(evt))
+            if evt["apercu"] is not None:
+                with apercu.container():
+                    st.caption("Aperçu des premières lignes (chargement en cours)…")
+                    st.dataframe(evt["apercu"].head(TAILLE_PAGE), use_container_width=True)
+            etape = etape_en_cours(evt)
+    except Exception as e:
+        barre.empty()
+        st.error(f"❌ Échec de l'import à l'étape « {ETAPES[etape][0]} » : {e}")
+        return
+    barre.empty()
+    apercu.empty()
+    st.success("✅ Fichier chargé avec succès et disponible dans l’application.")
+
 
 def tab_fichiers():
     st.header("📄 Gestion des fichiers")
@@ -7,13 +39,57 @@ def tab_fichiers():
     # --- IMPORT FICHIER ---
     uploaded = st.file_uploader("Importer un fichier Excel (.xlsx)", type="xlsx")
 
-    if uploaded:
-        file_bytes = uploaded.getvalue()
-        data = load_xlsx(file_bytes)
+    # Le fichier reste attaché à l'uploader : on ne le relit qu'une fois,
+    # sinon chaque rerun rechargerait le classeur et écraserait les modifications.
+    if uploaded and st.session_state.get("fichier_importe") != uploaded.file_id:
+        # Un clic interrompt le rerun en cours ; au rerun suivant l'import n'est pas relancé
+        if st.button("⏹️ Annuler l'import", key="annuler_import"):
+            st.session_state["fichier_importe"] = uploaded.file_id
+            st.info("Import annulé : les données précédentes sont conservées.")
+        else:
+            importer_fichier(uploaded)
 
-        if data is not None:
-            st.session_state["data_xlsx"] = data
-            st.success("✅ Fichier chargé avec succès et disponible dans l’application.")
+    durees = st.session_state.get("import_durees")
+    if durees and "cache" in durees:
+        st.caption("Durées du dernier import : " + " · ".join(f"{e} {d:.2f} s" for e, d in durees.items()))
+
+    # --- AUTRES BUREAUX (PARTITIONS) ---
+    with st.expander("🏢 Autres bureaux (rapports consolidés)", expanded=bool(partitions_chargees())):
+        fichiers = st.file_uploader(
+            "Classeurs des autres bureaux (un fichier par bureau)", type="xlsx",
+            accept_multiple_files=True, key="partitions_upload",
+        )
+        # Seuls les classeurs nouveaux ou modifiés sont relus (en parallèle) ; les bureaux
+        # récupérés au démarrage (sources configurées) restent chargés
+        with st.spinner("Chargement des bureaux…"):
+            recharges = charger_partitions({**bureaux_distants(), **noms_bureaux(fichiers or [])})
+        if recharges:
+            st.success("✅ Bureaux chargés : " + ", ".join(recharges))
+        echecs = partitions_en_echec()
+        if echecs:
+            st.error("❌ Bureaux non chargés (les autres restent disponibles) : "
+                     + " ; ".join(f"{nom} ({erreur})" for nom, erreur in echecs.items()))
+        actives = partitions_actives()
+        if len(actives) > 1:
+            st.caption("Les onglets Dashboard, Analyses et Comptabilité proposent le périmètre « Tous les bureaux ».")
+            st.dataframe(
+                pd.DataFrame(
+                    [{"Bureau": nom, "Dossiers": len(d["Clients"]), "Version": v} for nom, (v, d) in actives.items()]
+                ),
+                use_container_width=True, hide_index=True,
+            )
+
+    # --- SOURCES DISTANTES (DÉMARRAGE) ---
+    recuperation = st.session_state.get("recuperation")
+    if recuperation:
+        with st.expander(f"🌐 Sources distantes récupérées au démarrage ({recuperation['total_s']:.1f} s)"):
+            st.dataframe(
+                pd.DataFrame(recuperation["sources"])[
+                    ["nom", "source", "statut", "duree_s", "tentatives", "octets", "revision", "erreur"]
+                ],
+                use_container_width=True, hide_index=True,
+                column_config={"duree_s": st.column_config.NumberColumn("Durée (s)", format="%.2f")},
+            )
 
     # --- SI PAS DE FICHIER ---
     if "data_xlsx" not in st.session_state:
@@ -27,6 +103,20 @@ def tab_fichiers():
     sheet_names = list(data.keys())
     st.write(", ".join(sheet_names))
 
+    memoire = st.session_state.get("memoire_clients")
+    if memoire:
+        st.caption(
+            f"Mémoire feuille Clients : {memoire['avant'] / 1e6:.1f} Mo → "
+            f"{memoire['apres'] / 1e6:.1f} Mo après typage des colonnes."
+        )
+
+    # Rapport de validation (calculé au chargement)
+    rapport = st.session_state.get("rapport_validation")
+    if rapport is not None and not rapport.empty:
+        st.warning(f"⚠️ {int(rapport['Lignes'].sum())} anomalie(s) détectée(s) dans la feuille Clients.")
+        with st.expander("🩺 Rapport de validation", expanded=False):
+            st.dataframe(rapport, use_container_width=True, hide_index=True)
+
     # Aperçu
     selected_sheet = st.selectbox("Afficher une feuille", sheet_names)
 
@@ -39,9 +129,77 @@ def tab_fichiers():
     if st.button("Sauvegarder localement"):
         if save_all():
             st.success("Fichier sauvegardé dans la session.")
-            st.download_button(
-                "⬇️ Télécharger le fichier sauvegardé",
-                data=st.session_state["last_saved_file"],
-                file_name=MAIN_FILE,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            with open(st.session_state["last_saved_path"], "rb") as f:
+                st.download_button(
+                    "⬇️ Télécharger le fichier sauvegardé",
+                    data=f,
+                    file_name=MAIN_FILE,
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
+    # --- EXPORT FORMATS NATIFS ---
+    st.subheader("📦 Export rapide (Parquet / Arrow / CSV)")
+    e1, e2, e3 = st.columns([1, 2, 1])
+    fmt = e1.selectbox("Format", list(FORMATS_EXPORT), key="export_format")
+    feuilles = e2.multiselect("Feuilles", sheet_names, default=["Clients"] if "Clients" in sheet_names else sheet_names[:1], key="export_feuilles")
+    zip_multi = e3.checkbox("Archive ZIP", value=len(feuilles) > 1, key="export_zip")
+
+    demande = (version_donnees(), tuple(feuilles), fmt, zip_multi)
+    if feuilles and st.button("⚙️ Préparer l'export"):
+        st.session_state["export_demande"] = demande
+    if feuilles and st.session_state.get("export_demande") == demande:
+        try:
+            chemin, ext, mime = export_session(demande, data)
+        except (OSError, ValueError) as e:
+            st.error(f"❌ Export impossible : {e}")
+        else:
+            # Fichier de la session, transmis depuis le disque comme la sauvegarde XLSX
+            nom = "Clients BL" if (zip_multi or len(feuilles) > 1) else feuilles[0]
+            with open(chemin, "rb") as f:
+                st.download_button(
+                    f"⬇️ Télécharger {nom}{ext} ({os.path.getsize(chemin) / 1e6:.1f} Mo)",
+                    data=f,
+                    file_name=f"{nom}{ext}",
+                    mime=mime,
+                )
+
+    # --- SYNCHRONISATION GOOGLE DRIVE ---
+    st.subheader("☁️ Google Drive (enregistrement partagé)")
+    remote = RemoteDrive(MAIN_FILE)
+    base = st.session_state.get("synchro_base")
+    if base:
+        st.caption(f"Révision Drive chargée : {base['revision']}")
+
+    c1, c2 = st.columns(2)
+    if c1.button("📥 Charger depuis Drive"):
+        try:
+            if charger_distant(remote) is not None:
+                st.success("✅ Classeur Drive chargé.")
+        except Exception as e:
+            st.error(f"❌ Erreur chargement Drive : {e}")
+
+    if c2.button("📤 Enregistrer sur Drive"):
+        try:
+            if not enregistrer_session(remote):
+                st.success("✅ Enregistré sur Drive (modifications concurrentes fusionnées).")
+        except Exception as e:
+            st.error(f"❌ Erreur enregistrement Drive : {e}")
+
+    conflits = st.session_state.get("synchro_conflits")
+    if conflits:
+        st.warning(f"⚠️ {len(conflits)} conflit(s) avec une modification faite entre-temps sur Drive.")
+        st.dataframe(pd.DataFrame(conflits).astype(str), use_container_width=True)
+        k1, k2 = st.columns(2)
+        if k1.button("Garder mes valeurs et enregistrer"):
+            try:
+                enregistrer_session(remote, forcer=True)
+                st.success("✅ Enregistré sur Drive avec vos valeurs.")
+            except Exception as e:
+                st.error(f"❌ Erreur enregistrement Drive : {e}")
+        if k2.button("Abandonner mes modifications (recharger Drive)"):
+            try:
+                if charger_distant(remote) is not None:
+                    st.session_state.pop("synchro_conflits", None)
+                    st.info("Version Drive rechargée.")
+            except Exception as e:
+                st.error(f"❌ Erreur chargement Drive : {e}")
@@ -1,114 +1,89 @@
+import streamlit as st
 import pandas as pd
-import os
+from common_data import CLIENTS_TYPES, ensure_loaded, modifier_dossier, save_all
+from recherche import rechercher_dossiers
+from affichage import afficher_pagine, config_dates, config_montants
 
-# --- PARAMETRES DU CHEMIN FICHIER ET FEUILLE ---
-DATA_PATH = r"C:\Users\charl\Mon Drive\streamlit-berenbaum-app\Clients BL.xlsx"
-SHEET_NAME = "Clients"
+# Nombre maximal de dossiers proposés dans la liste de sélection
+MAX_CHOIX = 500
 
-# --- CHARGEMENT DES DONNEES ---
-def ensure_loaded():
-    try:
-        df_clients = pd.read_excel(DATA_PATH, sheet_name=SHEET_NAME)
-        st.write("Colonnes lues :", df_clients.columns.tolist())
-        st.write("Aperçu des premières lignes :", df_clients.head())
-        if df_clients.empty:
-            st.warning("Le fichier Excel de clients est vide.")
-            return None
-    except Exception as e:
-        st.error(f"Erreur lors du chargement Excel : {e}")
-        return None
-    return {"Clients": df_clients}
+# --- CHAMP ÉDITABLE SELON SON TYPE (colonnes typées au chargement) ---
+def champ_edition(champ, typ, valeur, key):
+    manquant = valeur is None or pd.isna(valeur)
+    if typ == "case":
+        return st.checkbox(champ, value=False if manquant else bool(valeur), key=key)
+    if typ == "date":
+        return st.date_input(champ, value=None if manquant else valeur.date(), format="DD/MM/YYYY", key=key)
+    if typ == "montant":
+        return st.number_input(champ, value=None if manquant else float(valeur), step=10.0, key=key)
+    return st.text_input(champ, value="" if manquant else str(valeur), key=key)
 
-# --- SAUVEGARDE DES MODIFICATIONS ---
-def save_data(data):
-    df = data.get("Clients", pd.DataFrame())
-    try:
-        with pd.ExcelWriter(DATA_PATH, mode="a", if_sheet_exists="replace") as writer:
-            df.to_excel(writer, sheet_name=SHEET_NAME, index=False)
-    except Exception as e:
-        st.error(f"Erreur sauvegarde Excel: {e}")
 
-# --- FORMATAGE DES CASES À COCHER ---
-def format_checkbox(val):
-    return str(val).strip().lower() in ["true", "1", "vrai", "oui", "x", "ok"]
+def valeur_saisie(typ, valeur):
+    if typ == "date":
+        return pd.Timestamp(valeur) if valeur else pd.NaT
+    if typ in ("texte", "categorie"):
+        return valeur.strip() or None
+    return valeur
 
 # --- FONCTION PRINCIPALE DE GESTION ---
 def tab_gestion():
     st.header("📝 Gestion des dossiers clients")
-    data = ensure_loaded()
-    
-    # Debug : présence des clés
-    if data and "Clients" in data:
-        st.write("Nombre de dossiers chargés :", len(data["Clients"]))
-    else:
-        st.write("La clé 'Clients' est absente ou les données sont vides.")
 
+    # Classeur partagé de la session (chargé une fois via l'onglet Fichiers)
+    data = ensure_loaded()
     if data is None or "Clients" not in data or data["Clients"].empty:
         st.error("Aucune donnée client chargée.")
         return
 
-    df = data["Clients"].copy()
-    save_flag = False
-
-    st.info("Modifiez chaque dossier puis enregistrez vos modifications une à une.")
+    df = data["Clients"]
+    champs = [(c, t) for c, t in CLIENTS_TYPES.items() if c in df.columns]
 
-    # Champs à éditer (adapter à votre Excel si besoin)
-    base_champs = [
-        ("Dossier N", "text"),
-        ("Nom", "text"),
-        ("Date", "text"),
-        ("Catégories", "text"),
-        ("Sous-catégories", "text"),
-        ("Visa", "text"),
-        ("Montant honoraires (US $)", "text"),
-        ("Autres frais (US $)", "text"),
-        ("Acompte 1", "text"),
-        ("Date Acompte 1", "text"),
-        ("mode de paiement", "text"),
-        ("Escrow", "checkbox"),
-        ("Acompte 2", "text"),
-        ("Date Acompte 2", "text"),
-        ("Acompte 3", "text"),
-        ("Date Acompte 3", "text"),
-        ("Acompte 4", "text"),
-        ("Date Acompte 4", "text"),
-        ("Dossier envoyé", "checkbox"),
-        ("Date envoi", "text"),
-        ("Dossier accepté", "checkbox"),
-        ("Date acceptation", "text"),
-        ("Dossier refusé", "checkbox"),
-        ("Date refus", "text"),
-        ("Dossier Annulé", "checkbox"),
-        ("Date annulation", "text"),
-        ("RFE", "text"),
-        ("Commentaires", "text"),
-    ]
+    # --- Sélection du dossier (recherche plein texte sur l'index partagé) ---
+    requete = st.text_input(
+        "Rechercher un dossier (nom, catégorie, visa, commentaires, RFE)", "", key="gestion_recherche",
+    )
+    df_f = rechercher_dossiers(df, requete)
+    if df_f.empty:
+        st.info("Aucun dossier ne correspond à la recherche.")
+        return
+    if len(df_f) > MAX_CHOIX:
+        st.caption(f"{len(df_f)} dossiers : seuls les {MAX_CHOIX} premiers sont proposés, affinez la recherche.")
 
-    for idx, row in df.iterrows():
-        # Expandeur par dossier
-        with st.expander(f"Dossier N°{row.get('Dossier N', idx)} — {row.get('Nom', '')}", expanded=False):
-            vals = {}
-            for champ, typ in base_champs:
-                default = str(row.get(champ, "")) if champ in df.columns else ""
-                if typ == "checkbox":
-                    vals[champ] = st.checkbox(champ, value=format_checkbox(default), key=f"{champ}_{idx}")
-                else:
-                    vals[champ] = st.text_input(champ, value=default, key=f"{champ}_{idx}")
+    idx = st.selectbox(
+        "Dossier à modifier",
+        df_f.index[:MAX_CHOIX].tolist(),
+        format_func=lambda i: f"Dossier N°{df.at[i, 'Dossier N']} — {df.at[i, 'Nom']}",
+        key="gestion_dossier",
+    )
+    ligne = df.loc[idx]
 
-            # Enregistrement
-            if st.button(f"Enregistrer ce dossier", key=f"save_{idx}"):
-                for champ, typ in base_champs:
-                    df.at[idx, champ] = vals[champ]
-                save_flag = True
-                st.success(f"Dossier N°{row.get('Dossier N', idx)} mis à jour.")
+    # --- Formulaire : aucun rerun pendant la saisie, une seule mise à jour à l'envoi ---
+    with st.form(f"gestion_form_{idx}"):
+        cols = st.columns(2)
+        vals = {}
+        for i, (champ, typ) in enumerate(champs):
+            with cols[i % 2]:
+                vals[champ] = champ_edition(champ, typ, ligne[champ], key=f"gestion_{champ}_{idx}")
+        enregistrer = st.form_submit_button("Enregistrer ce dossier")
 
-    if save_flag:
-        data["Clients"] = df
-        save_data(data)
-        st.info("Les modifications ont été sauvegardées.")
+    if enregistrer:
+        # Mise à jour en place de la ligne (typage conservé, modification journalisée),
+        # puis sauvegarde du classeur comme pour un ajout (save_all affiche l'erreur éventuelle)
+        try:
+            modifier_dossier(data, idx, {c: valeur_saisie(t, vals[c]) for c, t in champs})
+        except (KeyError, TypeError, ValueError) as e:
+            st.error(f"❌ Dossier non modifié : {e}")
+        else:
+            if save_all():
+                st.success(f"Dossier N°{df.at[idx, 'Dossier N']} mis à jour.")
 
     st.subheader("Aperçu synthétique des dossiers")
-    synth_cols = [col for col, _ in base_champs if col in df.columns]
-    st.dataframe(df[synth_cols], use_container_width=True)
-
-
+    afficher_pagine(
+        df_f[[c for c, _ in champs]],
+        key="gestion_apercu",
+        column_config={
+            **config_montants([c for c, t in champs if t == "montant"]),
+            **config_dates([c for c, t in champs if t == "date"]),
+        },
+    )
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+import streamlit.logger
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RACINE not in sys.path:
+    sys.path.insert(0, RACINE)
+
+# Hors du serveur Streamlit : pas d'avertissements « No runtime found » des caches
+streamlit.logger.set_log_level("error")
+
+EXEMPLE = os.path.join(RACINE, "Clients BL.xlsx")
+
+
+@pytest.fixture(autouse=True)
+def dossier_instantanes(tmp_path, monkeypatch):
+    """Instantanés et historique de chaque test dans un répertoire à part."""
+    monkeypatch.setenv("VISA_SNAPSHOT_DIR", str(tmp_path / "instantanes"))
+
+
+@pytest.fixture(scope="session")
+def exemple():
+    """Classeur d'exemple typé (feuilles -> DataFrame)."""
+    from common_data import load_xlsx
+    return load_xlsx(EXEMPLE)
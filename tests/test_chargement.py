@@ -0,0 +1,50 @@
+"""Import par étapes : rapport de validation et mesures mis en session seulement avec les données."""
+import os
+import textwrap
+
+from streamlit.testing.v1 import AppTest
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {racine!r})
+    import streamlit as st
+    from chargement import importer_par_etapes
+    from common_data import executer
+
+    fichier = {fichier!r}
+    if st.button("Interrompre"):
+        # Import abandonné après la validation (annulation, erreur d'indexation…)
+        etapes = importer_par_etapes(fichier, taille_bloc=10)
+        for evt in etapes:
+            if evt["etape"] == "validation":
+                etapes.close()
+                st.session_state["interrompu"] = True
+                break
+    if st.button("Importer"):
+        executer(importer_par_etapes(fichier, taille_bloc=10))
+""")
+
+
+def test_mesures_installees_avec_les_donnees():
+    at = AppTest.from_string(SCRIPT.format(racine=RACINE, fichier=os.path.join(RACINE, "Clients BL.xlsx")),
+                             default_timeout=60)
+    at.run()
+    precedent = {"data_xlsx": None, "rapport_validation": "précédent", "memoire_clients": "précédent",
+                 "import_durees": {"lecture": -1.0}}
+    for cle, valeur in precedent.items():
+        at.session_state[cle] = valeur
+
+    at.button[0].click()
+    at.run()
+    assert at.session_state["interrompu"] and not at.exception
+    assert {cle: at.session_state[cle] for cle in precedent} == precedent
+
+    at.button[1].click()
+    at.run()
+    assert not at.exception
+    assert len(at.session_state["data_xlsx"]["Clients"]) == 105
+    assert not isinstance(at.session_state["rapport_validation"], str)
+    assert at.session_state["memoire_clients"]["apres"] > 0
+    assert {"lecture", "typage", "validation", "index", "cache"} <= set(at.session_state["import_durees"])
@@ -0,0 +1,34 @@
+"""Entonnoir par visa du classeur d'exemple : un groupe par visa saisi, pas de regroupement « (Non référencé) »."""
+import pandas as pd
+
+from batch import rapport_analyses
+from entonnoir import entonnoir_en_cache
+from referentiel_visa import NON_REFERENCE, ArbreVisa, alias
+
+
+def _distribution_saisie(clients):
+    """Nombre de dossiers par visa saisi (alias), dossiers sans visa à part."""
+    saisis = clients["Visa"].map(alias)
+    return sorted(saisis[saisis != ""].value_counts().tolist() + [int((saisis == "").sum())])
+
+
+def test_entonnoir_par_visa_suit_la_distribution_saisie(exemple):
+    clients = exemple["Clients"]
+    par_visa = rapport_analyses(exemple, pd.Timestamp("2026-01-01"))["Entonnoir par visa"].set_index("Visa")
+
+    assert par_visa["Dossiers"].sum() == len(clients)
+    assert sorted(par_visa["Dossiers"].tolist()) == _distribution_saisie(clients)
+    assert par_visa.loc[NON_REFERENCE, "Dossiers"] == clients["Visa"].isna().sum()
+    assert par_visa.loc[["Naturalization", "E-2 ESE", "GC Marriage", "H-1B"], "Dossiers"].tolist() == [11, 10, 8, 5]
+
+
+def test_entonnoir_onglet_meme_groupes_que_le_rapport(exemple):
+    clients = exemple["Clients"]
+    arbre = ArbreVisa().construire(exemple["Visa"])
+    visas = arbre.libelles_visa(arbre.identifiants(clients)["visa_id"])
+    df = clients.assign(Année=clients["Date"].dt.year)
+
+    res = entonnoir_en_cache("test", (), df, visas)
+    rapport = rapport_analyses(exemple, pd.Timestamp("2026-01-01"))["Entonnoir par visa"].set_index("Visa")
+    pd.testing.assert_series_equal(res["visa"]["Dossiers"], rapport["Dossiers"])
+    assert res["visa_annee"]["Dossiers"].groupby(level="Visa").sum().max() == 11
@@ -0,0 +1,67 @@
+"""Historique des sauvegardes : un journal par classeur, jamais partagé entre fichiers de même nom."""
+import os
+import textwrap
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from historique import enregistrer_historique, etat_au, lire_journal
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {racine!r})
+    import streamlit as st
+    from common_data import definir_donnees, definir_source, empreinte_contenu, lire_identifiant, load_xlsx, save_all
+    from historique import lire_journal, source_courante
+
+    fichier = st.session_state.get("fichier", {fichier!r})
+    if st.button("Importer"):
+        definir_donnees(load_xlsx(fichier))
+        definir_source("upload:Visa_Clients.xlsx", empreinte_contenu(fichier), lire_identifiant(fichier))
+    if st.button("Sauvegarder"):
+        save_all()
+    st.session_state["cle_historique"] = source_courante()
+    st.session_state["nb_sauvegardes"] = len(lire_journal(source_courante()))
+""")
+
+
+def _session(fichier):
+    at = AppTest.from_string(SCRIPT.format(racine=RACINE, fichier=fichier), default_timeout=60)
+    at.session_state["fichier"] = fichier
+    at.run()
+    at.button[0].click()
+    at.run()
+    at.button[1].click()
+    at.run()
+    assert not at.exception
+    return at
+
+
+def test_journal_par_classeur():
+    exemple = os.path.join(RACINE, "Clients BL.xlsx")
+    a = _session(exemple)
+    b = _session(exemple)  # autre bureau, même nom de fichier importé
+    assert a.session_state["cle_historique"] != b.session_state["cle_historique"]
+    assert a.session_state["nb_sauvegardes"] == b.session_state["nb_sauvegardes"] == 1
+
+    # Le fichier sauvegardé par A porte son identifiant : le réimporter prolonge son historique
+    reprise = _session(a.session_state["last_saved_path"])
+    assert reprise.session_state["cle_historique"] == a.session_state["cle_historique"]
+    assert reprise.session_state["nb_sauvegardes"] == 2
+
+
+def test_etat_au_deltas(exemple):
+    source = "classeur:test"
+    enregistrer_historique(exemple, source, pd.Timestamp("2026-01-01 10:00"))
+    modifie = {**exemple, "Clients": exemple["Clients"].copy()}
+    modifie["Clients"].loc[0, "Commentaires"] = "rappel"
+    entree = enregistrer_historique(modifie, source, pd.Timestamp("2026-01-02 10:00"))
+    assert entree["type"] == "delta" and len(lire_journal(source)) == 2
+
+    avant, _ = etat_au(source, pd.Timestamp("2026-01-01 12:00"))
+    apres, _ = etat_au(source, pd.Timestamp("2026-01-03"))
+    assert pd.isna(avant["Clients"].loc[0, "Commentaires"])
+    assert apres["Clients"].loc[0, "Commentaires"] == "rappel"
+    assert etat_au(source, pd.Timestamp("2025-12-31")) == (None, None)
@@ -0,0 +1,80 @@
+"""Instantanés locaux : restauration limitée à la session qui présente son jeton, stockage Parquet privé."""
+import glob
+import os
+import stat
+import textwrap
+
+from streamlit.testing.v1 import AppTest
+
+from instantane import PARAM_URL, dossier_instantanes, fichier_source, identite
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {racine!r})
+    import streamlit as st
+    from common_data import definir_donnees, definir_source, empreinte_contenu, lire_identifiant, load_xlsx
+    from instantane import instantane_periodique, restaurer_au_demarrage
+
+    message = restaurer_au_demarrage()
+    if message:
+        st.info(message)
+    if st.button("Importer"):
+        definir_donnees(load_xlsx({fichier!r}))
+        definir_source("upload:Clients BL.xlsx", empreinte_contenu({fichier!r}), lire_identifiant({fichier!r}))
+    instantane_periodique()
+""")
+
+
+def _session(params=None):
+    at = AppTest.from_string(SCRIPT.format(racine=RACINE, fichier=os.path.join(RACINE, "Clients BL.xlsx")),
+                             default_timeout=60)
+    for cle, valeur in (params or {}).items():
+        at.query_params[cle] = valeur
+    at.run()
+    return at
+
+
+def test_restauration_reservee_a_la_session(exemple):
+    a = _session()
+    a.button[0].click()
+    a.run()
+    jeton = a.query_params[PARAM_URL]
+    assert a.session_state["data_xlsx"] is not None
+
+    # Nouvelle session sans jeton : rien n'est restauré
+    autre = _session()
+    assert "data_xlsx" not in autre.session_state or autre.session_state["data_xlsx"] is None
+
+    # Même session après redémarrage (jeton dans l'URL) : données restaurées à l'identique
+    reprise = _session({PARAM_URL: jeton})
+    assert "restauré" in reprise.info[0].value
+    for feuille, df in exemple.items():
+        restaure = reprise.session_state["data_xlsx"][feuille]
+        assert restaure.shape == df.shape
+        assert restaure.astype(str).equals(df.astype(str))
+
+    # Jeton invalide : ignoré
+    assert "data_xlsx" not in _session({PARAM_URL: "../../etc"}).session_state
+
+
+def test_stockage_prive_sans_pickle():
+    a = _session()
+    a.button[0].click()
+    a.run()
+    dossier = dossier_instantanes()
+    assert stat.S_IMODE(os.stat(dossier).st_mode) == 0o700
+    assert glob.glob(os.path.join(dossier, "*.parquet"))
+    assert not glob.glob(os.path.join(dossier, "*.pkl"))
+
+
+def test_fichiers_annexes_par_classeur():
+    # Deux bureaux qui importent un fichier de même nom : classeurs distincts
+    a = {"source": "upload:Visa_Clients.xlsx", "classeur": "a" * 32}
+    b = {"source": "upload:Visa_Clients.xlsx", "classeur": "b" * 32}
+    assert fichier_source(identite(a), ".escrow.csv") != fichier_source(identite(b), ".escrow.csv")
+    # Fichier distant : même identité pour toutes les sessions qui l'ouvrent
+    d1 = {"source": "drive:Clients BL.xlsx", "classeur": "a" * 32}
+    d2 = {"source": "drive:Clients BL.xlsx", "classeur": "c" * 32}
+    assert identite(d1) == identite(d2)
@@ -0,0 +1,47 @@
+"""Chargement des bureaux : un classeur illisible ou absent n'écarte pas les autres."""
+import os
+import textwrap
+
+from streamlit.testing.v1 import AppTest
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {racine!r})
+    import streamlit as st
+    from partitions import charger_partitions, partitions_chargees, partitions_en_echec
+
+    sources = {{nom: (cle, chemin) for nom, cle, chemin in st.session_state["sources"]}}
+    st.session_state.setdefault("charges", []).append(charger_partitions(sources))
+    st.session_state["bureaux"] = sorted(partitions_chargees())
+    st.session_state["echecs"] = partitions_en_echec()
+""")
+
+
+def test_bureau_illisible_ecarte_seul(tmp_path):
+    illisible = tmp_path / "Lyon.xlsx"
+    illisible.write_bytes(b"pas un classeur")
+    at = AppTest.from_string(SCRIPT.format(racine=RACINE), default_timeout=60)
+    at.session_state["sources"] = [
+        ("Paris", "p1", os.path.join(RACINE, "Clients BL.xlsx")),
+        ("Lyon", "l1", str(illisible)),
+        ("Nice", "n1", str(tmp_path / "absent.xlsx")),
+    ]
+    at.run()
+    assert not at.exception
+    assert at.session_state["bureaux"] == ["Paris"]
+    assert sorted(at.session_state["echecs"]) == ["Lyon", "Nice"]
+    assert "FileNotFoundError" in at.session_state["echecs"]["Nice"]
+
+    # Même fichier en échec : pas relu à chaque rerun ; le bureau chargé reste en place
+    at.run()
+    assert at.session_state["charges"] == [["Paris"], []]
+    assert at.session_state["bureaux"] == ["Paris"]
+
+    # Fichier corrigé (nouvelle clé) : chargé, l'échec disparaît
+    illisible.write_bytes(open(os.path.join(RACINE, "Clients BL.xlsx"), "rb").read())
+    at.session_state["sources"] = [(n, "l2" if n == "Lyon" else c, s) for n, c, s in at.session_state["sources"]]
+    at.run()
+    assert at.session_state["bureaux"] == ["Lyon", "Paris"]
+    assert sorted(at.session_state["echecs"]) == ["Nice"]
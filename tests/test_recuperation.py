@@ -0,0 +1,76 @@
+"""Récupération concurrente des sources au démarrage, contre un serveur HTTP local (sources lentes, en échec)."""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import recuperation
+from recuperation import telecharger_tout
+from synchro import RemoteHttp
+
+DELAI_S = 1.0
+LENTEUR_S = 3.0  # au-delà du délai de l'étape
+CONTENU = b"PK classeur"
+
+
+class Serveur(BaseHTTPRequestHandler):
+    """/ok, /lent (répond après LENTEUR_S), /instable (503 au premier appel), /erreur (500), /absent (404)."""
+    appels = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        n = Serveur.appels[self.path] = Serveur.appels.get(self.path, 0) + 1
+        if self.path == "/lent":
+            time.sleep(LENTEUR_S)
+        code = {"/erreur": 500, "/absent": 404}.get(self.path, 503 if self.path == "/instable" and n == 1 else 200)
+        try:
+            self.send_response(code)
+            self.send_header("ETag", f'"{self.path[1:]}-{n}"')
+            self.send_header("Content-Length", str(len(CONTENU) if code == 200 else 0))
+            self.end_headers()
+            if code == 200:
+                self.wfile.write(CONTENU)
+        except OSError:
+            pass  # client parti (source abandonnée)
+
+
+@pytest.fixture
+def serveur(monkeypatch):
+    monkeypatch.setattr(recuperation, "_attente", lambda tentative: 0.05)
+    Serveur.appels = {}
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Serveur)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield lambda chemin: f"http://127.0.0.1:{srv.server_address[1]}{chemin}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_sources_lentes_et_en_echec(serveur, tmp_path):
+    noms = ["ok", "lent", "instable", "erreur", "absent"]
+    remotes = {n: (RemoteHttp(serveur(f"/{n}"), timeout=LENTEUR_S * 2), str(tmp_path / f"{n}.xlsx")) for n in noms}
+
+    t0 = time.perf_counter()
+    res = telecharger_tout(remotes, delai_s=DELAI_S, tentatives=3)
+    total = time.perf_counter() - t0
+
+    # Le délai borne l'étape entière : la source lente est abandonnée, pas attendue
+    assert DELAI_S <= total < DELAI_S + 0.5
+    assert res["lent"].statut == "délai dépassé" and res["lent"].revision is None
+
+    assert res["ok"].statut == "ok" and res["ok"].revision == '"ok-1"'
+    assert res["ok"].octets == len(CONTENU) and (tmp_path / "ok.xlsx").read_bytes() == CONTENU
+    assert res["ok"].duree_s < DELAI_S / 2  # non bloquée par la source lente
+
+    # 503 : reprise ; 500 : reprises jusqu'à épuisement ; 404 : abandon immédiat
+    assert (res["instable"].statut, res["instable"].tentatives) == ("ok", 2)
+    assert (res["erreur"].statut, res["erreur"].tentatives) == ("échec", 3)
+    assert "500" in res["erreur"].erreur
+    assert (res["absent"].statut, res["absent"].tentatives) == ("échec", 1)
+    assert Serveur.appels["/absent"] == 1
+
+
+def test_aucune_source():
+    assert telecharger_tout({}) == {}
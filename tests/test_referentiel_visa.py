@@ -0,0 +1,59 @@
+"""Résolution des saisies libres du classeur d'exemple sur le référentiel des visas."""
+import pytest
+
+from referentiel_visa import NON_REFERENCE, ArbreVisa, alias
+
+
+@pytest.fixture
+def arbre(exemple):
+    return ArbreVisa().construire(exemple["Visa"])
+
+
+def _sous_categorie(arbre, scat_id):
+    return arbre.sous_categories[scat_id][1] if scat_id >= 0 else None
+
+
+def test_alias_insensible_a_la_ponctuation():
+    assert alias("E-2  Inv.") == alias("e2 inv") == "e2inv"
+    assert alias("GC - CP") == alias("GC CP")
+
+
+@pytest.mark.parametrize("categorie, sous_categorie, visa, attendu", [
+    ("3 - Treaty", "01     E-2", "E-2  Inv.", "E-2 Inv."),
+    ("5 - Family", "Marriage - USC", "3-AOS", "Marriage - USC AOS"),
+    ("3 - Treaty", "03     E-2 ESE", "cp", "E-2 ESE CP"),
+    (None, None, "e2 ese ren uscis", "E-2 ESE Ren. USCIS"),
+    ("1 - Affaires / Tourisme", "B-1", "b-1 cos", "B-1 COS"),
+])
+def test_resolution_par_alias(arbre, categorie, sous_categorie, visa, attendu):
+    _, _, visa_id = arbre.resoudre(categorie, sous_categorie, visa)
+    assert visa_id >= 0 and arbre.visas[visa_id][2] == attendu
+
+
+def test_sous_categorie_deduite_du_visa(arbre):
+    _, scat_id, visa_id = arbre.resoudre(None, None, "E-2 ESE ren")
+    assert visa_id == -1
+    assert _sous_categorie(arbre, scat_id) == "04     E-2 ESE Ren."
+
+
+def test_exemple_resolu_presque_entierement(arbre, exemple):
+    clients = exemple["Clients"]
+    ids = arbre.identifiants(clients)
+    libelles = arbre.libelles_visa(ids["visa_id"])
+    saisis = clients["Visa"].notna() & (clients["Visa"].astype(str).str.strip() != "")
+
+    # Seuls les dossiers sans visa saisi restent « (Non référencé) »
+    assert ((libelles == NON_REFERENCE) == ~saisis).all()
+    # Sous-catégorie reconnue pour la quasi-totalité des dossiers
+    assert (ids["scat_id"] >= 0).mean() >= 0.85
+
+    # Les saisies hors référentiel forment chacune leur groupe, libellé d'origine conservé
+    hors = libelles[ids["visa_id"] >= len(arbre.visas)]
+    assert {"H-1B", "Naturalization", "E-2 ESE", "GC Marriage"} <= set(hors)
+    assert libelles.value_counts().iloc[0] < 0.2 * len(clients)
+    par_alias = clients.loc[saisis, "Visa"].map(alias)
+    assert ids.loc[saisis].groupby(par_alias.to_numpy())["visa_id"].nunique().max() == 1
+
+    # Une saisie de niveau sous-catégorie est rattachée à celle-ci
+    h1b = ids[clients["Visa"].astype(str).str.strip() == "H-1B"]
+    assert {_sous_categorie(arbre, s) for s in h1b["scat_id"]} == {"05     H-1B"}
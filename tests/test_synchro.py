@@ -0,0 +1,149 @@
+"""Enregistrement concurrent sur un classeur distant simulé (RemoteLocal) : deux sessions, même révision."""
+import os
+import textwrap
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import pandas as pd
+
+from common_data import ESCROW_COLONNES, ecrire_classeur, load_xlsx, typer_escrow
+from synchro import ConflitRevision, RemoteLocal, enregistrer_distant
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def distant(tmp_path, exemple):
+    chemin = ecrire_classeur(exemple, str(tmp_path / "distant.xlsx"))
+    return RemoteLocal(chemin)
+
+
+def _charger(remote, tmp_path, nom):
+    """Session qui charge le classeur distant : (données, chemin de la base, révision)."""
+    chemin = str(tmp_path / f"base_{nom}.xlsx")
+    revision = remote.lire(chemin)
+    return load_xlsx(chemin), chemin, revision
+
+
+def _modifier(data, ligne, valeur):
+    clients = data["Clients"].copy()
+    clients.loc[ligne, "Commentaires"] = valeur
+    return {**data, "Clients": clients}
+
+
+def test_ecriture_refusee_si_revision_changee(distant, tmp_path, exemple):
+    source = ecrire_classeur(exemple, str(tmp_path / "envoi.xlsx"))
+    revision = distant.ecrire(source, distant.revision())
+    with pytest.raises(ConflitRevision):
+        distant.ecrire(source, None)
+    assert distant.revision() == revision
+
+
+def test_deux_sessions_modifications_distinctes(distant, tmp_path):
+    data_a, base_a, rev_a = _charger(distant, tmp_path, "a")
+    data_b, base_b, rev_b = _charger(distant, tmp_path, "b")
+    assert rev_a == rev_b
+
+    rev, _, _, conflits = enregistrer_distant(distant, _modifier(data_a, 0, "vu par A"), base_a, rev_a)
+    assert conflits == [] and rev is not None
+
+    # B enregistre sur la même révision : fusion avec l'écriture de A, puis nouvelle révision
+    rev2, _, fusion, conflits = enregistrer_distant(distant, _modifier(data_b, 1, "vu par B"), base_b, rev_b)
+    assert conflits == []
+    assert rev2 == distant.revision() != rev
+
+    final = load_xlsx(distant.chemin)["Clients"]
+    assert final.loc[0, "Commentaires"] == "vu par A"
+    assert final.loc[1, "Commentaires"] == "vu par B"
+    assert len(final) == len(data_a["Clients"])
+
+
+def test_deux_sessions_meme_cellule(distant, tmp_path):
+    data_a, base_a, rev_a = _charger(distant, tmp_path, "a")
+    data_b, base_b, rev_b = _charger(distant, tmp_path, "b")
+    rev, _, _, _ = enregistrer_distant(distant, _modifier(data_a, 0, "A"), base_a, rev_a)
+
+    rev2, chemin, _, conflits = enregistrer_distant(distant, _modifier(data_b, 0, "B"), base_b, rev_b)
+    assert rev2 is None and distant.revision() == rev  # rien n'est écrit
+    assert [(c["colonne"], c["locale"], c["distante"]) for c in conflits] == [("Commentaires", "B", "A")]
+    os.remove(chemin)
+
+    rev3, _, _, _ = enregistrer_distant(distant, _modifier(data_b, 0, "B"), base_b, rev_b, forcer=True)
+    assert rev3 == distant.revision()
+    assert load_xlsx(distant.chemin)["Clients"].loc[0, "Commentaires"] == "B"
+
+
+def _evenement(data, ligne, etat, horodatage):
+    """Ajoute un événement au journal Escrow d'une copie de `data`."""
+    client = data["Clients"].loc[ligne]
+    evenement = typer_escrow(pd.DataFrame([{
+        "Dossier N": client["Dossier N"], "Nom": client["Nom"], "Montant": client["Acompte 1"],
+        "Date envoi": pd.Timestamp("2025-03-01"), "État": etat, "Horodatage": pd.Timestamp(horodatage),
+    }], columns=ESCROW_COLONNES))
+    escrow = pd.concat([data["Escrow"], evenement], ignore_index=True) if len(data["Escrow"]) else evenement
+    return {**data, "Escrow": escrow}
+
+
+def test_deux_sessions_ajouts_escrow(distant, tmp_path):
+    data_a, base_a, rev_a = _charger(distant, tmp_path, "a")
+    data_b, base_b, rev_b = _charger(distant, tmp_path, "b")
+    data_a = _evenement(data_a, 0, "Envoyé", "2025-03-01 10:00:00.123")
+    data_b = _evenement(data_b, 1, "Réclamé", "2025-03-01 10:00:00.456")
+    # Même événement déjà présent des deux côtés (repris après un rechargement)
+    commun = "2025-02-01 09:00:00"
+    data_a, data_b = _evenement(data_a, 2, "Envoyé", commun), _evenement(data_b, 2, "Envoyé", commun)
+
+    enregistrer_distant(distant, data_a, base_a, rev_a)
+    rev, _, fusion, conflits = enregistrer_distant(distant, data_b, base_b, rev_b)
+    assert conflits == [] and rev == distant.revision()
+
+    escrow = load_xlsx(distant.chemin)["Escrow"]
+    attendu = len(load_xlsx(base_a)["Escrow"]) + 3
+    assert len(escrow) == len(fusion["Escrow"]) == attendu
+    assert sorted(escrow["État"].astype(str).tail(3)) == ["Envoyé", "Envoyé", "Réclamé"]
+
+
+SCRIPT_SESSION = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {racine!r})
+    import streamlit as st
+    from synchro import RemoteLocal, charger_distant, enregistrer_session
+
+    remote = RemoteLocal({chemin!r})
+    if st.session_state.get("data_xlsx") is None:
+        charger_distant(remote)
+    commentaire = st.text_input("Commentaire")
+    if st.button("Enregistrer"):
+        data = dict(st.session_state["data_xlsx"])
+        data["Clients"] = data["Clients"].copy()
+        data["Clients"].loc[0, "Commentaires"] = commentaire
+        st.session_state["data_xlsx"] = data
+        st.session_state["resultat"] = enregistrer_session(remote)
+""")
+
+
+def test_deux_sessions_streamlit(distant):
+    script = SCRIPT_SESSION.format(racine=RACINE, chemin=distant.chemin)
+    sessions = [AppTest.from_string(script, default_timeout=60) for _ in range(2)]
+    for at in sessions:
+        at.run()
+    revision = sessions[0].session_state["synchro_base"]["revision"]
+    assert sessions[1].session_state["synchro_base"]["revision"] == revision
+
+    a, b = sessions
+    a.text_input[0].input("A")
+    a.button[0].click()
+    a.run()
+    assert a.session_state["resultat"] == [] and not a.exception
+
+    b.session_state["rapport_validation"] = "classeur installé"
+    b.text_input[0].input("B")
+    b.button[0].click()
+    b.run()
+    assert not b.exception
+    # Base de fusion et version distante sont relues sans remplacer le rapport du classeur installé
+    assert b.session_state["rapport_validation"] == "classeur installé"
+    assert [c["distante"] for c in b.session_state["resultat"]] == ["A"]
+    assert b.session_state["synchro_conflits"] == b.session_state["resultat"]
+    assert distant.revision() == a.session_state["synchro_base"]["revision"]
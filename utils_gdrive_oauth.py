@@ -1,9 +1,12 @@
 import io
 import json
+import os
 import streamlit as st
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from common_data import ecrire_classeur, fichier_temp, identifiant_classeur
+from profiling import profile
 
 SCOPES = ["https://www.googleapis.com/auth/drive.file"]
 
@@ -43,6 +46,7 @@ def get_gdrive_service():
 # -----------------------------------------------------
 #  DOWNLOAD
 # -----------------------------------------------------
+@profile()
 def download_from_drive(filename):
     """Télécharge un fichier Google Drive et retourne son contenu binaire."""
     service = get_gdrive_service()
@@ -81,6 +85,7 @@ def download_from_drive(filename):
 # -----------------------------------------------------
 #  UPLOAD (VERSION SÛRE)
 # -----------------------------------------------------
+@profile()
 def upload_to_drive(data_dict, filename="Clients BL.xlsx"):
     """Enregistre un fichier Excel sur Google Drive, SAFE MODE."""
 
@@ -89,41 +94,41 @@ def upload_to_drive(data_dict, filename="Clients BL.xlsx"):
         return False
 
     try:
-        # 🔒 Construire le fichier Excel en mémoire
-        output = io.BytesIO()
-
+        # 🔒 Construire le fichier Excel sur disque (mémoire constante)
         import pandas as pd
 
-        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-            for sheet, df in data_dict.items():
-
-                # ⚠️ Patch anti-feuille vide invisible
-                if df is None or len(df) == 0:
-                    safe_df = pd.DataFrame({"": []})
-                    safe_df.to_excel(writer, sheet_name=sheet, index=False)
-                else:
-                    df.to_excel(writer, sheet_name=sheet, index=False)
-
-        output.seek(0)
-
-        # -----------------------------------------------------
-        #  Vérifier si le fichier existe déjà
-        # -----------------------------------------------------
-        results = service.files().list(
-            q=f"name='{filename}' and trashed=false",
-            fields="files(id, name)"
-        ).execute()
-
-        media = MediaIoBaseUpload(output, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-        if results.get("files"):
-            # Mise à jour du fichier existant
-            file_id = results["files"][0]["id"]
-            service.files().update(fileId=file_id, media_body=media).execute()
-        else:
-            # Nouveau fichier
-            file_metadata = {"name": filename}
-            service.files().create(body=file_metadata, media_body=media).execute()
+        # ⚠️ Patch anti-feuille vide invisible
+        data_dict = {
+            sheet: (pd.DataFrame({"": []}) if df is None or len(df) == 0 else df)
+            for sheet, df in data_dict.items()
+        }
+        # Copie temporaire de la session (identifiant du classeur conservé), supprimée après l'envoi
+        chemin = ecrire_classeur(data_dict, fichier_temp("drive"), identifiant_classeur())
+        media = None
+        try:
+            # -----------------------------------------------------
+            #  Vérifier si le fichier existe déjà
+            # -----------------------------------------------------
+            results = service.files().list(
+                q=f"name='{filename}' and trashed=false",
+                fields="files(id, name)"
+            ).execute()
+
+            # Envoi reprenable par blocs, lu depuis le fichier temporaire
+            media = MediaFileUpload(chemin, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", resumable=True)
+
+            if results.get("files"):
+                # Mise à jour du fichier existant
+                file_id = results["files"][0]["id"]
+                service.files().update(fileId=file_id, media_body=media).execute()
+            else:
+                # Nouveau fichier
+                file_metadata = {"name": filename}
+                service.files().create(body=file_metadata, media_body=media).execute()
+        finally:
+            if media is not None:
+                media.stream().close()
+            os.remove(chemin)
 
         st.success(f"✅ Fichier sauvegardé sur Google Drive : {filename}")
         return True